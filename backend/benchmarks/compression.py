@@ -0,0 +1,112 @@
+"""
+Bytes on the wire and CPU cost of compressing typical duel and results
+responses with gzip and brotli at several levels.
+
+    python -m benchmarks.compression --answer-words 400 --repeat 200
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from services import compression
+from services.serialization import dumps
+
+WORDS = (
+    "the model answer capital city france paris river seine population museum history "
+    "because therefore however example first second finally result data analysis step "
+    "consider approach performance template prompt question response accurate detailed "
+    "summary explanation context important note following using which where when"
+).split()
+
+
+def _answer(rng: random.Random, words: int) -> str:
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        words -= length
+    return " ".join(sentences)
+
+
+def _generation(rng: random.Random, generation_id: int, words: int) -> dict:
+    return {
+        "id": generation_id, "template_id": generation_id, "question_id": 1,
+        "output_text": _answer(rng, words), "output_hash": f"{generation_id:064x}", "output_length": words * 6,
+        "llm_model": "gpt-4o-mini", "latency": 1.23, "output_tokens": words, "input_tokens": 42,
+        "created_at": datetime(2025, 1, 1),
+    }
+
+
+def typical_payloads(answer_words: int, seed: int = 0) -> Dict[str, bytes]:
+    """Serialized next-duel and results responses with answers of `answer_words` words"""
+    rng = random.Random(seed)
+    question = {"id": 1, "text": "What is the capital of France?", "created_at": datetime(2025, 1, 1),
+                "selected_generation_id": 1, "decided_at": None}
+    duel = {
+        "id": 1, "winner_id": None, "created_at": datetime(2025, 1, 1), "decided_at": None,
+        "question": question,
+        "generation_a": _generation(rng, 1, answer_words),
+        "generation_b": _generation(rng, 2, answer_words),
+    }
+    performance = []
+    for generation_id in range(1, 5):
+        generation = _generation(rng, generation_id, answer_words)
+        performance.append({
+            "generation_id": generation_id, "template_id": generation_id, "template_name": f"Template {generation_id}",
+            "template_key": f"t{generation_id}", "output_text": generation["output_text"],
+            "llm_model": "gpt-4o-mini", "latency": 1.23, "output_tokens": answer_words, "input_tokens": 42,
+            "created_at": generation["created_at"], "wins": 4 - generation_id, "total_duels": 3,
+            "win_rate": round((4 - generation_id) / 3 * 100, 2),
+        })
+    results = {"question": question, "selected_generation": duel["generation_a"], "generation_performance": performance}
+    return {"duel": dumps(duel), "results": dumps(results)}
+
+
+def _compress(encoding: str, level: int) -> Callable[[bytes], bytes]:
+    # Same compressor objects as CompressionMiddleware
+    def compress(body: bytes) -> bytes:
+        compressor = compression._Compressor(encoding, gzip_level=level, brotli_quality=level)
+        return compressor.compress(body) + compressor.finish()
+    return compress
+
+
+def codecs() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    available = [(f"gzip-{level}", _compress("gzip", level)) for level in (1, 6, 9)]
+    if compression.brotli is not None:
+        available += [(f"br-{quality}", _compress("br", quality)) for quality in (1, 4, 11)]
+    return available
+
+
+def run(answer_words: int = 400, repeat: int = 200) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Compressed size, ratio and CPU microseconds per response for each payload and codec"""
+    results = {}
+    for name, body in typical_payloads(answer_words).items():
+        rows = {"identity": {"bytes": len(body), "ratio": 1.0, "cpu_us": 0.0}}
+        for codec, compress in codecs():
+            started = time.process_time()
+            for _ in range(repeat):
+                compressed = compress(body)
+            cpu_us = (time.process_time() - started) / repeat * 1_000_000
+            rows[codec] = {
+                "bytes": len(compressed),
+                "ratio": round(len(body) / len(compressed), 2),
+                "cpu_us": round(cpu_us, 1),
+            }
+        results[name] = rows
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure response compression")
+    parser.add_argument("--answer-words", type=int, default=400, help="Words per LLM answer")
+    parser.add_argument("--repeat", type=int, default=200, help="Compressions per measurement")
+    args = parser.parse_args()
+
+    for name, rows in run(args.answer_words, args.repeat).items():
+        print(f"\n{name}")
+        print(f"{'encoding':<10}{'bytes':>10}{'ratio':>8}{'cpu us':>10}")
+        for codec, row in rows.items():
+            print(f"{codec:<10}{row['bytes']:>10}{row['ratio']:>8}{row['cpu_us']:>10}")
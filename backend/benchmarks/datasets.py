@@ -0,0 +1,93 @@
+"""
+Synthetic tournament databases at production scale for the service
+benchmarks. Generated with seed.bulk_seed and cached on disk by their
+parameters, so large datasets are only generated once.
+"""
+import json
+import os
+from typing import Dict, List, Tuple
+
+from sqlmodel import SQLModel, create_engine
+
+from seed import BulkSeedSpec, bulk_seed
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+
+class DatasetSpec:
+    """
+    `questions` questions with a generation per template and a duel per pair
+    of generations, so 5 templates give 10 duels per question. Most questions
+    are decided or partly judged; the pools at the end feed benchmarks that
+    change data and need a fresh question per call.
+    """
+
+    def __init__(
+        self,
+        questions: int = 1000,
+        templates: int = 5,
+        decided_fraction: float = 0.7,
+        pool_size: int = 50,
+        output_chars: int = 400,
+        seed: int = 0,
+    ):
+        self.questions = questions
+        self.templates = templates
+        self.decided_fraction = decided_fraction
+        self.pool_size = pool_size
+        self.output_chars = output_chars
+        self.seed = seed
+
+    @property
+    def key(self) -> str:
+        return (f"q{self.questions}-t{self.templates}-d{round(self.decided_fraction * 100)}"
+                f"-p{self.pool_size}-c{self.output_chars}-s{self.seed}")
+
+    @property
+    def duels_per_question(self) -> int:
+        return self.templates * (self.templates - 1) // 2
+
+    def to_dict(self) -> Dict[str, float]:
+        return {**vars(self), "duels": self.questions * self.duels_per_question}
+
+
+def build(path: str, spec: DatasetSpec) -> Dict[str, List[int]]:
+    """
+    Write the dataset to a new SQLite file at `path` and return the question
+    ids of each state: decided, in_progress (undecided duels left),
+    pending_winner (all duels decided, winner not yet selected) and
+    without_duels (generations stored, duels not yet created).
+    """
+    if spec.questions < 3 * spec.pool_size + 1:
+        raise ValueError("questions must exceed three times pool_size")
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    states = bulk_seed(engine, BulkSeedSpec(
+        questions=spec.questions,
+        templates=spec.templates,
+        decided_fraction=spec.decided_fraction,
+        pending_winner=spec.pool_size,
+        without_duels=spec.pool_size,
+        output_chars_mean=spec.output_chars,
+        seed=spec.seed,
+    ))
+    engine.dispose()
+    return states
+
+
+def cached(spec: DatasetSpec, data_dir: str = DATA_DIR) -> Tuple[str, Dict[str, List[int]]]:
+    """Path and question states of the dataset, building it on first use"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"{spec.key}.db")
+    states_path = os.path.join(data_dir, f"{spec.key}.json")
+    if not (os.path.exists(path) and os.path.exists(states_path)):
+        for stale in (path, states_path):
+            if os.path.exists(stale):
+                os.unlink(stale)
+        print(f"Building dataset {spec.key} ({spec.questions} questions, "
+              f"{spec.questions * spec.duels_per_question} duels)...")
+        states = build(path, spec)
+        with open(states_path, "w") as file:
+            json.dump(states, file)
+    with open(states_path) as file:
+        return path, json.load(file)
@@ -0,0 +1,333 @@
+"""
+Load test of the question lifecycle: M askers create questions while N judges
+loop over duels/next and decide, with exponential think times. Reports
+throughput, latency percentiles per route, database lock errors, decide
+conflicts and the time from asking a question to its winner being selected,
+and writes everything to a JSON file for comparing releases.
+
+Against running servers (the API pointed at the LLM stub):
+
+    python -m services.llm_stub --port 8001
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 uvicorn main:app --port 8000
+    python -m benchmarks.loadtest --users 5 --judges 20 --duration 60
+
+Or let the harness start both, with a fresh database in a temporary directory:
+
+    python -m benchmarks.loadtest --start-servers --stub-args "--latency-mean 0.8 --rate-limit-rate 0.02"
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+ROUTES = {
+    "create_question": "POST /questions/",
+    "next_duel": "GET /questions/{question_id}/duels/next",
+    "decide_duel": "POST /questions/{question_id}/duels/{duel_id}/decide",
+    "question_status": "GET /questions/{question_id}/status",
+}
+
+
+class LoadTestConfig:
+    def __init__(
+        self,
+        users: int = 5,
+        judges: int = 10,
+        duration: float = 60.0,
+        drain: float = 60.0,
+        asker_think: float = 5.0,
+        judge_think: float = 1.0,
+        templates: int = 3,
+        seed: int = 0,
+        timeout: float = 30.0,
+    ):
+        self.users = users
+        self.judges = judges
+        # Seconds during which questions are asked, then judges keep deciding for up to `drain` seconds
+        self.duration = duration
+        self.drain = drain
+        # Mean think times in seconds, drawn from an exponential distribution
+        self.asker_think = asker_think
+        self.judge_think = judge_think
+        self.templates = templates
+        self.seed = seed
+        self.timeout = timeout
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99, mean and max of durations in seconds, reported in milliseconds"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[max(0, min(len(ordered) - 1, int(p / 100 * len(ordered) + 0.5) - 1))] * 1000, 2)
+
+    return {
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+class _LoadState:
+    def __init__(self, config: LoadTestConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.latencies: Dict[str, List[float]] = {route: [] for route in ROUTES.values()}
+        self.statuses: Dict[str, Dict[str, int]] = {route: {} for route in ROUTES.values()}
+        self.lock_errors = 0
+        self.conflicts = 0
+        self.asked: Dict[int, float] = {}
+        self.last_decided: Dict[int, float] = {}
+        self.time_to_winner: Dict[int, float] = {}
+        self.open_questions: List[int] = []
+        self.asking = True
+        self.deadline = 0.0
+
+    def think(self, mean: float) -> float:
+        return self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+    def done(self) -> bool:
+        return time.monotonic() >= self.deadline or (not self.asking and not self.open_questions)
+
+
+async def _request(state: _LoadState, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError as exc:
+        status = type(exc).__name__
+        response = None
+    else:
+        status = str(response.status_code)
+        if response.status_code == 503 and "locked" in response.text:
+            state.lock_errors += 1
+    state.latencies[route].append(time.perf_counter() - started)
+    state.statuses[route][status] = state.statuses[route].get(status, 0) + 1
+    return response
+
+
+async def _asker(state: _LoadState, client: httpx.AsyncClient, user: int):
+    number = 0
+    while state.asking:
+        number += 1
+        response = await _request(state, client, ROUTES["create_question"], "POST", "/questions/",
+                                  json={"text": f"Load test question {user}-{number}: what is {number} + {user}?"})
+        if response is not None and response.status_code == 200:
+            question_id = response.json()["id"]
+            state.asked[question_id] = time.monotonic()
+            state.open_questions.append(question_id)
+        await asyncio.sleep(state.think(state.config.asker_think))
+
+
+async def _judge(state: _LoadState, client: httpx.AsyncClient):
+    idle = min(0.5, state.config.judge_think) or 0.05
+    while not state.done():
+        if not state.open_questions:
+            await asyncio.sleep(idle)
+            continue
+        question_id = state.rng.choice(state.open_questions)
+        response = await _request(state, client, ROUTES["next_duel"], "GET", f"/questions/{question_id}/duels/next")
+        if response is None or response.status_code == 202 or response.status_code >= 500:
+            # Still generating, or a transient error
+            await asyncio.sleep(idle)
+            continue
+        if response.status_code == 204:
+            await _finish_question(state, client, question_id)
+            continue
+        if response.status_code != 200:
+            continue
+
+        duel = response.json()
+        await asyncio.sleep(state.think(state.config.judge_think))
+        winner_id = state.rng.choice([duel["generation_a"]["id"], duel["generation_b"]["id"]])
+        response = await _request(state, client, ROUTES["decide_duel"], "POST",
+                                  f"/questions/{question_id}/duels/{duel['id']}/decide",
+                                  json={"winner_id": winner_id})
+        if response is None:
+            continue
+        if response.status_code == 200:
+            state.last_decided[question_id] = time.monotonic()
+        elif response.status_code == 400:
+            # Another judge decided the same duel first
+            state.conflicts += 1
+
+
+async def _finish_question(state: _LoadState, client: httpx.AsyncClient, question_id: int):
+    if question_id not in state.open_questions:
+        return
+    state.open_questions.remove(question_id)
+    response = await _request(state, client, ROUTES["question_status"], "GET", f"/questions/{question_id}/status")
+    decided_at = state.last_decided.get(question_id)
+    if response is not None and response.status_code == 200 and response.json()["state"] == "decided" and decided_at:
+        state.time_to_winner[question_id] = decided_at - state.asked[question_id]
+
+
+async def _ensure_templates(client: httpx.AsyncClient, count: int):
+    existing = (await client.get("/templates/")).json()
+    for i in range(len(existing), count):
+        await client.post("/templates/", json={
+            "key": f"loadtest_{i}", "name": f"Load test {i}",
+            "template_text": f"Answer in style {i}: {{{{question}}}}",
+        })
+
+
+async def run_load(config: LoadTestConfig, client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Run the scenario with `client` (base URL already set) and return the report"""
+    state = _LoadState(config)
+    await _ensure_templates(client, config.templates)
+
+    started = time.monotonic()
+    state.deadline = started + config.duration + config.drain
+    askers = [asyncio.ensure_future(_asker(state, client, user)) for user in range(config.users)]
+    judges = [asyncio.ensure_future(_judge(state, client)) for _ in range(config.judges)]
+    await asyncio.sleep(config.duration)
+    state.asking = False
+    # Askers may be in a long think; the ask phase is over either way
+    for asker in askers:
+        asker.cancel()
+    await asyncio.gather(*askers, return_exceptions=True)
+    await asyncio.gather(*judges)
+    elapsed = time.monotonic() - started
+
+    routes = {}
+    for route, latencies in state.latencies.items():
+        routes[route] = {
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "latency_ms": percentiles(latencies),
+            "statuses": state.statuses[route],
+        }
+    total = sum(len(latencies) for latencies in state.latencies.values())
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": config.to_dict(),
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "routes": routes,
+        "lock_errors": state.lock_errors,
+        "decide_conflicts": state.conflicts,
+        "questions": {
+            "asked": len(state.asked),
+            "decided": len(state.time_to_winner),
+            "undecided": len(state.asked) - len(state.time_to_winner),
+            "time_to_winner_ms": percentiles(list(state.time_to_winner.values())),
+        },
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:g}s")
+
+
+def _start_servers(stub_args: str) -> Tuple[str, List[subprocess.Popen]]:
+    """The LLM stub and the API, with a fresh database in a temporary working directory"""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    stub_port, api_port = _free_port(), _free_port()
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "services.llm_stub", "--port", str(stub_port), "--log-level", "warning",
+         *shlex.split(stub_args)],
+        cwd=backend,
+    )
+    env = {**os.environ, "LLM_PROVIDER": "openai", "LLM_BASE_URL": f"http://127.0.0.1:{stub_port}/v1"}
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", backend, "--port", str(api_port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    _wait_until_up(f"http://127.0.0.1:{stub_port}/v1/models")
+    _wait_until_up(f"http://127.0.0.1:{api_port}/")
+    return f"http://127.0.0.1:{api_port}", [api, stub]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _main(args, config: LoadTestConfig) -> Dict[str, Any]:
+    processes = []
+    base_url = args.base_url
+    if args.start_servers:
+        base_url, processes = _start_servers(args.stub_args)
+    try:
+        limits = httpx.Limits(max_connections=config.users + config.judges)
+        async with httpx.AsyncClient(base_url=base_url, timeout=config.timeout, limits=limits) as client:
+            report = await run_load(config, client)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+    report["base_url"] = base_url
+    report["commit"] = _git_commit()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test with concurrent askers and judges")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-servers", action="store_true", help="Start the LLM stub and the API on free ports")
+    parser.add_argument("--stub-args", default="", help="Extra arguments for services.llm_stub with --start-servers")
+    parser.add_argument("--users", type=int, default=5, help="Concurrent askers")
+    parser.add_argument("--judges", type=int, default=10, help="Concurrent judges")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds during which questions are asked")
+    parser.add_argument("--drain", type=float, default=60.0, help="Seconds judges keep deciding afterwards")
+    parser.add_argument("--asker-think", type=float, default=5.0, help="Mean seconds between questions per user")
+    parser.add_argument("--judge-think", type=float, default=1.0, help="Mean seconds a judge takes per duel")
+    parser.add_argument("--templates", type=int, default=3, help="Templates to create when fewer exist")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest-results.json")
+    args = parser.parse_args()
+
+    load_config = LoadTestConfig(
+        users=args.users, judges=args.judges, duration=args.duration, drain=args.drain,
+        asker_think=args.asker_think, judge_think=args.judge_think, templates=args.templates, seed=args.seed,
+    )
+    result = asyncio.run(_main(args, load_config))
+    with open(args.output, "w") as file:
+        json.dump(result, file, indent=2)
+
+    print(f"{'route':<56}{'requests':>9}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, stats in result["routes"].items():
+        latency = stats["latency_ms"]
+        print(f"{name:<56}{stats['requests']:>9}{stats['throughput_rps']:>8}"
+              f"{latency['p50'] or '-':>9}{latency['p95'] or '-':>9}{latency['p99'] or '-':>9}")
+    questions = result["questions"]
+    print(f"Questions asked {questions['asked']}, decided {questions['decided']}, "
+          f"time to winner p50 {questions['time_to_winner_ms']['p50']} ms")
+    print(f"Lock errors {result['lock_errors']}, decide conflicts {result['decide_conflicts']}")
+    print(f"Wrote {args.output}")
@@ -0,0 +1,185 @@
+"""
+Service benchmarks at production data scale. Each benchmark runs against a
+copy of a synthetic dataset (benchmarks/datasets.py), and the suite records
+its median time and peak Python memory. When a stored baseline is given,
+any benchmark that is slower or uses more memory than the threshold allows
+counts as a regression, and the script exits with status 1.
+
+    python -m benchmarks.scale --scale small --compare benchmarks/baseline.json
+    python -m benchmarks.scale --scale large --repeat 5          # 10^5 questions, 10^6 duels
+    python -m benchmarks.scale --scale small --save-baseline benchmarks/baseline.json
+
+Baselines are machine specific, so record them on the machine that runs the comparison.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, event
+from sqlmodel import Session
+
+from benchmarks.datasets import DATA_DIR, DatasetSpec, cached
+from routers.questions import get_next_duel
+from routers.templates import _template_performance
+from services.performance import get_generation_performance_stats, get_template_performance_stats
+from services.question import create_duels, set_question_winner
+
+SCALES = {"small": 1_000, "medium": 10_000, "large": 100_000}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def _benchmarks(states: Dict[str, List[int]]) -> Dict[str, Callable[[Session, int], Any]]:
+    """
+    Each benchmark gets a session and the call number. Benchmarks that change
+    data take a fresh question from a pool on every call.
+    """
+    return {
+        "generation_performance_stats": lambda db, i: get_generation_performance_stats(states["decided"][i], db),
+        "template_performance_stats": lambda db, i: get_template_performance_stats(db),
+        "templates_performance_by_question": lambda db, i: _template_performance(False, db),
+        "next_duel": lambda db, i: get_next_duel(states["in_progress"][i], db),
+        "set_question_winner": lambda db, i: set_question_winner(states["pending_winner"][i], db),
+        "create_duels": lambda db, i: create_duels(states["without_duels"][i], db),
+    }
+
+
+def _measure(engine, benchmark: Callable[[Session, int], Any], repeat: int) -> Dict[str, float]:
+    # Timed calls run without tracemalloc, which slows allocation-heavy code several times over
+    timings = []
+    for i in range(repeat):
+        with Session(engine) as db:
+            started = time.perf_counter()
+            benchmark(db, i)
+            timings.append(time.perf_counter() - started)
+    with Session(engine) as db:
+        tracemalloc.start()
+        benchmark(db, repeat)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "runs": repeat,
+    }
+
+
+def run(
+    spec: DatasetSpec, repeat: int = 10, only: Optional[List[str]] = None, data_dir: str = DATA_DIR
+) -> Dict[str, Any]:
+    if repeat + 1 > spec.pool_size:
+        raise ValueError("repeat must be smaller than the dataset's pool_size")
+    source, states = cached(spec, data_dir)
+    random.seed(spec.seed)  # get_next_duel picks a random undecided duel
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        # Benchmarks that write must not change the cached dataset
+        path = os.path.join(workdir, "bench.db")
+        shutil.copyfile(source, path)
+        engine = create_engine(f"sqlite:///{path}")
+
+        @event.listens_for(engine, "connect")
+        def _foreign_keys(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+        results = {}
+        for name, benchmark in _benchmarks(states).items():
+            if only and name not in only:
+                continue
+            results[name] = _measure(engine, benchmark, repeat)
+        engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"dataset": spec.key, "spec": spec.to_dict(), "benchmarks": results}
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], time_threshold: float = 0.25, memory_threshold: float = 0.25
+) -> List[Dict[str, Any]]:
+    """
+    Benchmarks of `results` against the baseline entry of the same dataset.
+    A regression is a median time or peak memory above baseline * (1 + threshold).
+    """
+    reference = baseline.get(results["dataset"], {})
+    rows = []
+    for name, current in results["benchmarks"].items():
+        base = reference.get(name)
+        if base is None:
+            rows.append({"benchmark": name, "status": "new", **current})
+            continue
+        time_ratio = current["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        memory_ratio = current["peak_kib"] / base["peak_kib"] if base["peak_kib"] else 1.0
+        regressed = time_ratio > 1 + time_threshold or memory_ratio > 1 + memory_threshold
+        rows.append({
+            "benchmark": name,
+            "status": "regression" if regressed else "ok",
+            "time_ratio": round(time_ratio, 2),
+            "memory_ratio": round(memory_ratio, 2),
+            **current,
+        })
+    return rows
+
+
+def save_baseline(results: Dict[str, Any], path: str):
+    """Store the results as the baseline of their dataset, keeping other datasets' entries"""
+    baseline = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            baseline = json.load(file)
+    baseline[results["dataset"]] = {
+        name: {"median_ms": result["median_ms"], "peak_kib": result["peak_kib"]}
+        for name, result in results["benchmarks"].items()
+    }
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark services on synthetic production-scale data")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--questions", type=int, help="Overrides --scale")
+    parser.add_argument("--templates", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--only", nargs="*", help="Benchmark names to run")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="Baseline to compare against")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="Store the results as baseline")
+    parser.add_argument("--time-threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed memory growth")
+    args = parser.parse_args()
+
+    dataset = DatasetSpec(questions=args.questions or SCALES[args.scale], templates=args.templates)
+    result = run(dataset, repeat=args.repeat, only=args.only)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+
+    baseline_data = {}
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as file:
+            baseline_data = json.load(file)
+    table = compare(result, baseline_data, args.time_threshold, args.memory_threshold)
+    print(f"dataset {result['dataset']} ({result['spec']['duels']} duels)")
+    print(f"{'benchmark':<36}{'median ms':>11}{'peak KiB':>11}{'time x':>8}{'mem x':>8}  status")
+    for row in table:
+        print(f"{row['benchmark']:<36}{row['median_ms']:>11}{row['peak_kib']:>11}"
+              f"{row.get('time_ratio', '-'):>8}{row.get('memory_ratio', '-'):>8}  {row['status']}")
+
+    if args.save_baseline:
+        save_baseline(result, args.save_baseline)
+        print(f"Baseline stored in {args.save_baseline}")
+    if args.compare and any(row["status"] == "regression" for row in table):
+        sys.exit(1)
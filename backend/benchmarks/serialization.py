@@ -0,0 +1,126 @@
+"""
+Serialization time of the list and stats responses, per 1k rows, comparing
+FastAPI's response_model path (validate, jsonable dump, json.dumps) with the
+precompiled adapters and orjson-backed dumps used by the routes.
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models.generation import Generation
+from models.questions import GenerationSummary, Question, QuestionSummary
+from routers.questions import GENERATION_SUMMARY_FIELDS, _build_question_summary
+from services import serialization
+
+
+def _question_rows(count: int):
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(1, count + 1):
+        generation = Generation(
+            id=i, template_id=i % 5 + 1, question_id=i, output_text="", output_length=800,
+            llm_model="gpt-4o-mini", latency=1.25, output_tokens=200, input_tokens=40,
+            created_at=start + timedelta(seconds=i),
+        )
+        question = Question(
+            id=i, text=f"Question {i}?", created_at=start + timedelta(seconds=i), selected_generation_id=i,
+        )
+        rows.append((question, generation))
+    return rows
+
+
+def _performance_rows(count: int) -> List[Dict[str, Any]]:
+    created_at = datetime(2025, 1, 1)
+    return [
+        {
+            "generation_id": i, "template_id": i % 5 + 1, "template_name": f"Template {i % 5}",
+            "template_key": f"t{i % 5}", "output_text": "The capital of France is Paris. " * 25,
+            "llm_model": "gpt-4o-mini", "latency": 1.25, "output_tokens": 200, "input_tokens": 40,
+            "created_at": created_at, "wins": i % 3, "total_duels": 4, "win_rate": 50.0,
+        }
+        for i in range(count)
+    ]
+
+
+def _questions_before(rows) -> bytes:
+    # What get_questions did before: a validated model per row, then FastAPI
+    # dumps it, validates it again against response_model and encodes it
+    summaries = [
+        QuestionSummary(
+            id=question.id,
+            text=question.text,
+            created_at=question.created_at,
+            selected_generation_id=question.selected_generation_id,
+            selected_generation=GenerationSummary(
+                id=generation.id,
+                **{field: getattr(generation, field) for field in GENERATION_SUMMARY_FIELDS if field != "id"}
+            ),
+        )
+        for question, generation in rows
+    ]
+    adapter = TypeAdapter(List[QuestionSummary])
+    content = [summary.model_dump(exclude_unset=True) for summary in summaries]
+    validated = adapter.validate_python(content)
+    return json.dumps(adapter.dump_python(validated, mode="json", exclude_unset=True)).encode("utf-8")
+
+
+def _questions_after(rows) -> bytes:
+    summaries = [
+        _build_question_summary(question, generation, GENERATION_SUMMARY_FIELDS)
+        for question, generation in rows
+    ]
+    return serialization.serialize(serialization.QUESTION_SUMMARY_LIST, summaries, exclude_unset=True)
+
+
+def _stats_before(rows) -> bytes:
+    return json.dumps(jsonable_encoder(rows)).encode("utf-8")
+
+
+def _stats_after(rows) -> bytes:
+    return serialization.dumps(rows)
+
+
+def _best_time(fn: Callable[[Any], bytes], data, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(rows: int = 1000, repeat: int = 20) -> Dict[str, Dict[str, float]]:
+    """Best-of-`repeat` milliseconds per 1k rows for each response, before and after"""
+    cases = {
+        "questions_list": (_question_rows(rows), _questions_before, _questions_after),
+        "performance_stats": (_performance_rows(rows), _stats_before, _stats_after),
+    }
+    results = {}
+    for name, (data, before, after) in cases.items():
+        assert json.loads(before(data)) == json.loads(after(data))
+        before_ms = _best_time(before, data, repeat) * 1000 * 1000 / rows
+        after_ms = _best_time(after, data, repeat) * 1000 * 1000 / rows
+        results[name] = {
+            "before_ms": round(before_ms, 3),
+            "after_ms": round(after_ms, 3),
+            "speedup": round(before_ms / after_ms, 2),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark response serialization")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per response")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per case, the best is reported")
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if serialization.orjson is not None else 'no (pydantic-core fallback)'}")
+    print(f"{'response':<20}{'before ms/1k':>14}{'after ms/1k':>14}{'speedup':>10}")
+    for name, result in run(args.rows, args.repeat).items():
+        print(f"{name:<20}{result['before_ms']:>14}{result['after_ms']:>14}{result['speedup']:>9}x")
@@ -1,14 +1,60 @@
+from sqlalchemy import event, inspect, text
 from sqlmodel import SQLModel, create_engine, Session
 
 # Import all models so they register with SQLModel.metadata
 from models.template import Template
-from models.questions import Question
+from models.questions import BatchApiJob, Question
 from models.generation import Generation
+from models.blob import OutputBlob
 from models.duel import Duel, DuelGeneration
+from models.archive import ArchivedQuestion, ArchivedTemplateStats
+from models.snapshot import QuestionResultSnapshot
 
 engine = create_engine("sqlite:///database.db")
-SQLModel.metadata.create_all(engine)
+
+
+@event.listens_for(engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores ON DELETE clauses unless foreign keys are enabled per connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def add_missing_columns(engine):
+    """
+    create_all only creates missing tables, so add columns and indexes that
+    were introduced after an existing table was created.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.tables.values():
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def create_tables(engine):
+    """
+    Create missing tables and columns. A new database starts with incremental
+    auto-vacuum, which can only be switched on without a full VACUUM before
+    the first table exists.
+    """
+    with engine.begin() as connection:
+        if not inspect(connection).get_table_names():
+            connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        SQLModel.metadata.create_all(connection)
+    add_missing_columns(engine)
+
+
+create_tables(engine)
 
 def get_db():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from dotenv import load_dotenv
@@ -6,12 +9,48 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from routers import templates, questions
+from routers import templates, questions, events
+from db import engine
+from services.retention import scheduler_from_env
+from services.batches import resume_batch_api_jobs
+from services.serialization import FastJSONResponse
+from services.compression import CompressionMiddleware, compression_options_from_env
+from services.events import broker_from_env, configure_broker
+from services import metrics, profiling, tracing
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Periodic archival and compaction, enabled by setting RETENTION_DAYS
+    retention_scheduler = scheduler_from_env(engine)
+    if retention_scheduler:
+        retention_scheduler.start()
+    # In-process event fan-out, or a relay shared by all workers when EVENT_BROKER_URL is set
+    event_broker = broker_from_env()
+    configure_broker(event_broker)
+    event_broker.start()
+    # Tracing to a JSONL file or an OTLP collector, when TRACING_JSONL_PATH or TRACING_OTLP_ENDPOINT is set
+    trace_exporter = tracing.exporter_from_env()
+    if trace_exporter:
+        tracing.configure_exporter(trace_exporter)
+        trace_exporter.start()
+    # Batch API jobs submitted before a restart are still running at the provider
+    resume_batch_api_jobs()
+    yield
+    if trace_exporter:
+        tracing.configure_exporter(None)
+        trace_exporter.stop()
+    event_broker.stop()
+    if retention_scheduler:
+        retention_scheduler.stop()
+
 
 app = FastAPI(
     title="LLM Tournament Widget API",
     description="LLM Tournament Widget API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Add CORS middleware
@@ -21,11 +60,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],   # Allow all headers
+    expose_headers=["X-Next-Cursor", "X-Sync-Watermark", "Server-Timing"],  # Pagination, delta sync and profiling headers
 )
 
+# Query count, DB time and slowest statement per request in a Server-Timing header, plus a slow-query log
+app.add_middleware(profiling.QueryProfilerMiddleware)
+profiling.instrument_engines()
+
+# Compress large JSON responses (duel and results payloads carry full LLM answers)
+app.add_middleware(CompressionMiddleware, **compression_options_from_env())
+
+# Request latency per route (outermost, so it includes compression), and SQL statement counts and timings
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engines()
+
+# Root span per request, continuing the caller's traceparent; child spans for SQL statements
+app.add_middleware(tracing.TracingMiddleware)
+tracing.instrument_engines()
+
 # Include routers
 app.include_router(templates.router)
 app.include_router(questions.router)
+app.include_router(events.router)
+
+
+@app.exception_handler(OperationalError)
+async def database_locked(request: Request, exc: OperationalError):
+    """SQLite write contention is transient, so report it as retryable instead of a bare 500"""
+    if "database is locked" not in str(exc.orig):
+        raise exc
+    metrics.DB_LOCK_ERRORS.inc()
+    return JSONResponse(
+        status_code=503, content={"detail": "Database is locked, retry the request"}, headers={"Retry-After": "1"}
+    )
 
 
 @app.get("/")
@@ -33,5 +100,14 @@ def read_root():
     return {"message": "Welcome to the LLM Tournament Widget API"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint. Disabled with METRICS_ENABLED=0."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    metrics.record_threadpool()
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+
+class ArchivedQuestion(SQLModel, table=True):
+    """A decided question moved out of the live tables by the retention job"""
+    id: int = Field(default=None, primary_key=True)
+    question_id: int = Field(index=True)  # Id of the question before it was archived
+    text: str
+    created_at: datetime
+    selected_template_id: Optional[int] = Field(default=None)
+    # zlib-compressed JSON of the question, its generations and duels
+    payload: bytes
+    archived_at: datetime = Field(default_factory=datetime.now)
+
+
+class ArchivedTemplateStats(SQLModel, table=True):
+    """Duel totals of archived questions, kept so overall template stats stay complete"""
+    template_id: int = Field(foreign_key="template.id", primary_key=True, ondelete="CASCADE")
+    total_duels: int = Field(default=0)
+    wins: int = Field(default=0)
@@ -0,0 +1,11 @@
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+
+class OutputBlob(SQLModel, table=True):
+    """Compressed LLM output body, stored once per distinct text"""
+    hash: str = Field(primary_key=True)  # sha256 hex digest of the UTF-8 text
+    length: int  # Length of the decompressed text in characters
+    compression: str = Field(default="zlib")
+    data: bytes
+    created_at: datetime = Field(default_factory=datetime.now)
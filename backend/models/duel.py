@@ -8,8 +8,8 @@ from models.questions import Question
 
 class DuelGeneration(SQLModel, table=True):
     """Junction table for many-to-many relationship between Duel and Generation"""
-    duel_id: int = Field(foreign_key="duel.id", primary_key=True)
-    generation_id: int = Field(foreign_key="generation.id", primary_key=True)
+    duel_id: int = Field(foreign_key="duel.id", primary_key=True, ondelete="CASCADE")
+    generation_id: int = Field(foreign_key="generation.id", primary_key=True, ondelete="CASCADE")
     role: str = Field()  # "generation_a", "generation_b", or "winner"
 
 
@@ -17,8 +17,8 @@ class Duel(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     
     # Foreign keys for the database
-    question_id: int = Field(foreign_key="question.id")
-    winner_id: Optional[int] = Field(default=None, foreign_key="generation.id")
+    question_id: int = Field(foreign_key="question.id", ondelete="CASCADE", index=True)
+    winner_id: Optional[int] = Field(default=None, foreign_key="generation.id", ondelete="SET NULL")
     
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.now)
@@ -1,14 +1,19 @@
+from typing import Optional
 from sqlmodel import Field, SQLModel
 from datetime import datetime
 
 
 class Generation(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
-    template_id: int = Field(foreign_key="template.id")
-    question_id: int = Field(foreign_key="question.id")
-    output_text: str
+    template_id: int = Field(foreign_key="template.id", ondelete="CASCADE")
+    question_id: int = Field(foreign_key="question.id", ondelete="CASCADE", index=True)
+    # Inline text for rows written before output blobs existed. Rows stored in
+    # OutputBlob keep this empty and it is filled in by services.blobs when needed.
+    output_text: str = Field(default="")
+    output_hash: Optional[str] = Field(default=None, foreign_key="outputblob.hash", index=True)
+    output_length: Optional[int] = Field(default=None)
     llm_model: str
     latency: float
     output_tokens: int
     input_tokens: int
-    created_at: datetime = Field(default_factory=datetime.now)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.now)
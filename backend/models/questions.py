@@ -9,8 +9,11 @@ from models.generation import Generation
 class Question(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     text: str
-    created_at: datetime = Field(default_factory=datetime.now)
-    selected_generation_id: Optional[int] = Field(default=None, foreign_key="generation.id")
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+    selected_generation_id: Optional[int] = Field(default=None, foreign_key="generation.id", ondelete="SET NULL")
+    decided_at: Optional[datetime] = Field(default=None, index=True)
+    # Why generating the outputs failed, when it did
+    generation_error: Optional[str] = Field(default=None)
 
 
 class QuestionWithSelectedGeneration(BaseModel):
@@ -21,7 +24,75 @@ class QuestionWithSelectedGeneration(BaseModel):
     selected_generation: Optional[Generation]
 
 
+class GenerationSummary(BaseModel):
+    """Generation returned by list endpoints. Fields that were not requested are left out."""
+    id: int
+    template_id: Optional[int] = None
+    question_id: Optional[int] = None
+    output_text: Optional[str] = None
+    output_length: Optional[int] = None
+    llm_model: Optional[str] = None
+    latency: Optional[float] = None
+    output_tokens: Optional[int] = None
+    input_tokens: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+
+class QuestionSummary(BaseModel):
+    id: int
+    text: str
+    created_at: datetime
+    selected_generation_id: Optional[int]
+    selected_generation: Optional[GenerationSummary]
+
+
 class QuestionResults(BaseModel):
     question: Question
     selected_generation: Optional[Generation]
     generation_performance: List[Dict[str, Any]]
+
+
+class QuestionStatus(BaseModel):
+    """Processing progress of a question"""
+    question_id: int
+    # "generating" until duels exist, then "ready" until a winner is selected, then "decided";
+    # "failed" when generating the outputs failed or passed its deadline
+    state: str
+    generations_done: int
+    generations_expected: int
+    duels_total: int
+    duels_decided: int
+    error: Optional[str] = None
+    # Pass back as ?version= to long poll for the next change
+    version: int
+
+
+class QuestionBatch(BaseModel):
+    """Progress of a bulk upload whose outputs are generated in the background"""
+    id: str
+    status: str  # "pending", "running", "completed" or "failed"
+    # "pipeline" (interactive LLM calls) or "batch_api" (one provider batch job)
+    mode: str = "pipeline"
+    # Generation scheduler class: "bulk" or "backfill"
+    priority: str = "bulk"
+    total: int
+    # Questions whose generations and duels are stored
+    generated: int = 0
+    failed: int = 0
+    question_ids: List[int] = []
+    failed_question_ids: List[int] = []
+    error: Optional[str] = None
+
+
+class BatchApiJob(SQLModel, table=True):
+    """
+    Provider Batch API job of a "batch_api" question batch. Kept until its
+    outputs are stored, so a restarted server resumes waiting for it.
+    """
+    id: str = Field(primary_key=True)  # Provider batch id
+    batch_id: str  # QuestionBatch id
+    llm_model: str
+    status: str  # Last status reported by the provider
+    question_ids: str  # JSON lists
+    template_ids: str
+    created_at: datetime = Field(default_factory=datetime.now)
@@ -0,0 +1,10 @@
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+
+class QuestionResultSnapshot(SQLModel, table=True):
+    """Precomputed /questions/{id}/results payload of a decided question"""
+    question_id: int = Field(foreign_key="question.id", primary_key=True, ondelete="CASCADE")
+    payload: str  # Serialized QuestionResults JSON
+    etag: str
+    created_at: datetime = Field(default_factory=datetime.now)
@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
 from sqlmodel import Field, SQLModel
 
 class Template(SQLModel, table=True):
@@ -7,3 +9,13 @@ class Template(SQLModel, table=True):
     name: str
     template_text: str
     created_at: datetime = Field(default_factory=datetime.now)
+
+
+class TemplateDeletionJob(BaseModel):
+    """Progress of a template deletion running in the background"""
+    id: str
+    template_id: int
+    status: str  # "pending", "running", "completed" or "failed"
+    deleted_generations: int = 0
+    total_generations: int = 0
+    error: Optional[str] = None
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from services.events import event_hub
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+@router.websocket("/ws")
+async def event_feed(websocket: WebSocket, question_id: Optional[int] = None):
+    """Live feed of question lifecycle events, optionally for one question
+
+    Each message is a JSON event with `type`, `question_id` and `timestamp`.
+    Clients that fall too far behind are disconnected with code 1013 and
+    should reconnect and refetch current state.
+    """
+    await websocket.accept()
+    subscription = event_hub.subscribe(question_id)
+    
+    async def send_events():
+        while True:
+            text = await subscription.get()
+            if text is None:
+                await websocket.close(code=1013, reason="Subscriber too slow, events were dropped")
+                return
+            await websocket.send_text(text)
+    
+    async def wait_for_disconnect():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+    
+    tasks = [asyncio.ensure_future(send_events()), asyncio.ensure_future(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_hub.unsubscribe(subscription)
@@ -1,18 +1,49 @@
+import base64
+import json
 import random
-from typing import List, Optional
+import time
+from typing import List, Optional, Tuple
 from datetime import datetime
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import defer, load_only
+from sqlmodel import Session, select, and_, or_, func as sql_func
 
 from models.generation import Generation
 from models.duel import Duel, DuelGeneration, DuelWithGenerations, DecideDuelRequest
 from models.template import Template
-from models.questions import Question, QuestionWithSelectedGeneration, QuestionResults
+from models.questions import (
+    GenerationSummary,
+    Question,
+    QuestionBatch,
+    QuestionResults,
+    QuestionStatus,
+    QuestionSummary,
+    QuestionWithSelectedGeneration,
+)
 from db import engine, get_db
-from services.question import set_question_winner, generation_and_duels_background_task
+from services.question import enqueue_generation, get_question_status, set_question_winner
+from services.deletion import delete_question_cascade
+from services.batches import BATCH_MODES, BATCH_PRIORITIES, create_batch, create_questions, get_batch, question_batch_background_task
+from services import events, tracing
+from services.blobs import load_output_texts
+from services.cache import DUELS, TEMPLATES, bump_question, change_counters, etag_matches, question_key, response_cache
+from services.serialization import DUEL_WITH_GENERATIONS, QUESTION_SUMMARY_LIST, serialize
+from services.snapshots import (
+    SNAPSHOT_CACHE_CONTROL,
+    delete_results_snapshots,
+    freeze_question_results,
+    get_results_snapshot,
+    project_results_snapshot,
+)
 
 router = APIRouter(prefix="/questions", tags=["questions"])
 
+# Upper bound on ?wait= for the status long poll, in seconds
+MAX_STATUS_WAIT = 30.0
+# Most questions accepted by one POST /questions/bulk
+MAX_BULK_QUESTIONS = 10_000
+
 
 @router.post("/", response_model=Question)
 def create_question(
@@ -20,16 +51,85 @@ def create_question(
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
-    db.add(question)
-    db.commit()
-    db.refresh(question)
-    
-    # Add background task to generate outputs
-    background_tasks.add_task(generation_and_duels_background_task, question.id)
+    with tracing.span("create_question") as span:
+        db.add(question)
+        db.commit()
+        db.refresh(question)
+        span.set_attribute("question_id", question.id)
+        bump_question(question.id)
+        
+        # Add background task to generate outputs, continuing this trace
+        enqueue_generation(background_tasks, question.id)
     
     return question
 
 
+def _parse_bulk_questions(body: bytes, content_type: str) -> List[str]:
+    """Question texts from a JSON array or NDJSON lines of {"text": ...} objects or plain strings"""
+    try:
+        if content_type.startswith(("application/x-ndjson", "application/jsonl")):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {exc}")
+    if isinstance(items, dict):
+        items = items.get("questions")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=422, detail="Expected a non-empty list of questions")
+    if len(items) > MAX_BULK_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_QUESTIONS} questions per upload")
+
+    texts = []
+    for number, item in enumerate(items):
+        text = item.get("text") if isinstance(item, dict) else item
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPException(status_code=422, detail=f"Question {number} has no text")
+        texts.append(text)
+    return texts
+
+
+@router.post("/bulk", response_model=QuestionBatch, status_code=202)
+async def create_questions_bulk(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    mode: str = "pipeline",
+    priority: str = "bulk",
+    db: Session = Depends(get_db)
+):
+    """Create many questions in one transaction and generate their outputs as one batch
+    
+    Accepts a JSON array (or {"questions": [...]}) or NDJSON with
+    Content-Type application/x-ndjson. Each item is a question text or an
+    object with a `text` field. Poll /questions/batches/{id} for progress.
+    
+    Args:
+        mode: "pipeline" calls the LLM right away; "batch_api" submits one
+            provider batch job, which is cheaper but may take hours.
+        priority: Scheduler class of the batch's LLM calls, "bulk" or
+            "backfill". Single questions always go first.
+    """
+    if mode not in BATCH_MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {', '.join(BATCH_MODES)}")
+    if priority not in BATCH_PRIORITIES:
+        raise HTTPException(status_code=422, detail=f"priority must be one of {', '.join(BATCH_PRIORITIES)}")
+    texts = _parse_bulk_questions(await request.body(), request.headers.get("content-type", ""))
+    with tracing.span("create_questions_bulk", questions=len(texts)) as span:
+        question_ids = await run_in_threadpool(create_questions, texts, db)
+        batch = create_batch(question_ids, mode, priority)
+        span.set_attribute("batch_id", batch.id)
+        background_tasks.add_task(question_batch_background_task, batch.id, tracing.current_context())
+    return batch
+
+
+@router.get("/batches/{batch_id}", response_model=QuestionBatch)
+def get_question_batch(batch_id: str):
+    batch = get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
 def _build_question_with_generation(question: Question, selected_generation: Optional[Generation] = None) -> QuestionWithSelectedGeneration:
     """Helper function to build QuestionWithSelectedGeneration from question and optional generation"""
     return QuestionWithSelectedGeneration(
@@ -41,38 +141,208 @@ def _build_question_with_generation(question: Question, selected_generation: Opt
     )
 
 
-@router.get("/", response_model=List[QuestionWithSelectedGeneration])
-def get_questions(limit: int = 10, details: bool = False, db: Session = Depends(get_db)):
-    """Get list of questions with optional selected generation details"""
+# Generation fields of the default list summary. output_text is left out so list
+# payloads stay small and the text column is never read unless asked for.
+GENERATION_SUMMARY_FIELDS = [
+    field for field in GenerationSummary.model_fields if field != "output_text"
+]
+
+
+def _parse_fields(fields: Optional[str], allowed, default) -> List[str]:
+    """Parse a comma-separated ?fields= value, rejecting unknown field names"""
+    if not fields:
+        return list(default)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def _build_question_summary(
+    question: Question,
+    selected_generation: Optional[Generation],
+    generation_fields: List[str],
+) -> QuestionSummary:
+    """Helper function to build QuestionSummary with only the requested generation fields"""
+    # Built without validation: the values come straight from typed columns and
+    # the list is serialized once by QUESTION_SUMMARY_LIST
+    summary = None
+    if selected_generation is not None:
+        summary = GenerationSummary.model_construct(
+            id=selected_generation.id,
+            **{field: getattr(selected_generation, field) for field in generation_fields if field != "id"}
+        )
+    return QuestionSummary.model_construct(
+        id=question.id,
+        text=question.text,
+        created_at=question.created_at,
+        selected_generation_id=question.selected_generation_id,
+        selected_generation=summary
+    )
+
+
+def _encode_position(at: datetime, question_id: int) -> str:
+    """Opaque (timestamp, id) keyset position, used by cursors and sync watermarks"""
+    raw = f"{at.isoformat()}|{question_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_position(value: str, name: str) -> Tuple[datetime, int]:
+    try:
+        at, question_id = base64.urlsafe_b64decode(value.encode()).decode().split("|")
+        return datetime.fromisoformat(at), int(question_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail=f"Invalid {name}")
+
+
+def _encode_cursor(question: Question) -> str:
+    """Opaque keyset cursor pointing just past the given question"""
+    return _encode_position(question.created_at, question.id)
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    return _decode_position(cursor, "cursor")
+
+
+def _decode_watermark(updated_since: str) -> Tuple[datetime, Optional[int]]:
+    """
+    (changed_at, id) of an X-Sync-Watermark value. A plain ISO timestamp is
+    accepted too and matches changes strictly after it, so it has no id.
+    """
+    try:
+        return datetime.fromisoformat(updated_since), None
+    except ValueError:
+        return _decode_position(updated_since, "updated_since")
+
+
+def _changed_at(question: Question) -> datetime:
+    return max(question.created_at, question.decided_at or question.created_at)
+
+
+@router.get("/", response_model=List[QuestionSummary], response_model_exclude_unset=True)
+def get_questions(
+    response: Response,
+    limit: int = 10,
+    details: bool = False,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    updated_since: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get list of questions with optional selected generation details
+    
+    Questions are returned newest first. When a full page is returned, the
+    X-Next-Cursor header holds the cursor of the following page.
+    
+    With updated_since, only questions created or decided after that point are
+    returned, oldest change first. X-Sync-Watermark holds the value to pass as
+    updated_since on the next call; repeat while a full page comes back. The
+    watermark is the (change time, id) of the last question returned, so pages
+    may end between questions that changed at the same moment. Deleted and
+    archived questions are not reported: clients that need to drop them
+    reload from the first page.
+    
+    Args:
+        details: Include the selected generation of each question.
+        fields: Comma-separated selected generation fields to return when details=True,
+            e.g. `fields=id,template_id,output_text`. Defaults to every field except output_text.
+        cursor: X-Next-Cursor value of the previous page.
+        updated_since: X-Sync-Watermark of the previous sync, or an ISO timestamp.
+            Cannot be combined with cursor.
+    """
+    if cursor and updated_since:
+        raise HTTPException(status_code=400, detail="cursor and updated_since cannot be combined")
+    
+    generation_fields: List[str] = []
     if details:
+        generation_fields = _parse_fields(fields, GenerationSummary.model_fields, GENERATION_SUMMARY_FIELDS)
+        
+        # Only the requested generation columns are loaded
+        columns = [getattr(Generation, field) for field in generation_fields if field != "output_text"]
+        if "output_text" in generation_fields:
+            columns += [Generation.output_text, Generation.output_hash]
+        
         # When details=True, use LEFT JOIN to fetch generations in one query
         statement = (
             select(Question, Generation)
             .outerjoin(Generation, Question.selected_generation_id == Generation.id)
-            .order_by(Question.created_at.desc())
-            .limit(limit)
+            .options(load_only(*columns))
         )
-        results = db.exec(statement).all()
-        return [
-            _build_question_with_generation(question, selected_generation)
-            for question, selected_generation in results
-        ]
     else:
         # When details=False, only fetch questions (more efficient)
+        statement = select(Question)
+    
+    if updated_since:
+        since_at, since_id = _decode_watermark(updated_since)
+        changed_at = sql_func.max(Question.created_at, sql_func.coalesce(Question.decided_at, Question.created_at))
+        after = changed_at > since_at
+        if since_id is not None:
+            after = or_(after, and_(changed_at == since_at, Question.id > since_id))
         statement = (
-            select(Question)
-            .order_by(Question.created_at.desc())
-            .limit(limit)
+            statement
+            # The indexed columns narrow the scan, the (changed_at, id) comparison resumes mid-timestamp
+            .where(or_(Question.created_at >= since_at, Question.decided_at >= since_at), after)
+            .order_by(changed_at, Question.id)
         )
-        results = db.exec(statement).all()
-        return [
-            _build_question_with_generation(question, None)
-            for question in results
-        ]
+    else:
+        if cursor:
+            cursor_created_at, cursor_id = _decode_cursor(cursor)
+            statement = statement.where(or_(
+                Question.created_at < cursor_created_at,
+                and_(Question.created_at == cursor_created_at, Question.id < cursor_id)
+            ))
+        statement = statement.order_by(Question.created_at.desc(), Question.id.desc())
+    
+    results = db.exec(statement.limit(limit)).all()
+    rows = results if details else [(question, None) for question in results]
+    
+    if "output_text" in generation_fields:
+        load_output_texts((selected_generation for _, selected_generation in rows), db)
+    
+    if updated_since:
+        if rows:
+            last = rows[-1][0]
+            response.headers["X-Sync-Watermark"] = _encode_position(_changed_at(last), last.id)
+        else:
+            response.headers["X-Sync-Watermark"] = updated_since
+    else:
+        if rows and len(rows) == limit:
+            response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1][0])
+        if not cursor:
+            # Latest change and the last question changed then, read through the two indexes
+            latest_created = select(sql_func.max(Question.created_at)).scalar_subquery()
+            latest_decided = select(sql_func.max(Question.decided_at)).scalar_subquery()
+            latest = sql_func.max(latest_created, sql_func.coalesce(latest_decided, latest_created))
+            latest_at, latest_id = db.exec(
+                select(latest, sql_func.max(Question.id))
+                .where(or_(Question.created_at == latest, Question.decided_at == latest))
+            ).one()
+            if latest_at:
+                response.headers["X-Sync-Watermark"] = _encode_position(latest_at, latest_id)
+    
+    summaries = [
+        _build_question_summary(question, selected_generation, generation_fields)
+        for question, selected_generation in rows
+    ]
+    return Response(
+        content=serialize(QUESTION_SUMMARY_LIST, summaries, exclude_unset=True),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
 
 
 @router.get("/{question_id}", response_model=QuestionWithSelectedGeneration)
-def get_question(question_id: int, db: Session = Depends(get_db)):
+def get_question(question_id: int, request: Request, db: Session = Depends(get_db)):
+    # Served from the response cache until the question or a template changes
+    return response_cache.respond(
+        request,
+        [question_key(question_id), TEMPLATES],
+        lambda: _load_question(question_id, db)
+    )
+
+
+def _load_question(question_id: int, db: Session) -> QuestionWithSelectedGeneration:
     # Use a LEFT JOIN to get question with its selected generation in one query
     statement = (
         select(Question, Generation)
@@ -85,6 +355,7 @@ def get_question(question_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Question not found")
     
     question, selected_generation = result
+    load_output_texts([selected_generation], db)
     return _build_question_with_generation(question, selected_generation)
 
 
@@ -97,22 +368,60 @@ def update_question(question_id: int, question: Question, db: Session = Depends(
     for key, value in question.model_dump(exclude_unset=True).items():
         setattr(db_question, key, value)
     
+    delete_results_snapshots([question_id], db)
     db.commit()
     db.refresh(db_question)
+    bump_question(question_id)
     return db_question
 
 
 @router.delete("/{question_id}")
 def delete_question(question_id: int, db: Session = Depends(get_db)):
-    question = db.exec(select(Question).where(Question.id == question_id)).first()
-    if not question:
+    # Set-based delete of the question and its generations, duels and duel entries
+    if delete_question_cascade(question_id, db) is None:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    db.delete(question)
-    db.commit()
     return {"message": "Question deleted successfully"}
 
 
+def _read_status(question_id: int, db: Session) -> Optional[QuestionStatus]:
+    try:
+        return get_question_status(question_id, db)
+    finally:
+        # Hand the connection back to the pool, so a waiting long poll holds none.
+        # The session checks one out again for the next read.
+        db.close()
+
+
+@router.get("/{question_id}/status", response_model=QuestionStatus)
+async def get_status(
+    question_id: int,
+    wait: float = 0,
+    version: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get generation and duel progress of a question
+    
+    Args:
+        wait: Seconds to hold the request (at most 30) while the status is still
+            at `version`. Returns as soon as the question changes.
+        version: `version` of the last status the client saw.
+    """
+    key = question_key(question_id)
+    deadline = time.monotonic() + min(wait, MAX_STATUS_WAIT)
+    while True:
+        # Read before the status, so a write that lands after the query wakes the wait below
+        seen = change_counters.version([key])[0]
+        status = await run_in_threadpool(_read_status, question_id, db)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Question not found")
+        remaining = deadline - time.monotonic()
+        if version is None or status.version != version or remaining <= 0:
+            return status
+        # Only wakes for writes made by this process; other workers' changes show up at the deadline
+        await change_counters.wait_for_change(key, seen, remaining)
+
+
 @router.get("/{question_id}/duels", response_model=List[Duel])
 def get_duels_by_question(question_id: int, db: Session = Depends(get_db)):
     statement = select(Duel).where(Duel.question_id == question_id)
@@ -134,15 +443,15 @@ def get_next_duel(question_id: int, db: Session = Depends(get_db)):
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    # Check if generations exist for this question
-    generations = db.exec(select(Generation).where(Generation.question_id == question_id)).all()
-    if not generations:
+    # Check if generations exist for this question (ids only, the rows can be large)
+    generation = db.exec(select(Generation.id).where(Generation.question_id == question_id).limit(1)).first()
+    if generation is None:
         # Question exists but generations haven't been created yet - still processing
         raise HTTPException(status_code=202, detail="Question is still being processed")
     
     # Check if duels exist for this question
-    duels = db.exec(select(Duel).where(Duel.question_id == question_id)).all()
-    if not duels:
+    duel = db.exec(select(Duel.id).where(Duel.question_id == question_id).limit(1)).first()
+    if duel is None:
         # Generations exist but duels haven't been created yet - still processing
         raise HTTPException(status_code=202, detail="Duels are still being created")
     
@@ -153,6 +462,8 @@ def get_next_duel(question_id: int, db: Session = Depends(get_db)):
         .join(Generation, DuelGeneration.generation_id == Generation.id)
         .join(Question, Duel.question_id == Question.id)
         .where(Duel.question_id == question_id, Duel.winner_id == None)
+        # Output text is only loaded for the duel that is returned
+        .options(defer(Generation.output_text))
     )
     
     results = db.exec(statement).all()
@@ -183,8 +494,9 @@ def get_next_duel(question_id: int, db: Session = Depends(get_db)):
     
     duel_data = random.choice(valid_duels)
     duel = duel_data['duel']
+    load_output_texts(duel_data['generations'].values(), db)
     
-    return DuelWithGenerations(
+    next_duel = DuelWithGenerations.model_construct(
         id=duel.id,
         winner_id=duel.winner_id,
         created_at=duel.created_at,
@@ -193,7 +505,7 @@ def get_next_duel(question_id: int, db: Session = Depends(get_db)):
         generation_a=duel_data['generations']['generation_a'],
         generation_b=duel_data['generations']['generation_b']
     )
-    
+    return Response(content=serialize(DUEL_WITH_GENERATIONS, next_duel), media_type="application/json")
 
 
 @router.post("/{question_id}/duels/{duel_id}/decide", response_model=Duel)
@@ -226,32 +538,59 @@ def decide_duel(question_id: int, duel_id: int, request: DecideDuelRequest, db:
     duel.decided_at = datetime.now()
     db.commit()
     
+    events.publish(events.DUEL_DECIDED, question_id, duel_id=duel_id, winner_id=request.winner_id)
+    
     # Check if all duels are decided and set winner
     set_question_winner(question_id, db)
+    bump_question(question_id, DUELS)
     return duel
 
 @router.get("/{question_id}/results", response_model=QuestionResults)
-def get_question_results(question_id: int, db: Session = Depends(get_db)):
-    from services.performance import get_generation_performance_stats
+def get_question_results(
+    question_id: int,
+    request: Request,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get the selected generation and per-generation performance of a question
     
-    # Single query to get question with its selected generation
-    statement = (
-        select(Question, Generation)
-        .outerjoin(Generation, Question.selected_generation_id == Generation.id)
-        .where(Question.id == question_id)
+    Args:
+        fields: Comma-separated keys to return for each generation_performance entry,
+            e.g. `fields=generation_id,template_name,win_rate`. Defaults to every key
+            except output_text.
+    """
+    from services.performance import GENERATION_PERFORMANCE_FIELDS, GENERATION_PERFORMANCE_SUMMARY_FIELDS
+
+    performance_fields = _parse_fields(fields, GENERATION_PERFORMANCE_FIELDS, GENERATION_PERFORMANCE_SUMMARY_FIELDS)
+    # Decided questions are served from their frozen snapshot, which carries every key
+    snapshot = get_results_snapshot(question_id, db)
+    if snapshot:
+        payload, etag = project_results_snapshot(snapshot, performance_fields)
+        headers = {"ETag": etag, "Cache-Control": SNAPSHOT_CACHE_CONTROL}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=payload, media_type="application/json", headers=headers)
+    
+    # Served from the response cache until the question or a template changes
+    return response_cache.respond(
+        request,
+        [question_key(question_id), TEMPLATES],
+        lambda: _load_question_results(question_id, performance_fields, db)
     )
+
+
+def _load_question_results(question_id: int, performance_fields: List[str], db: Session) -> QuestionResults:
+    from services.performance import build_question_results
     
-    result = db.exec(statement).first()
-    if not result:
+    results = build_question_results(question_id, db, fields=performance_fields)
+    if results is None:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    question, selected_generation = result
-    
-    # Get generation performance stats for this question
-    generation_performance = get_generation_performance_stats(question_id, db)
-    
-    return QuestionResults(
-        question=question,
-        selected_generation=selected_generation,
-        generation_performance=generation_performance
-    )
\ No newline at end of file
+    # Decided questions without a snapshot (e.g. after a template deletion) get a new one,
+    # with every key. Storing it commits and expires the loaded rows, so return the
+    # serialized payload.
+    if results.question.selected_generation_id is not None:
+        snapshot = freeze_question_results(question_id, db)
+        if snapshot is not None:
+            return json.loads(project_results_snapshot(snapshot, performance_fields)[0])
+    return results
@@ -1,12 +1,16 @@
 from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select, case
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from sqlmodel import Session, select
 
-from models.template import Template
-from models.duel import Duel, DuelGeneration
-from models.generation import Generation
-from models.questions import Question
+from models.template import Template, TemplateDeletionJob
 from db import get_db
+from services.cache import DUELS, QUESTIONS, TEMPLATES, bump, response_cache
+from services.deletion import (
+    create_template_deletion_job,
+    delete_template_cascade,
+    get_template_deletion_job,
+    template_deletion_background_task,
+)
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
@@ -16,17 +20,19 @@ def create_template(template: Template, db: Session = Depends(get_db)):
     db.add(template)
     db.commit()
     db.refresh(template)
+    bump(TEMPLATES)
     return template
 
 
 @router.get("/", response_model=List[Template])
-def get_templates(db: Session = Depends(get_db)):
+def get_templates(request: Request, db: Session = Depends(get_db)):
     statement = select(Template)
-    return db.exec(statement).all()
+    return response_cache.respond(request, [TEMPLATES], lambda: db.exec(statement).all())
 
 
 @router.get("/performance", response_model=Dict[str, Any])
 def get_template_performance(
+    request: Request,
     overall_only: bool = False,
     db: Session = Depends(get_db)
 ):
@@ -38,7 +44,16 @@ def get_template_performance(
     Args:
         overall_only: If True, return only overall performance. If False, return both overall and by-question.
     """
-    from services.performance import get_template_performance_stats
+    # Recomputed only after a template, question or duel write
+    return response_cache.respond(
+        request,
+        [TEMPLATES, QUESTIONS, DUELS],
+        lambda: _template_performance(overall_only, db)
+    )
+
+
+def _template_performance(overall_only: bool, db: Session) -> Dict[str, Any]:
+    from services.performance import get_question_template_performance_stats, get_template_performance_stats
     
     # Get overall performance using shared service
     overall_performance = get_template_performance_stats(db)["overall"]
@@ -49,77 +64,23 @@ def get_template_performance(
             "overall": overall_performance
         }
     
-    # For by_question data, we need to implement the per-question logic
-    # This is more complex and specific to the templates endpoint
-    from sqlmodel import func as sql_func
-    
-    # Single optimized query for per-question performance with template data
-    question_query = select(
-        Template,
-        Duel.question_id,
-        sql_func.count().label('total_duels'),
-        sql_func.sum(case((Generation.id == Duel.winner_id, 1), else_=0)).label('wins')
-    ).select_from(
-        Duel
-    ).join(
-        DuelGeneration, Duel.id == DuelGeneration.duel_id
-    ).join(
-        Generation, DuelGeneration.generation_id == Generation.id
-    ).join(
-        Template, Generation.template_id == Template.id
-    ).join(
-        Question, Duel.question_id == Question.id
-    ).where(
-        Duel.winner_id.isnot(None),
-        Question.selected_generation_id.isnot(None)
-    ).group_by(
-        Template.id,
-        Duel.question_id
-    )
-    
-    # Execute question query
-    question_results = db.exec(question_query).all()
-    
-    # Get all questions
-    all_questions = {q.id: q for q in db.exec(select(Question)).all()}
-    
-    # Format per-question performance
-    question_performance_map: Dict[int, List[Dict[str, Any]]] = {}
-    
-    for template, question_id, total_duels, wins in question_results:
-        if question_id not in question_performance_map:
-            question = all_questions.get(question_id)
-            question_performance_map[question_id] = {
-                "question_data": {
-                    "question_id": question_id,
-                    "question_text": question.text if question else f"Question {question_id}",
-                    "template_performance": []
-                }
-            }
-        
-        win_rate = (wins / total_duels * 100) if total_duels > 0 else 0
-        
-        question_performance_map[question_id]["question_data"]["template_performance"].append({
-            "template_id": template.id,
-            "template_name": template.name,
-            "template_key": template.key,
-            "wins": wins,
-            "total_duels": total_duels,
-            "win_rate": round(win_rate, 2)
-        })
-    
-    # Sort each question's templates by win rate and format final structure
-    by_question = []
-    for question_id, data in question_performance_map.items():
-        data["question_data"]["template_performance"].sort(key=lambda x: x["win_rate"], reverse=True)
-        by_question.append(data["question_data"])
-    
     return {
-        "by_question": by_question,
+        "by_question": get_question_template_performance_stats(db),
         "overall": overall_performance
     }
 
 
+@router.get("/performance/coalescing", response_model=Dict[str, Dict[str, int]])
+def get_performance_coalescing():
+    """
+    Single-flight counters of the performance aggregates: calls received,
+    computations executed and calls that joined an in-flight computation.
+    """
+    from services.performance import performance_flight
+
+    return performance_flight.stats()
+
+
 @router.get("/{template_id}", response_model=Template)
 def get_template(template_id: int, db: Session = Depends(get_db)):
     template = db.get(Template, template_id)
@@ -140,62 +101,46 @@ def update_template(template_id: int, template: Template, db: Session = Depends(
     db.add(db_template)
     db.commit()
     db.refresh(db_template)
+    bump(TEMPLATES)
     return db_template
 
 
 @router.delete("/{template_id}")
-def delete_template(template_id: int, db: Session = Depends(get_db)):
-    template = db.get(Template, template_id)
-    if not template:
+def delete_template(
+    template_id: int,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    background: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Delete a template together with its generations, duels and duel entries.
+
+    Args:
+        background: If True, run the deletion as a background job and return 202
+            with a job that can be polled at /templates/deletions/{job_id}.
+    """
+    if not db.get(Template, template_id):
         raise HTTPException(status_code=404, detail="Template not found")
     
-    # Get all generations that use this template
-    generations = db.exec(select(Generation).where(Generation.template_id == template_id)).all()
-    generation_ids = [gen.id for gen in generations]
+    if background:
+        job = create_template_deletion_job(template_id)
+        background_tasks.add_task(template_deletion_background_task, job.id, template_id)
+        response.status_code = 202
+        return job
     
-    if not generation_ids:
-        # No generations to clean up, just delete template
-        db.delete(template)
-        db.commit()
+    deleted = delete_template_cascade(template_id, db)
+    if not deleted["generations"]:
         return {"message": "Template deleted successfully (no associated generations)"}
     
-    # 1. Update questions that have any of these generations as selected_generation_id
-    questions_to_update = db.exec(
-        select(Question).where(Question.selected_generation_id.in_(generation_ids))
-    ).all()
-    for question in questions_to_update:
-        question.selected_generation_id = None
-        db.add(question)
-    
-    # 2. Get all duel IDs that involve any of these generations
-    duel_generations = db.exec(
-        select(DuelGeneration).where(DuelGeneration.generation_id.in_(generation_ids))
-    ).all()
-    duel_ids = list(set([dg.duel_id for dg in duel_generations]))
-    
-    # 3. Delete all DuelGeneration entries for these duels
-    if duel_ids:
-        # Delete all DuelGeneration entries for these duels
-        duel_gen_entries = db.exec(
-            select(DuelGeneration).where(DuelGeneration.duel_id.in_(duel_ids))
-        ).all()
-        for dg_entry in duel_gen_entries:
-            db.delete(dg_entry)
-        
-        # Delete the duels themselves
-        duels_to_delete = db.exec(select(Duel).where(Duel.id.in_(duel_ids))).all()
-        for duel in duels_to_delete:
-            db.delete(duel)
-    
-    # 4. Delete all generations
-    for generation in generations:
-        db.delete(generation)
-    
-    # 5. Finally, delete the template
-    db.delete(template)
-    db.commit()
-    
     return {
-        "message": f"Template deleted successfully along with {len(generations)} associated generations and their related data"
+        "message": f"Template deleted successfully along with {deleted['generations']} associated generations and their related data"
     }
 
+
+@router.get("/deletions/{job_id}", response_model=TemplateDeletionJob)
+def get_template_deletion(job_id: str):
+    job = get_template_deletion_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
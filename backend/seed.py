@@ -1,6 +1,16 @@
-from sqlmodel import Session, select
-from db import engine
+import argparse
+import random
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import Engine
+from sqlmodel import Session, create_engine, select
+from db import create_tables, engine
 from models.template import Template
+from services.blobs import output_hash
+from services.synthetic import LatencyModel, count_prompt_tokens
 
 TEMPLATES = [
     {"key": "direct", "name": "Direct",
@@ -13,27 +23,297 @@ TEMPLATES = [
         "template_text": "If uncertain, say so briefly; then answer clearly: {{question}}"},
 ]
 
+_WORDS = (
+    "the capital of france is paris which lies on the river seine and has a population of about two "
+    "million people in the city proper while the wider region is home to many more residents because "
+    "it is the economic and cultural centre of the country"
+).split()
+_TOPICS = (
+    "photosynthesis", "the French revolution", "compound interest", "plate tectonics", "the immune system",
+    "black holes", "inflation", "the Roman empire", "machine learning", "climate change", "vaccines",
+    "the stock market", "quantum computing", "the water cycle", "jazz", "the printing press",
+)
+_ASKS = ("What is", "How does", "Why does", "Explain", "Summarize", "What caused", "Who discovered")
+
 
 def seed_templates():
     """Seed templates into the database"""
     with Session(engine) as session:
+        existing = set(session.exec(
+            select(Template.key).where(Template.key.in_([t["key"] for t in TEMPLATES]))
+        ).all())
         for template_data in TEMPLATES:
-            # Check if template already exists
-            existing = session.exec(
-                select(Template).where(Template.key == template_data["key"])
-            ).first()
-            
-            if not existing:
-                template = Template(**template_data)
-                session.add(template)
+            if template_data["key"] not in existing:
+                session.add(Template(**template_data))
                 print(f"✓ Created template: {template_data['name']}")
             else:
                 print(f"⊘ Template already exists: {template_data['name']}")
-        
+
         session.commit()
         print("\n✨ Seeding complete!")
 
 
+class BulkSeedSpec:
+    """
+    Shape of a synthetic dataset. Every question gets a generation per
+    template and a duel per pair of generations. Questions are decided,
+    partly judged, judged without a selected winner (`pending_winner`) or
+    still without duels (`without_duels`); the last two are the newest.
+
+    Template k wins a duel against template j with probability
+    s_k / (s_k + s_j), where s_k = 1 / (k + 1) ** win_skew, so 0 gives even
+    duels and larger values make the first templates dominate. Output sizes
+    follow a lognormal distribution over `distinct_outputs` stored bodies.
+    """
+
+    def __init__(
+        self,
+        questions: int = 10_000,
+        templates: int = 4,
+        decided_fraction: float = 0.7,
+        pending_winner: int = 0,
+        without_duels: int = 0,
+        output_chars_mean: int = 400,
+        output_chars_stddev: int = 250,
+        distinct_outputs: int = 2000,
+        win_skew: float = 1.0,
+        seed: int = 0,
+        start: datetime = datetime(2025, 1, 1),
+    ):
+        if templates < 2:
+            raise ValueError("at least two templates are needed for duels")
+        if pending_winner + without_duels > questions:
+            raise ValueError("pending_winner and without_duels must not exceed questions")
+        self.questions = questions
+        self.templates = templates
+        self.decided_fraction = decided_fraction
+        self.pending_winner = pending_winner
+        self.without_duels = without_duels
+        self.output_chars_mean = output_chars_mean
+        self.output_chars_stddev = output_chars_stddev
+        self.distinct_outputs = distinct_outputs
+        self.win_skew = win_skew
+        self.seed = seed
+        self.start = start
+
+    @property
+    def duels_per_question(self) -> int:
+        return self.templates * (self.templates - 1) // 2
+
+    def strengths(self) -> List[float]:
+        return [1 / (k + 1) ** self.win_skew for k in range(self.templates)]
+
+
+def _timestamp(value: datetime) -> str:
+    # SQLAlchemy's SQLite DateTime storage format, so range filters and ordering compare correctly
+    return value.isoformat(sep=" ", timespec="microseconds")
+
+
+def _output_texts(rng: random.Random, spec: BulkSeedSpec) -> List[str]:
+    sizes = LatencyModel("lognormal", spec.output_chars_mean, spec.output_chars_stddev)
+    texts = []
+    for _ in range(spec.distinct_outputs):
+        chars = max(20, round(sizes.sample(rng)))
+        words, length = [], 0
+        while length < chars:
+            word = rng.choice(_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        texts.append(" ".join(words).capitalize() + ".")
+    return texts
+
+
+@contextmanager
+def bulk_load(connection):
+    """
+    Trade durability for load speed on `connection`: no fsync, an in-memory
+    rollback journal, a larger page cache and no foreign key checks. The
+    previous settings are restored afterwards.
+    """
+    settings = {"synchronous": "OFF", "journal_mode": "MEMORY", "cache_size": "-262144",
+                "temp_store": "MEMORY", "foreign_keys": "OFF"}
+    previous = {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in settings}
+    for name, value in settings.items():
+        connection.exec_driver_sql(f"PRAGMA {name}={value}")
+    try:
+        yield connection
+    finally:
+        # The journal mode cannot change inside a transaction
+        connection.rollback()
+        for name, value in previous.items():
+            connection.exec_driver_sql(f"PRAGMA {name}={value}")
+
+
+def _ensure_templates(connection, spec: BulkSeedSpec, created_at: str) -> List[int]:
+    """Ids of the spec's templates: the standard ones first, then synthetic ones, creating any that are missing"""
+    wanted = TEMPLATES[:spec.templates] + [
+        {"key": f"synthetic_{n}", "name": f"Synthetic {n}", "template_text": f"Style {n}: {{{{question}}}}"}
+        for n in range(len(TEMPLATES), spec.templates)
+    ]
+    existing = dict(connection.exec_driver_sql("SELECT key, id FROM template").all())
+    missing = [t for t in wanted if t["key"] not in existing]
+    if missing:
+        connection.exec_driver_sql(
+            "INSERT INTO template (key, name, template_text, created_at) VALUES (?, ?, ?, ?)",
+            [(t["key"], t["name"], t["template_text"], created_at) for t in missing],
+        )
+        existing = dict(connection.exec_driver_sql("SELECT key, id FROM template").all())
+    return [existing[t["key"]] for t in wanted]
+
+
+def bulk_seed(target: Engine, spec: BulkSeedSpec, batch_questions: int = 5000) -> Dict[str, List[int]]:
+    """
+    Append a synthetic dataset to the database of `target` in a single
+    transaction, with one executemany per table and batch. Returns the new
+    question ids by state: decided, in_progress, pending_winner and
+    without_duels.
+    """
+    rng = random.Random(spec.seed)
+    texts = _output_texts(rng, spec)
+    blobs = {}
+    for body in texts:
+        blobs[output_hash(body)] = body
+    hashes = list(blobs)
+    first_token = LatencyModel("lognormal", 0.6, 0.4)
+    strengths = spec.strengths()
+    pairs = [(a, b) for a in range(spec.templates) for b in range(a + 1, spec.templates)]
+    pending_from = spec.questions - spec.pending_winner - spec.without_duels
+    without_duels_from = spec.questions - spec.without_duels
+    states: Dict[str, List[int]] = {"decided": [], "in_progress": [], "pending_winner": [], "without_duels": []}
+
+    with target.connect() as connection, bulk_load(connection):
+        now = _timestamp(datetime.now())
+        template_ids = _ensure_templates(connection, spec, _timestamp(spec.start))
+        template_texts = dict(connection.exec_driver_sql("SELECT id, template_text FROM template").all())
+        connection.exec_driver_sql(
+            "INSERT OR IGNORE INTO outputblob (hash, length, compression, data, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(digest, len(body), "zlib", zlib.compress(body.encode("utf-8")), now) for digest, body in blobs.items()],
+        )
+        # Explicit ids let duels reference generations without reading them back
+        question_id, generation_id, duel_id = (
+            connection.exec_driver_sql(f"SELECT coalesce(max(id), 0) FROM {table}").scalar()
+            for table in ("question", "generation", "duel")
+        )
+
+        for first in range(0, spec.questions, batch_questions):
+            questions, generations, duels, duel_generations = [], [], [], []
+            for number in range(first, min(first + batch_questions, spec.questions)):
+                question_id += 1
+                created_at = spec.start + timedelta(seconds=number * 30)
+                created = _timestamp(created_at)
+                text = f"{rng.choice(_ASKS)} {rng.choice(_TOPICS)}? (#{question_id})"
+
+                generation_ids = []
+                for template_id in template_ids:
+                    generation_id += 1
+                    generation_ids.append(generation_id)
+                    digest = rng.choice(hashes)
+                    length = len(blobs[digest])
+                    output_tokens = max(1, length // 4)
+                    prompt = template_texts[template_id].replace("{{question}}", text)
+                    generations.append((
+                        generation_id, template_id, question_id, "", digest, length, "gpt-4o-mini",
+                        round(first_token.sample(rng) + output_tokens / 80, 3), output_tokens,
+                        count_prompt_tokens(prompt), created,
+                    ))
+
+                if number >= without_duels_from:
+                    state, decided_duels = "without_duels", 0
+                elif number >= pending_from:
+                    state, decided_duels = "pending_winner", len(pairs)
+                elif rng.random() < spec.decided_fraction:
+                    state, decided_duels = "decided", len(pairs)
+                else:
+                    state, decided_duels = "in_progress", rng.randrange(len(pairs))
+                states[state].append(question_id)
+
+                wins: Dict[int, int] = {}
+                if state != "without_duels":
+                    decided = set(rng.sample(range(len(pairs)), decided_duels))
+                    for index, (a, b) in enumerate(pairs):
+                        duel_id += 1
+                        winner_id = decided_at = None
+                        if index in decided:
+                            a_wins = rng.random() < strengths[a] / (strengths[a] + strengths[b])
+                            winner_id = generation_ids[a] if a_wins else generation_ids[b]
+                            wins[winner_id] = wins.get(winner_id, 0) + 1
+                            decided_at = _timestamp(created_at + timedelta(minutes=index + 1))
+                        duels.append((duel_id, question_id, winner_id, created, decided_at))
+                        duel_generations.append((duel_id, generation_ids[a], "generation_a"))
+                        duel_generations.append((duel_id, generation_ids[b], "generation_b"))
+
+                selected_id = decided_on = None
+                if state == "decided":
+                    # Same rule as set_question_winner: most wins, lowest id on ties
+                    most = max(wins.values())
+                    selected_id = min(g for g, count in wins.items() if count == most)
+                    decided_on = _timestamp(created_at + timedelta(minutes=len(pairs) + 1))
+                questions.append((question_id, text, created, selected_id, decided_on))
+
+            connection.exec_driver_sql(
+                "INSERT INTO question (id, text, created_at, selected_generation_id, decided_at) VALUES (?, ?, ?, ?, ?)",
+                questions,
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO generation (id, template_id, question_id, output_text, output_hash, output_length, "
+                "llm_model, latency, output_tokens, input_tokens, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                generations,
+            )
+            if duels:
+                connection.exec_driver_sql(
+                    "INSERT INTO duel (id, question_id, winner_id, created_at, decided_at) VALUES (?, ?, ?, ?, ?)",
+                    duels,
+                )
+                connection.exec_driver_sql(
+                    "INSERT INTO duelgeneration (duel_id, generation_id, role) VALUES (?, ?, ?)", duel_generations,
+                )
+        connection.commit()
+        # Fresh statistics so the query planner picks the indexes on the new data
+        connection.exec_driver_sql("ANALYZE")
+        connection.commit()
+    return states
+
+
+def _engine_for(path: Optional[str]) -> Engine:
+    target = engine if path is None else create_engine(f"sqlite:///{path}")
+    create_tables(target)
+    return target
+
+
 if __name__ == "__main__":
-    seed_templates()
+    parser = argparse.ArgumentParser(description="Seed templates, or with --questions a synthetic dataset")
+    parser.add_argument("--questions", type=int, help="Number of synthetic questions to generate")
+    parser.add_argument("--templates", type=int, default=len(TEMPLATES))
+    parser.add_argument("--decided-fraction", type=float, default=0.7)
+    parser.add_argument("--pending-winner", type=int, default=0, help="Judged questions without a selected winner")
+    parser.add_argument("--without-duels", type=int, default=0, help="Questions whose duels are not created yet")
+    parser.add_argument("--output-chars", type=int, default=400, help="Mean output length")
+    parser.add_argument("--output-chars-stddev", type=int, default=250)
+    parser.add_argument("--distinct-outputs", type=int, default=2000)
+    parser.add_argument("--win-skew", type=float, default=1.0, help="0 for evenly matched templates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", help="SQLite file to fill instead of the app database")
+    args = parser.parse_args()
 
+    if args.questions is None:
+        seed_templates()
+    else:
+        bulk_spec = BulkSeedSpec(
+            questions=args.questions,
+            templates=args.templates,
+            decided_fraction=args.decided_fraction,
+            pending_winner=args.pending_winner,
+            without_duels=args.without_duels,
+            output_chars_mean=args.output_chars,
+            output_chars_stddev=args.output_chars_stddev,
+            distinct_outputs=args.distinct_outputs,
+            win_skew=args.win_skew,
+            seed=args.seed,
+        )
+        started = time.perf_counter()
+        seeded = bulk_seed(_engine_for(args.database), bulk_spec)
+        duel_count = (bulk_spec.questions - bulk_spec.without_duels) * bulk_spec.duels_per_question
+        print(f"✓ Seeded {bulk_spec.questions} questions, {bulk_spec.questions * bulk_spec.templates} generations "
+              f"and {duel_count} duels in {time.perf_counter() - started:.1f}s")
+        for name, ids in seeded.items():
+            print(f"  {name}: {len(ids)}")
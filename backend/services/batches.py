@@ -0,0 +1,363 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import insert
+from sqlmodel import Session, delete, select, update
+from db import engine
+from models.questions import BatchApiJob, Question, QuestionBatch
+from models.template import Template
+from services import cancellation, metrics, tracing
+from services.cache import bump_question
+from services.question import record_generation_failure, store_outputs_and_duels, store_outputs_and_duels_bulk
+from services.scheduler import BACKFILL, BULK, pipeline
+
+logger = logging.getLogger(__name__)
+
+BATCH_TASK = "question_batch"
+BATCH_MODES = ("pipeline", "batch_api")
+# Scheduler classes a batch may run in; interactive is kept for single questions
+BATCH_PRIORITIES = (BULK, BACKFILL)
+
+# Questions stored per transaction when the outputs of a Batch API job arrive
+STORE_CHUNK_SIZE = 100
+# Finished batches stay readable for this long, and at most this many are kept
+FINISHED_RETENTION_SECONDS = 3600
+MAX_FINISHED_BATCHES = 1000
+
+_batches: Dict[str, QuestionBatch] = {}
+# (finish time, id) of finished batches, oldest first
+_finished: deque = deque()
+_batches_lock = threading.Lock()
+
+
+def create_questions(texts: List[str], db: Session) -> List[int]:
+    """Insert questions in one transaction and return their ids in input order"""
+    created_at = datetime.now()
+    # Distinct, increasing creation times keep the upload order in lists and sync watermarks
+    rows = [{"text": text, "created_at": created_at + timedelta(microseconds=i)} for i, text in enumerate(texts)]
+    # RETURNING rows are in no guaranteed order; the creation times give it back in one statement
+    returned = db.execute(insert(Question.__table__).returning(Question.created_at, Question.id), rows).all()
+    ids = [question_id for _, question_id in sorted(returned)]
+    db.commit()
+    for question_id in ids:
+        bump_question(question_id)
+    return ids
+
+
+def create_batch(question_ids: List[int], mode: str = "pipeline", priority: str = BULK) -> QuestionBatch:
+    """Register a pending batch for questions that still need generations"""
+    batch = QuestionBatch(
+        id=uuid.uuid4().hex, status="pending", mode=mode, priority=priority, total=len(question_ids),
+        question_ids=question_ids,
+    )
+    with _batches_lock:
+        _evict_finished(time.monotonic())
+        _batches[batch.id] = batch
+    return batch.model_copy()
+
+
+def get_batch(batch_id: str) -> Optional[QuestionBatch]:
+    with _batches_lock:
+        batch = _batches.get(batch_id)
+        return batch.model_copy() if batch else None
+
+
+def _update_batch(batch_id: str, **changes):
+    with _batches_lock:
+        batch = _batches[batch_id]
+        for key, value in changes.items():
+            setattr(batch, key, value)
+        if changes.get("status") in ("completed", "failed"):
+            _finished.append((time.monotonic(), batch_id))
+
+
+def _evict_finished(now: float):
+    while _finished and (
+        len(_finished) > MAX_FINISHED_BATCHES or now - _finished[0][0] > FINISHED_RETENTION_SECONDS
+    ):
+        _batches.pop(_finished.popleft()[1], None)
+
+
+def _record_question(batch_id: str, question_id: int, ok: bool):
+    with _batches_lock:
+        batch = _batches[batch_id]
+        if ok:
+            batch.generated += 1
+        else:
+            batch.failed += 1
+            batch.failed_question_ids.append(question_id)
+
+
+def question_batch_background_task(batch_id: str, trace_parent: Optional[tracing.SpanContext] = None):
+    """Background task that generates the outputs and duels of every question in a batch"""
+    batch = get_batch(batch_id)
+    _update_batch(batch_id, status="running")
+    metrics.BACKGROUND_TASKS_RUNNING.inc(task=BATCH_TASK)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracing.span("question_batch", parent=trace_parent, batch_id=batch_id, questions=batch.total,
+                          mode=batch.mode):
+            # A submitted Batch API job is awaited on its own thread, which completes the batch
+            waiting = False
+            if batch.mode == "batch_api":
+                waiting = _submit_batch_api_job(batch_id, batch.question_ids)
+            else:
+                _generate_batch(batch_id, batch.question_ids, batch.priority)
+        outcome = "ok"
+        if not waiting:
+            _update_batch(batch_id, status="completed")
+    except Exception as exc:
+        logger.exception("Question batch %s failed", batch_id)
+        _update_batch(batch_id, status="failed", error=str(exc))
+    finally:
+        metrics.BACKGROUND_TASKS_RUNNING.dec(task=BATCH_TASK)
+        metrics.BACKGROUND_TASK_DURATION.observe(time.perf_counter() - started, task=BATCH_TASK, outcome=outcome)
+
+
+def _load_batch(question_ids: List[int]) -> Tuple[List[Template], Dict[int, Question]]:
+    # Detached after loading: pipeline threads read them while the batch thread commits
+    with Session(engine) as db:
+        templates = db.exec(select(Template)).all()
+        questions = {
+            question.id: question
+            for question in db.exec(select(Question).where(Question.id.in_(question_ids))).all()
+        }
+    return templates, questions
+
+
+def _submit_batch_api_job(batch_id: str, question_ids: List[int]) -> bool:
+    """
+    Submit a batch's prompts as one Batch API job, recorded in the database
+    and awaited on a new thread. Returns False when every completion was
+    cached and the outputs are already stored.
+    """
+    from services.llm import provider_from_env, start_outputs_batch
+
+    templates, questions = _load_batch(question_ids)
+    provider = provider_from_env()
+    provider_batch_id = start_outputs_batch(templates, _by_key(questions), provider)
+    if provider_batch_id is None:
+        _store_batch_api_outputs(batch_id, question_ids, templates, questions, provider, None, 0.0)
+        return False
+    with Session(engine) as db:
+        db.add(BatchApiJob(
+            id=provider_batch_id, batch_id=batch_id, llm_model=provider.model, status="validating",
+            question_ids=json.dumps(question_ids), template_ids=json.dumps([template.id for template in templates]),
+        ))
+        db.commit()
+    _start_waiting(provider_batch_id)
+    return True
+
+
+def resume_batch_api_jobs() -> int:
+    """Wait again for the Batch API jobs a previous server left unfinished. Returns the number resumed."""
+    with Session(engine) as db:
+        jobs = db.exec(select(BatchApiJob)).all()
+    for job in jobs:
+        question_ids = json.loads(job.question_ids)
+        with _batches_lock:
+            _batches.setdefault(job.batch_id, QuestionBatch(
+                id=job.batch_id, status="running", mode="batch_api", total=len(question_ids),
+                question_ids=question_ids,
+            ))
+        _start_waiting(job.id)
+    return len(jobs)
+
+
+def _start_waiting(provider_batch_id: str):
+    # Jobs take up to 24 hours, too long to hold a request threadpool thread
+    threading.Thread(target=_await_batch_api_job, args=(provider_batch_id,), name="batch_api_job", daemon=True).start()
+
+
+def _await_batch_api_job(provider_batch_id: str):
+    from services.llm import OpenAIProvider, provider_from_env, wait_chat_batch
+
+    with Session(engine) as db:
+        job = db.get(BatchApiJob, provider_batch_id)
+    try:
+        provider = provider_from_env()
+        if isinstance(provider, OpenAIProvider) and provider.model != job.llm_model:
+            provider = OpenAIProvider(provider.client, model=job.llm_model)
+
+        seen = [job.status]
+
+        def record_status(status: str):
+            if status == seen[0]:
+                return
+            seen[0] = status
+            with Session(engine) as db:
+                db.exec(update(BatchApiJob).where(BatchApiJob.id == provider_batch_id).values(status=status))
+                db.commit()
+
+        batch = wait_chat_batch(
+            provider.client, provider_batch_id, poll_seconds=float(os.getenv("LLM_BATCH_POLL_SECONDS", "30")),
+            on_status=record_status,
+        )
+        question_ids, template_ids = json.loads(job.question_ids), json.loads(job.template_ids)
+        templates, questions = _load_batch(question_ids)
+        # Templates deleted since the job was submitted are left out
+        templates = [template for template in templates if template.id in template_ids]
+        seconds = (datetime.now() - job.created_at).total_seconds()
+        _store_batch_api_outputs(job.batch_id, question_ids, templates, questions, provider, batch, seconds)
+        with Session(engine) as db:
+            db.exec(delete(BatchApiJob).where(BatchApiJob.id == provider_batch_id))
+            db.commit()
+    except Exception as exc:
+        # The job stays recorded, so the next server start retries it
+        logger.exception("Batch API job %s of question batch %s failed", provider_batch_id, job.batch_id)
+        _update_batch(job.batch_id, status="failed", error=str(exc))
+        return
+    _update_batch(job.batch_id, status="completed")
+
+
+def _by_key(questions: Dict[int, Question]) -> Dict[str, Question]:
+    return {str(question_id): question for question_id, question in questions.items()}
+
+
+def _store_batch_api_outputs(
+    batch_id: str,
+    question_ids: List[int],
+    templates: List[Template],
+    questions: Dict[int, Question],
+    provider,
+    batch,
+    seconds: float,
+):
+    from services.llm import finish_outputs_batch
+
+    outputs, failed = finish_outputs_batch(templates, _by_key(questions), batch, provider, seconds)
+    # The job can take hours: questions deleted in the meantime were left out when loading them
+    outputs = {question_id: outputs[str(question_id)] for question_id in questions if str(question_id) in outputs}
+    stored = _store_in_chunks(outputs, templates, questions)
+    for key, error in failed.items():
+        if int(key) in questions:
+            record_generation_failure(int(key), error)
+    for question_id in question_ids:
+        _record_question(batch_id, question_id, ok=question_id in stored)
+    if failed:
+        logger.warning(
+            "Question batch %s: %d questions failed, first error: %s", batch_id, len(failed), next(iter(failed.values()))
+        )
+
+
+def _store_in_chunks(
+    outputs: Dict[int, List[Dict]],
+    templates: List[Template],
+    questions: Dict[int, Question],
+    chunk_size: int = STORE_CHUNK_SIZE,
+) -> Set[int]:
+    """
+    Store the generations and duels of many questions, a chunk per
+    transaction. A chunk that fails, for example because one of its
+    questions was just deleted, is stored again question by question.
+    Returns the ids of the stored questions.
+    """
+    from services.llm import generation_from_output
+
+    def generations(question_ids):
+        # Built for every attempt: a rolled back attempt leaves hashes of unstored blobs on its objects
+        return {
+            question_id: [
+                generation_from_output(template, questions[question_id], output)
+                for template, output in zip(templates, outputs[question_id])
+            ]
+            for question_id in question_ids
+        }
+
+    stored = set()
+    question_ids = list(outputs)
+    with Session(engine) as db:
+        for start in range(0, len(question_ids), chunk_size):
+            chunk = question_ids[start:start + chunk_size]
+            try:
+                store_outputs_and_duels_bulk(generations(chunk), db)
+                stored.update(chunk)
+                continue
+            except Exception:
+                db.rollback()
+            for question_id in chunk:
+                try:
+                    store_outputs_and_duels_bulk(generations([question_id]), db)
+                    stored.add(question_id)
+                except Exception as exc:
+                    db.rollback()
+                    logger.warning("Could not store the outputs of question %s: %s", question_id, exc)
+    return stored
+
+
+def _generate_batch(batch_id: str, question_ids: List[int], priority: str):
+    from services.llm import generate_output, provider_from_env
+
+    templates, questions = _load_batch(question_ids)
+    provider = provider_from_env()
+    # Keep about two calls per worker queued, so the pool never idles between questions; the scheduler
+    # still starts queued interactive calls first
+    window = max(1, 2 * pipeline.workers // max(1, len(templates)))
+    # Registered up front, so deleting a question that is still waiting for its turn cancels it too.
+    # No deadline: bulk calls may queue for long behind interactive ones.
+    tokens = {question_id: cancellation.register(question_id) for question_id in questions}
+
+    in_flight = deque()
+    try:
+        with Session(engine) as db:
+            for question_id in question_ids:
+                question, token = questions.get(question_id), tokens.get(question_id)
+                if question is None or token.cancelled:
+                    # Deleted since the upload
+                    _record_question(batch_id, question_id, ok=False)
+                    continue
+                with cancellation.active(token):
+                    futures = [
+                        pipeline.submit(generate_output, template, question, None, provider, priority=priority)
+                        for template in templates
+                    ]
+                token.on_cancel(lambda futures=futures: [future.cancel() for future in futures])
+                in_flight.append((question, token, futures))
+                # Questions finish in upload order, which bounds memory and keeps progress steady
+                if len(in_flight) >= window:
+                    _finish_question(batch_id, *in_flight.popleft(), templates, db)
+            while in_flight:
+                _finish_question(batch_id, *in_flight.popleft(), templates, db)
+    finally:
+        for question_id, token in tokens.items():
+            cancellation.unregister(question_id, token)
+
+
+def _finish_question(
+    batch_id: str,
+    question: Question,
+    token: cancellation.CancellationToken,
+    futures: List[Future],
+    templates: List[Template],
+    db: Session,
+):
+    from services.llm import generation_from_output
+
+    try:
+        outputs = [
+            generation_from_output(template, question, cancellation.wait(future, token))
+            for template, future in zip(templates, futures)
+        ]
+        token.check()
+        # Fails when the question was deleted after the check
+        store_outputs_and_duels(question.id, outputs, db)
+    except Exception as exc:
+        db.rollback()
+        for future in futures:
+            future.cancel()
+        if isinstance(exc, cancellation.GenerationCancelled):
+            metrics.GENERATIONS_CANCELLED.inc(reason=exc.reason)
+        if not isinstance(exc, cancellation.GenerationCancelled) or exc.reason != cancellation.DELETED:
+            record_generation_failure(question.id, str(exc))
+        logger.warning("Generation failed for question %s in batch %s: %s", question.id, batch_id, exc)
+        _record_question(batch_id, question.id, ok=False)
+        return
+    _record_question(batch_id, question.id, ok=True)
@@ -0,0 +1,120 @@
+import hashlib
+import zlib
+from typing import Dict, Iterable, Optional
+from sqlalchemy import inspect
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select, delete
+from models.blob import OutputBlob
+from models.generation import Generation
+
+# Number of legacy generations moved into blobs per transaction
+DEFAULT_BATCH_SIZE = 500
+
+
+def output_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def store_output(text: str, db: Session) -> str:
+    """
+    Store an output body in the blob table and return its hash.
+    Identical texts share a single compressed row.
+    """
+    digest = output_hash(text)
+    db.exec(
+        insert(OutputBlob)
+        .values(hash=digest, length=len(text), compression="zlib", data=zlib.compress(text.encode("utf-8")))
+        .on_conflict_do_nothing(index_elements=["hash"])
+    )
+    return digest
+
+
+def externalize_output(generation: Generation, db: Session) -> Generation:
+    """Move a generation's inline output_text into the blob table, keeping only its hash and length"""
+    if generation.output_hash is None:
+        generation.output_hash = store_output(generation.output_text, db)
+        generation.output_length = len(generation.output_text)
+        generation.output_text = ""
+    return generation
+
+
+def _decompress(blob: OutputBlob) -> str:
+    return zlib.decompress(blob.data).decode("utf-8")
+
+
+def get_output_text(digest: str, db: Session) -> Optional[str]:
+    blob = db.get(OutputBlob, digest)
+    return _decompress(blob) if blob else None
+
+
+def load_output_texts(generations: Iterable[Optional[Generation]], db: Session):
+    """
+    Fill in output_text on generations whose body lives in the blob table or
+    whose inline column was deferred by the query that loaded them.
+
+    Bodies are fetched with at most one query per storage kind. The value is
+    set as already committed so the session never writes it back to the row.
+    """
+    from_blobs, from_rows = [], []
+    for generation in generations:
+        if generation is None:
+            continue
+        if generation.output_hash:
+            if "output_text" in inspect(generation).unloaded or not generation.output_text:
+                from_blobs.append(generation)
+        elif "output_text" in inspect(generation).unloaded:
+            from_rows.append(generation)
+
+    if from_blobs:
+        hashes = {g.output_hash for g in from_blobs}
+        texts: Dict[str, str] = {
+            blob.hash: _decompress(blob)
+            for blob in db.exec(select(OutputBlob).where(OutputBlob.hash.in_(hashes))).all()
+        }
+        for generation in from_blobs:
+            set_committed_value(generation, "output_text", texts.get(generation.output_hash, ""))
+
+    if from_rows:
+        texts = dict(db.exec(
+            select(Generation.id, Generation.output_text)
+            .where(Generation.id.in_([g.id for g in from_rows]))
+        ).all())
+        for generation in from_rows:
+            set_committed_value(generation, "output_text", texts.get(generation.id, ""))
+
+
+def externalize_inline_outputs(db: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Move inline outputs of existing generations into the blob table. Returns the number moved."""
+    moved = 0
+    while True:
+        generations = db.exec(
+            select(Generation)
+            .where(Generation.output_hash.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not generations:
+            break
+        for generation in generations:
+            externalize_output(generation, db)
+            db.add(generation)
+        db.commit()
+        moved += len(generations)
+    return moved
+
+
+def delete_orphan_blobs(db: Session) -> int:
+    """Delete blobs no longer referenced by any generation. Returns the number deleted."""
+    referenced = select(Generation.output_hash).where(Generation.output_hash.isnot(None))
+    deleted = db.exec(delete(OutputBlob).where(OutputBlob.hash.not_in(referenced))).rowcount
+    db.commit()
+    return deleted
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    with Session(engine) as session:
+        moved = externalize_inline_outputs(session)
+        removed = delete_orphan_blobs(session)
+    print(f"✓ Moved {moved} inline outputs into blobs, removed {removed} orphan blobs")
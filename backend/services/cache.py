@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+from fastapi import Request, Response
+from services.serialization import dumps
+
+# Change counter keys. Write paths bump the keys they touch and read endpoints
+# list the keys their response depends on.
+TEMPLATES = "templates"
+QUESTIONS = "questions"
+DUELS = "duels"
+
+
+def question_key(question_id: int) -> str:
+    return f"question:{question_id}"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak If-None-Match comparison, so ETags marked weak by compression still match"""
+    candidates = (tag.strip() for tag in request.headers.get("if-none-match", "").split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class ChangeCounters:
+    """
+    Per-entity change counters that version cached responses. Async callers
+    can also wait for a counter to move, which is how long polls are woken
+    when a request or background task commits a write.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, int] = {}
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *keys: str):
+        with self._lock:
+            waiters = []
+            for key in keys:
+                self._counters[key] = self._counters.get(key, 0) + 1
+                waiters.extend(self._waiters.pop(key, ()))
+        # Bumps come from worker threads, so wake waiters on their own loop
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def version(self, keys: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._counters.get(key, 0) for key in keys)
+
+    async def wait_for_change(self, key: str, version: int, timeout: float) -> int:
+        """Wait up to `timeout` seconds for `key` to move past `version`, returning its current value"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self._counters.get(key, 0) != version:
+                return self._counters.get(key, 0)
+            self._waiters.setdefault(key, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+        return self.version([key])[0]
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class ResponseCache:
+    """
+    In-process TTL/LRU store of serialized JSON responses, keyed by request
+    URL and the version of the entities the response depends on.
+
+    Writes made by this process invalidate entries immediately through the
+    change counters. Writes made by other processes become visible once the
+    TTL bucket rolls over, since the bucket is part of every ETag.
+    """
+
+    def __init__(self, counters: ChangeCounters, ttl_seconds: float = 30.0, max_entries: int = 256):
+        self.counters = counters
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Distinguishes ETags of different worker processes, whose counters are independent
+        self._instance = uuid.uuid4().hex[:8]
+        self._entries: "OrderedDict[str, Tuple[float, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _etag(self, url: str, keys: Iterable[str]) -> str:
+        version = self.counters.version(keys)
+        bucket = int(time.time() // self.ttl_seconds) if self.ttl_seconds > 0 else 0
+        raw = f"{self._instance}|{bucket}|{url}|{version}"
+        return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+    def _get(self, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                return None
+            expires_at, _, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[etag]
+                return None
+            self._entries.move_to_end(etag)
+            return body
+
+    def _put(self, etag: str, url: str, body: bytes):
+        with self._lock:
+            self._entries[etag] = (time.monotonic() + self.ttl_seconds, url, body)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def respond(self, request: Request, keys: Iterable[str], compute: Callable[[], Any]) -> Response:
+        """
+        Serve a JSON response for `request` from the cache, computing it with
+        `compute` on a miss. Answers 304 when If-None-Match matches the ETag.
+        """
+        keys = list(keys)
+        url = str(request.url)
+        etag = self._etag(url, keys)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if etag_matches(request, etag):
+            self.hits += 1
+            return Response(status_code=304, headers=headers)
+
+        body = self._get(etag)
+        if body is None:
+            self.misses += 1
+            body = dumps(compute())
+            self._put(etag, url, body)
+        else:
+            self.hits += 1
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+change_counters = ChangeCounters()
+response_cache = ResponseCache(
+    change_counters,
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+)
+
+
+def bump(*keys: str):
+    """Record a committed write to the given entities"""
+    change_counters.bump(*keys)
+
+
+def bump_question(question_id: int, *keys: str):
+    """Record a committed write to a question and, optionally, other entities"""
+    change_counters.bump(QUESTIONS, question_key(question_id), *keys)
@@ -0,0 +1,162 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+DELETED = "deleted"
+DEADLINE = "deadline"
+
+
+class GenerationCancelled(Exception):
+    """Raised where a cancelled generation stops"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Generation cancelled: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation of one question's generation. Cancelling runs
+    the registered callbacks, which drop queued LLM calls and wake waiters;
+    code that is already running notices at its next check. A token past
+    its deadline counts as cancelled.
+    """
+
+    def __init__(self, deadline_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.deadline = clock() + deadline_seconds if deadline_seconds else None
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and self._clock() >= self.deadline:
+            self.cancel(DEADLINE)
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline, None without one"""
+        return None if self.deadline is None else max(0.0, self.deadline - self._clock())
+
+    def cancel(self, reason: str) -> bool:
+        """Cancel with a reason; False when already cancelled"""
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+        return True
+
+    def on_cancel(self, callback: Callable[[], Any]):
+        """Call `callback` once the token is cancelled, right away if it already is"""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if self.cancelled:
+            raise GenerationCancelled(self.reason)
+
+
+_current: ContextVar[Optional[CancellationToken]] = ContextVar("cancellation_token", default=None)
+_tokens: Dict[int, Set[CancellationToken]] = {}
+_tokens_lock = threading.Lock()
+
+
+def current() -> Optional[CancellationToken]:
+    """Token of the generation running in this context, also inside pipeline calls it submitted"""
+    return _current.get()
+
+
+def check():
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def active(token: CancellationToken) -> Iterator[CancellationToken]:
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def wait(future: Future, token: Optional[CancellationToken] = None) -> Any:
+    """future.result(), raising GenerationCancelled as soon as the token is cancelled or its deadline passes"""
+    if token is None:
+        return future.result()
+    woken = threading.Event()
+    future.add_done_callback(lambda _: woken.set())
+    token.on_cancel(woken.set)
+    while not future.done():
+        if token.cancelled:
+            future.cancel()
+            raise GenerationCancelled(token.reason)
+        woken.wait(token.remaining())
+    if future.cancelled() and token.cancelled:
+        raise GenerationCancelled(token.reason)
+    return future.result()
+
+
+def abortable(fn: Callable[..., Any], *args) -> Any:
+    """
+    fn(*args) on a thread of its own, raising GenerationCancelled as soon as
+    the context's token is cancelled, so the caller (and its pipeline worker)
+    is free at once. A call that cannot be interrupted, such as a
+    non-streamed HTTP request, keeps running in the background until it
+    returns or its request timeout passes, and its result is dropped.
+    """
+    token = _current.get()
+    if token is None:
+        return fn(*args)
+    token.check()
+    future: Future = Future()
+    # Running, so a cancelled wait leaves the future for the call to settle
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            result = fn(*args)
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), name="llm_call", daemon=True).start()
+    return wait(future, token)
+
+
+def register(question_id: int, deadline_seconds: Optional[float] = None) -> CancellationToken:
+    """Token for a generation of the question, cancelled by cancel_question"""
+    token = CancellationToken(deadline_seconds)
+    with _tokens_lock:
+        _tokens.setdefault(question_id, set()).add(token)
+    return token
+
+
+def unregister(question_id: int, token: CancellationToken):
+    with _tokens_lock:
+        tokens = _tokens.get(question_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del _tokens[question_id]
+
+
+def cancel_question(question_id: int, reason: str = DELETED) -> int:
+    """Cancel every generation running for the question. Returns how many were cancelled."""
+    with _tokens_lock:
+        tokens = list(_tokens.get(question_id, ()))
+    return sum(token.cancel(reason) for token in tokens)
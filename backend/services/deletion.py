@@ -0,0 +1,190 @@
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from sqlmodel import Session, select, delete, update, func as sql_func
+from models.archive import ArchivedTemplateStats
+from models.duel import Duel, DuelGeneration
+from models.generation import Generation
+from models.questions import Question
+from models.template import Template, TemplateDeletionJob
+from db import engine
+from services import cancellation
+from services.cache import DUELS, QUESTIONS, TEMPLATES, bump, bump_question
+from services.snapshots import delete_results_snapshots, delete_snapshots_for_generations
+
+# Number of generations removed per transaction when deleting a template
+DEFAULT_CHUNK_SIZE = 500
+
+# Finished jobs stay readable for this long, and at most this many are kept
+FINISHED_RETENTION_SECONDS = 3600
+MAX_FINISHED_JOBS = 1000
+
+_jobs: Dict[str, TemplateDeletionJob] = {}
+# (finish time, id) of finished jobs, oldest first
+_finished: deque = deque()
+_jobs_lock = threading.Lock()
+
+
+def _delete_generations(generation_ids: List[int], db: Session) -> int:
+    """
+    Delete a set of generations together with every duel they take part in.
+    Returns the number of duels removed.
+
+    Children are removed before parents so this also works on databases
+    created before the ON DELETE clauses existed.
+    """
+    duel_ids = db.exec(
+        select(DuelGeneration.duel_id)
+        .where(DuelGeneration.generation_id.in_(generation_ids))
+        .distinct()
+    ).all()
+
+    delete_snapshots_for_generations(generation_ids, db)
+    db.exec(
+        update(Question)
+        .where(Question.selected_generation_id.in_(generation_ids))
+        .values(selected_generation_id=None)
+    )
+    if duel_ids:
+        db.exec(delete(DuelGeneration).where(DuelGeneration.duel_id.in_(duel_ids)))
+        db.exec(delete(Duel).where(Duel.id.in_(duel_ids)))
+    db.exec(delete(Generation).where(Generation.id.in_(generation_ids)))
+    return len(duel_ids)
+
+
+def delete_template_cascade(
+    template_id: int,
+    db: Session,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Optional[Dict[str, int]]:
+    """
+    Delete a template and all data derived from it using set-based deletes.
+
+    Generations are removed in chunks of `chunk_size`, each chunk in its own
+    transaction, so a template with a very large history never holds the
+    SQLite write lock for long. `progress` is called with
+    (deleted_generations, total_generations) after every chunk.
+
+    Returns None if the template does not exist.
+    """
+    if db.get(Template, template_id) is None:
+        return None
+
+    total = db.exec(
+        select(sql_func.count()).select_from(Generation).where(Generation.template_id == template_id)
+    ).one()
+    deleted_generations = 0
+    deleted_duels = 0
+
+    while True:
+        generation_ids = db.exec(
+            select(Generation.id)
+            .where(Generation.template_id == template_id)
+            .limit(chunk_size)
+        ).all()
+        if not generation_ids:
+            break
+
+        deleted_duels += _delete_generations(generation_ids, db)
+        db.commit()
+        bump(TEMPLATES, QUESTIONS, DUELS)
+
+        deleted_generations += len(generation_ids)
+        if progress:
+            progress(deleted_generations, max(total, deleted_generations))
+
+    db.exec(delete(ArchivedTemplateStats).where(ArchivedTemplateStats.template_id == template_id))
+    db.exec(delete(Template).where(Template.id == template_id))
+    db.commit()
+    bump(TEMPLATES)
+
+    return {"generations": deleted_generations, "duels": deleted_duels}
+
+
+def delete_questions(question_ids: List[int], db: Session) -> Dict[str, int]:
+    """
+    Delete a set of questions with their generations, duels and duel entries
+    without committing. Returns the number of generations and duels removed.
+    """
+    delete_results_snapshots(question_ids, db)
+    question_duels = select(Duel.id).where(Duel.question_id.in_(question_ids))
+    db.exec(delete(DuelGeneration).where(DuelGeneration.duel_id.in_(question_duels)))
+    deleted_duels = db.exec(delete(Duel).where(Duel.question_id.in_(question_ids))).rowcount
+
+    db.exec(
+        update(Question)
+        .where(Question.id.in_(question_ids))
+        .values(selected_generation_id=None)
+    )
+    deleted_generations = db.exec(delete(Generation).where(Generation.question_id.in_(question_ids))).rowcount
+    db.exec(delete(Question).where(Question.id.in_(question_ids)))
+
+    return {"generations": deleted_generations, "duels": deleted_duels}
+
+
+def delete_question_cascade(question_id: int, db: Session) -> Optional[Dict[str, int]]:
+    """
+    Delete a question along with its generations, duels and duel entries,
+    and cancel its generation if one is running. Returns None if the
+    question does not exist.
+    """
+    if db.get(Question, question_id) is None:
+        return None
+
+    deleted = delete_questions([question_id], db)
+    db.commit()
+    cancellation.cancel_question(question_id, cancellation.DELETED)
+    bump_question(question_id, DUELS)
+    return deleted
+
+
+def create_template_deletion_job(template_id: int) -> TemplateDeletionJob:
+    """Register a pending background deletion for a template"""
+    job = TemplateDeletionJob(id=uuid.uuid4().hex, template_id=template_id, status="pending")
+    with _jobs_lock:
+        _evict_finished(time.monotonic())
+        _jobs[job.id] = job
+    return job
+
+
+def get_template_deletion_job(job_id: str) -> Optional[TemplateDeletionJob]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return job.model_copy() if job else None
+
+
+def _update_job(job_id: str, **changes):
+    with _jobs_lock:
+        job = _jobs[job_id]
+        for key, value in changes.items():
+            setattr(job, key, value)
+        if changes.get("status") in ("completed", "failed"):
+            _finished.append((time.monotonic(), job_id))
+
+
+def _evict_finished(now: float):
+    while _finished and (len(_finished) > MAX_FINISHED_JOBS or now - _finished[0][0] > FINISHED_RETENTION_SECONDS):
+        _jobs.pop(_finished.popleft()[1], None)
+
+
+def template_deletion_background_task(job_id: str, template_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Background task that deletes a template chunk by chunk and records progress on the job"""
+    _update_job(job_id, status="running")
+
+    def report(deleted: int, total: int):
+        _update_job(job_id, deleted_generations=deleted, total_generations=total)
+
+    try:
+        with Session(engine) as db:
+            result = delete_template_cascade(template_id, db, chunk_size=chunk_size, progress=report)
+    except Exception as exc:
+        _update_job(job_id, status="failed", error=str(exc))
+        return
+
+    if result is None:
+        _update_job(job_id, status="failed", error="Template not found")
+    else:
+        _update_job(job_id, status="completed")
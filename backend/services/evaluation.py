@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlmodel import Session, select
+from models.questions import Question
+from models.template import Template
+from services import llm
+from services.question import store_outputs_and_duels
+from services.ratelimit import per_minute
+from services.scheduler import BACKFILL, GenerationPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationRun:
+    """
+    Generates every template's output for each question of a JSONL file,
+    writing a results file, Question/Generation/Duel rows, or both. With
+    `batch_api`, every pending question goes into one Batch API job instead
+    of concurrent calls.
+
+    Each finished question is appended to the checkpoint file after its
+    results are written, so a resumed run skips it. A question interrupted
+    between its database commit and its checkpoint line is stored twice.
+    """
+
+    def __init__(
+        self,
+        questions: List[Tuple[str, str]],
+        templates: List[Template],
+        checkpoint_path: str,
+        output_path: Optional[str] = None,
+        engine=None,
+        concurrency: int = 32,
+        provider: Optional[llm.LLMProvider] = None,
+        batch_api: bool = False,
+        poll_seconds: float = 30.0,
+    ):
+        if output_path is None and engine is None:
+            raise ValueError("Nothing to write: give an output file, a database, or both")
+        self.questions = questions
+        self.templates = templates
+        self.checkpoint_path = checkpoint_path
+        self.output_path = output_path
+        self.engine = engine
+        self.pipeline = GenerationPipeline(concurrency)
+        self.provider = provider
+        self.batch_api = batch_api
+        self.poll_seconds = poll_seconds
+        self.stats = {"questions": len(questions), "completed": 0, "failed": 0, "resumed": 0}
+
+    def _load_checkpoint(self) -> Set[str]:
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as file:
+            return {json.loads(line)["key"] for line in file if line.strip()}
+
+    def _trim_output(self, done: Set[str]):
+        """Drop result lines written after the last checkpoint, so resumed questions appear once"""
+        if not self.output_path or not os.path.exists(self.output_path):
+            return
+        with open(self.output_path) as file:
+            kept = [line for line in file if line.strip() and json.loads(line)["key"] in done]
+        with open(self.output_path, "w") as file:
+            file.writelines(kept)
+
+    def run(self, resume: bool = False) -> Dict[str, Any]:
+        done = self._load_checkpoint() if resume else set()
+        if resume:
+            self._trim_output(done)
+        else:
+            for path in (self.checkpoint_path, self.output_path):
+                if path and os.path.exists(path):
+                    os.unlink(path)
+        provider = self.provider or llm.provider_from_env()
+        started = time.perf_counter()
+
+        output = open(self.output_path, "a") if self.output_path else None
+        checkpoint = open(self.checkpoint_path, "a")
+        db = Session(self.engine) if self.engine is not None else None
+        try:
+            pending = [(key, text) for key, text in self.questions if key not in done]
+            self.stats["resumed"] = len(self.questions) - len(pending)
+            if self.batch_api:
+                self._run_batch(pending, provider, output, checkpoint, db)
+            else:
+                self._run_pipeline(pending, provider, output, checkpoint, db)
+        finally:
+            if db is not None:
+                db.close()
+            checkpoint.close()
+            if output:
+                output.close()
+        self.stats["seconds"] = round(time.perf_counter() - started, 3)
+        return self.stats
+
+    def _run_pipeline(self, pending: List[Tuple[str, str]], provider, output, checkpoint, db: Optional[Session]):
+        # Enough calls queued to keep every worker busy while the oldest question is written
+        window = max(1, 2 * self.pipeline.workers // max(1, len(self.templates)))
+        in_flight = deque()
+        for key, text in pending:
+            question = Question(text=text)
+            futures = [
+                self.pipeline.submit(llm.generate_output, template, question, None, provider, priority=BACKFILL)
+                for template in self.templates
+            ]
+            in_flight.append((key, text, futures))
+            if len(in_flight) >= window:
+                self._finish(*in_flight.popleft(), output, checkpoint, db)
+        while in_flight:
+            self._finish(*in_flight.popleft(), output, checkpoint, db)
+
+    def _run_batch(self, pending: List[Tuple[str, str]], provider, output, checkpoint, db: Optional[Session]):
+        if not pending:
+            return
+        texts = dict(pending)
+        outputs, failed = llm.generate_outputs_batch(
+            self.templates,
+            {key: Question(text=text) for key, text in pending},
+            provider=provider,
+            poll_seconds=self.poll_seconds,
+        )
+        for key, error in failed.items():
+            logger.warning("Question %s failed: %s", key, error)
+        self.stats["failed"] += len(failed)
+        # Failed questions have no checkpoint line, so a resumed run sends them again
+        for key, results in outputs.items():
+            self._write(key, texts[key], results, output, checkpoint, db)
+
+    def _finish(self, key: str, text: str, futures: List[Future], output, checkpoint, db: Optional[Session]):
+        try:
+            results = [future.result() for future in futures]
+        except Exception as exc:
+            logger.warning("Question %s failed: %s", key, exc)
+            self.stats["failed"] += 1
+            return
+        self._write(key, text, results, output, checkpoint, db)
+
+    def _write(self, key: str, text: str, results: List[Dict[str, Any]], output, checkpoint, db: Optional[Session]):
+        question_id = None
+        if db is not None:
+            question = Question(text=text)
+            db.add(question)
+            db.commit()
+            question_id = question.id
+            outputs = [
+                llm.generation_from_output(template, question, result)
+                for template, result in zip(self.templates, results)
+            ]
+            store_outputs_and_duels(question_id, outputs, db)
+        if output:
+            output.write(json.dumps({
+                "key": key,
+                "question": text,
+                "question_id": question_id,
+                "generations": [
+                    {"template_id": template.id, "template": template.key, **result}
+                    for template, result in zip(self.templates, results)
+                ],
+            }) + "\n")
+            output.flush()
+        checkpoint.write(json.dumps({"key": key, "question_id": question_id}) + "\n")
+        checkpoint.flush()
+        self.stats["completed"] += 1
+
+
+def load_questions(path: str) -> List[Tuple[str, str]]:
+    """(key, text) per line of a JSONL file of question texts or {"text", "id"} objects"""
+    questions = []
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"text": item}
+            if not isinstance(item, dict) or not isinstance(item.get("text"), str) or not item["text"].strip():
+                raise ValueError(f"{path}:{number}: expected a question text or an object with a text field")
+            questions.append((str(item.get("id", number)), item["text"]))
+    keys = [key for key, _ in questions]
+    if len(set(keys)) != len(keys):
+        raise ValueError(f"{path}: question ids must be unique")
+    return questions
+
+
+def load_templates(engine, keys: Optional[List[str]] = None) -> List[Template]:
+    with Session(engine) as db:
+        query = select(Template).order_by(Template.id)
+        if keys:
+            query = query.where(Template.key.in_(keys))
+        templates = db.exec(query).all()
+    if keys and {t.key for t in templates} != set(keys):
+        raise ValueError(f"Unknown templates: {sorted(set(keys) - {t.key for t in templates})}")
+    return templates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate every stored template's output for a JSONL question set")
+    parser.add_argument("questions", help="JSONL file of question texts or {\"id\", \"text\"} objects")
+    parser.add_argument("--output", help="Write results to this JSONL file")
+    parser.add_argument("--write-db", action="store_true", help="Store Question, Generation and Duel rows")
+    parser.add_argument("--templates", help="Comma-separated template keys (default: all)")
+    parser.add_argument("--concurrency", type=int, default=32, help="LLM calls in flight")
+    parser.add_argument("--rpm", type=float, help="Requests per minute, overrides LLM_RATE_LIMIT_RPM")
+    parser.add_argument("--cache", help="Completion cache file, overrides LLM_CACHE_PATH")
+    parser.add_argument("--checkpoint", help="Default: <output or questions file>.checkpoint")
+    parser.add_argument("--resume", action="store_true", help="Skip questions in the checkpoint")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Send every question as one Batch API job (openai provider only)")
+    args = parser.parse_args()
+
+    from db import engine
+
+    if args.rpm is not None:
+        llm.configure_rate_limiter(per_minute(str(args.rpm)))
+    if args.cache:
+        llm.configure_cache(llm.CompletionCache(args.cache))
+    evaluation = EvaluationRun(
+        load_questions(args.questions),
+        load_templates(engine, args.templates.split(",") if args.templates else None),
+        checkpoint_path=args.checkpoint or f"{args.output or args.questions}.checkpoint",
+        output_path=args.output,
+        engine=engine if args.write_db else None,
+        concurrency=args.concurrency,
+        batch_api=args.batch_api,
+        poll_seconds=float(os.getenv("LLM_BATCH_POLL_SECONDS", "30")),
+    )
+    summary = evaluation.run(resume=args.resume)
+    print(json.dumps(summary))
+    sys.exit(1 if summary["failed"] else 0)
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+from urllib.parse import urlparse
+
+from services.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Event types
+GENERATION_FINISHED = "generation_finished"
+DUELS_READY = "duels_ready"
+DUEL_DECIDED = "duel_decided"
+WINNER_SELECTED = "winner_selected"
+TEMPLATE_RATING_CHANGED = "template_rating_changed"
+
+DEFAULT_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A subscriber's bounded queue of serialized events"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, question_id: Optional[int], max_queue: int):
+        self.loop = loop
+        self.question_id = question_id
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queue)
+        # Set when the subscriber fell behind and was dropped
+        self.dropped = asyncio.Event()
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        return self.question_id is None or event.get("question_id") in (None, self.question_id)
+
+    def _offer(self, text: str):
+        # Runs on the subscriber's loop
+        if self.dropped.is_set():
+            return
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.dropped.set()
+
+    async def get(self) -> Optional[str]:
+        """Next event, or None once the subscription was dropped as a slow consumer"""
+        if self.dropped.is_set():
+            return None
+        get = asyncio.ensure_future(self.queue.get())
+        dropped = asyncio.ensure_future(self.dropped.wait())
+        done, pending = await asyncio.wait({get, dropped}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        return get.result() if get in done else None
+
+
+class EventHub:
+    """
+    Fans events out to this process's WebSocket subscribers. Write paths call
+    `publish`, the broker hands the event to the hub of every API worker, and
+    each subscriber gets it through its own bounded queue. A subscriber whose
+    queue fills up is dropped rather than slowing down publishers or the
+    other subscribers.
+    """
+
+    def __init__(self, max_queue: int = DEFAULT_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, question_id: Optional[int] = None) -> Subscription:
+        """Subscribe from a coroutine, optionally to the events of one question"""
+        subscription = Subscription(asyncio.get_running_loop(), question_id, self.max_queue)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            if subscription.dropped.is_set():
+                self.dropped += 1
+
+    def deliver(self, event: Dict[str, Any]):
+        """Queue an event for every interested subscriber. Safe to call from any thread."""
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.wants(event)]
+            self.delivered += len(subscriptions)
+        if not subscriptions:
+            return
+        # Serialized once, whatever the number of subscribers
+        text = dumps(event).decode("utf-8")
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, text)
+            except RuntimeError:
+                pass  # loop already closed
+
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+
+class LocalBroker:
+    """Delivers events to the subscribers of this process only"""
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    def has_subscribers(self) -> bool:
+        return self.hub.subscribers > 0
+
+    def publish(self, event: Dict[str, Any]):
+        self.hub.deliver(event)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class RelayBroker:
+    """
+    Publishes events to an event relay and delivers everything the relay
+    broadcasts, including this worker's own events, to the local hub. Stands in
+    for a message broker such as Redis pub/sub.
+
+    `publish` only queues the event; a sender thread writes it to the relay,
+    so a slow relay never blocks a request. When the outbox is full the event
+    goes to this worker's subscribers only.
+    """
+
+    def __init__(
+        self, hub: EventHub, host: str, port: int, reconnect_seconds: float = 1.0, max_outbox: int = 10000
+    ):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.reconnect_seconds = reconnect_seconds
+        self._socket: Optional[socket.socket] = None
+        self._socket_lock = threading.Lock()
+        self._outbox: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_outbox)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def has_subscribers(self) -> bool:
+        # Other workers' subscribers are not known here
+        return True
+
+    def publish(self, event: Dict[str, Any]):
+        try:
+            self._outbox.put_nowait(event)
+        except queue.Full:
+            self.hub.deliver(event)
+
+    def _send(self):
+        while True:
+            event = self._outbox.get()
+            if event is None:
+                return
+            with self._socket_lock:
+                connection = self._socket
+            if connection is not None:
+                try:
+                    connection.sendall(dumps(event) + b"\n")
+                    continue
+                except OSError:
+                    with self._socket_lock:
+                        if self._socket is connection:
+                            self._socket = None
+            # Relay unreachable: at least this worker's subscribers get the event
+            self.hub.deliver(event)
+
+    def _receive(self):
+        while not self._stop.is_set():
+            try:
+                connection = socket.create_connection((self.host, self.port), timeout=5)
+            except OSError:
+                self._stop.wait(self.reconnect_seconds)
+                continue
+            connection.settimeout(None)
+            with self._socket_lock:
+                self._socket = connection
+            try:
+                for line in connection.makefile("rb"):
+                    self.hub.deliver(json.loads(line))
+            except (OSError, ValueError):
+                pass
+            finally:
+                with self._socket_lock:
+                    if self._socket is connection:
+                        self._socket = None
+                connection.close()
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._receive, name="event-relay", daemon=True),
+            threading.Thread(target=self._send, name="event-relay-send", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        # Sent after the queued events, so they are flushed first
+        try:
+            self._outbox.put(None, timeout=5)
+        except queue.Full:
+            pass
+        for thread in self._threads[1:]:
+            thread.join(timeout=5)
+        with self._socket_lock:
+            if self._socket is not None:
+                try:
+                    self._socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        for thread in self._threads[:1]:
+            thread.join(timeout=5)
+
+
+event_hub = EventHub(max_queue=int(os.getenv("EVENT_QUEUE_SIZE", str(DEFAULT_QUEUE_SIZE))))
+broker = LocalBroker(event_hub)
+
+
+def broker_from_env(hub: EventHub = event_hub):
+    """
+    A RelayBroker when EVENT_BROKER_URL is set (tcp://host:port), else a
+    LocalBroker. Multi-worker deployments run `python -m services.events relay`
+    and point every worker at it.
+    """
+    url = os.getenv("EVENT_BROKER_URL")
+    if not url:
+        return LocalBroker(hub)
+    parsed = urlparse(url)
+    return RelayBroker(hub, parsed.hostname or "127.0.0.1", parsed.port or 8765)
+
+
+def configure_broker(new_broker):
+    global broker
+    broker = new_broker
+
+
+def has_subscribers() -> bool:
+    """False when no event published now could reach a subscriber, so it need not be built"""
+    return broker.has_subscribers()
+
+
+def publish(event_type: str, question_id: Optional[int] = None, **data: Any):
+    """Publish a lifecycle event to every worker's subscribers"""
+    broker.publish({
+        "type": event_type,
+        "question_id": question_id,
+        "timestamp": datetime.now(),
+        **data,
+    })
+
+
+async def run_relay(host: str, port: int, max_buffer: int = 1 << 20):
+    """
+    Relay server: every line received from a worker is broadcast to all
+    connected workers. Workers that stop reading are disconnected once their
+    write buffer exceeds `max_buffer` bytes.
+    """
+    writers: Set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writers.add(writer)
+        try:
+            while line := await reader.readline():
+                for peer in list(writers):
+                    if peer.transport.get_write_buffer_size() > max_buffer:
+                        writers.discard(peer)
+                        peer.close()
+                    else:
+                        peer.write(line)
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info("Event relay listening on %s:%s", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event relay for multi-worker deployments")
+    parser.add_argument("command", choices=["relay"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_relay(args.host, args.port))
@@ -0,0 +1,190 @@
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, wait
+from typing import Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+from services import cancellation, metrics
+
+T = TypeVar("T")
+HEDGE_LOST = "hedge_lost"
+
+
+def _start_thread(run: Callable[[], None]) -> None:
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), name="llm_hedge", daemon=True).start()
+
+
+class _Attempt:
+    """
+    One call of a hedged request, started by `start` (on its own thread by
+    default) with its own cancellation token. A cancelled attempt fails at
+    once; a call that cannot be interrupted finishes in the background and
+    its result is dropped. `finished` is done once the call has returned.
+    """
+
+    def __init__(self, call: Callable[[], T], start: Callable[[Callable[[], None]], Optional[Future]] = _start_thread):
+        parent = cancellation.current()
+        remaining = parent.remaining() if parent is not None else None
+        self.token = cancellation.CancellationToken(remaining if remaining else None)
+        self.future: Future = Future()
+        self.finished: Future = Future()
+        self.token.on_cancel(lambda: self._settle(exception=cancellation.GenerationCancelled(self.token.reason)))
+        if parent is not None:
+            parent.on_cancel(lambda: self.token.cancel(parent.reason))
+        started = start(lambda: self._run(call))
+        if started is not None:
+            # A start that queues the call drops it when the attempt is cancelled first
+            self.token.on_cancel(started.cancel)
+
+    def _settle(self, result=None, exception: Optional[BaseException] = None):
+        try:
+            if exception is not None:
+                self.future.set_exception(exception)
+            else:
+                self.future.set_result(result)
+        except InvalidStateError:
+            # Already cancelled, or finished before the cancellation
+            pass
+
+    def _run(self, call: Callable[[], T]):
+        try:
+            with cancellation.active(self.token):
+                result = call()
+        except BaseException as exc:
+            self._settle(exception=exc)
+        else:
+            self._settle(result)
+        finally:
+            self.finished.set_result(None)
+
+
+class HedgePolicy:
+    """
+    Hedged LLM calls: when a call has not returned after the `percentile`
+    of recent latencies for its (template, model), a duplicate is sent. The
+    first successful response wins and the other attempt is cancelled.
+
+    Every call earns `budget` hedges, up to `max_credit` saved, so
+    duplicates stay within that share of the calls made. No hedging happens
+    before a key has `min_samples` latencies.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 200,
+        max_credit: float = 10.0,
+    ):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        if budget < 0:
+            raise ValueError("budget must not be negative")
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.window = window
+        self.max_credit = max_credit
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, key: Tuple[str, str], seconds: float):
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def delay(self, key: Tuple[str, str]) -> Optional[float]:
+        """Seconds to wait before hedging a call for `key`, None while there are too few samples"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(key, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(self.percentile / 100 * len(latencies)) - 1)]
+
+    def _earn(self):
+        with self._lock:
+            self._credit = min(self.max_credit, self._credit + self.budget)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._credit < 1:
+                return False
+            self._credit -= 1
+            return True
+
+    def run(
+        self,
+        key: Tuple[str, str],
+        call: Callable[[], T],
+        before_hedge: Optional[Callable[[], object]] = None,
+        start_hedge: Optional[Callable[[Callable[[], None]], Optional[Future]]] = None,
+        hold: Optional[Callable[[Future], object]] = None,
+    ) -> T:
+        """
+        Result of `call`, sent again when it is slow. `before_hedge` runs
+        before a duplicate is sent, and `start_hedge` starts it instead of a
+        new thread. The primary call runs on its own thread in the caller's
+        stead: when it loses, `hold` gets a future done once it returns. A
+        cancelled request frees the caller at once, leaving no hold.
+        """
+        template, model = key
+        cancellation.check()
+        self._earn()
+        delay = self.delay(key)
+        started = time.perf_counter()
+        if delay is None:
+            result = cancellation.abortable(call)
+            self.record(key, time.perf_counter() - started)
+            return result
+
+        attempts: List[_Attempt] = [_Attempt(call)]
+        if not wait([attempts[0].future], timeout=delay).done:
+            if self._spend():
+                if before_hedge is not None:
+                    before_hedge()
+                attempts.append(_Attempt(call, start_hedge or _start_thread))
+            else:
+                metrics.LLM_HEDGES.inc(template=template, model=model, outcome="over_budget")
+
+        winner = self._first_success(attempts)
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.token.cancel(HEDGE_LOST)
+        if winner is not None and winner is not attempts[0] and hold is not None:
+            hold(attempts[0].finished)
+        if len(attempts) > 1:
+            outcome = "failed" if winner is None else "hedge_won" if winner is attempts[1] else "primary_won"
+            metrics.LLM_HEDGES.inc(template=template, model=model, outcome=outcome)
+        if winner is None:
+            # Both attempts failed: report the primary's error
+            return attempts[0].future.result()
+        # The latency the caller saw, so a won hedge does not pull the percentile below what callers get
+        self.record(key, time.perf_counter() - started)
+        return winner.future.result()
+
+    @staticmethod
+    def _first_success(attempts: List[_Attempt]) -> Optional[_Attempt]:
+        pending = {attempt.future: attempt for attempt in attempts}
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = pending.pop(future)
+                if future.exception() is None:
+                    return attempt
+        return None
+
+
+def from_env(
+    percentile: Optional[str], budget: Optional[str] = None, min_samples: Optional[str] = None
+) -> Optional[HedgePolicy]:
+    """Policy for a latency percentile setting, None when unset or 0"""
+    if not percentile or float(percentile) <= 0:
+        return None
+    return HedgePolicy(
+        float(percentile),
+        float(budget) if budget else 0.05,
+        int(min_samples) if min_samples else 20,
+    )
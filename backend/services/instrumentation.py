@@ -0,0 +1,39 @@
+import threading
+import time
+from typing import Callable, Tuple
+
+# Called with (statement, start time in ns since the epoch, duration in seconds)
+# after each SQL statement
+StatementObserver = Callable[[str, int, float], None]
+
+_observers: Tuple[StatementObserver, ...] = ()
+_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._sql_started = (time.time_ns(), time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_ns, started = context._sql_started
+    seconds = time.perf_counter() - started
+    for observer in _observers:
+        observer(statement, start_ns, seconds)
+
+
+def observe_statements(observer: StatementObserver):
+    """
+    Call `observer` after every SQL statement of every engine. One pair of
+    engine listeners times each statement once for all observers.
+    """
+    global _observers
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    with _lock:
+        if observer in _observers:
+            return
+        _observers = _observers + (observer,)
+        if not event.contains(Engine, "after_cursor_execute", _after_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
@@ -1,50 +1,510 @@
+import hashlib
+import json
 import os
-from typing import List
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from models.generation import Generation
 from models.template import Template
 from models.questions import Question
 from openai import OpenAI
+from services import cancellation, metrics, scheduler, tracing
+from services.hedging import HedgePolicy, from_env as hedging_from_env
+from services.ratelimit import RateLimiter, per_minute
+
+DEFAULT_MODEL = "gpt-4o-mini"
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Batch API statuses after which a batch no longer changes
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
 
 def render_template(template: Template, question: Question) -> str:
     return template.template_text.replace("{{question}}", question.text)
 
 
-def generate_output(template: Template, question: Question, client: OpenAI = None) -> str:
-    if client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is not set")
-        client = OpenAI(api_key=api_key)
+class LLMProvider(ABC):
+    """
+    Completes rendered prompts. `complete` returns the output text and token
+    counts; generate_output adds timing, metrics and tracing around it.
+    """
+
+    name = ""
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or os.getenv("LLM_MODEL", DEFAULT_MODEL)
+
+    @abstractmethod
+    def complete(self, prompt: str) -> Dict[str, Any]:
+        ...
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    OpenAI chat completions. LLM_BASE_URL points the client at any
+    OpenAI-compatible server, such as the bundled stub (services.llm_stub).
+    """
+
+    name = "openai"
+
+    def __init__(self, client: OpenAI = None, model: Optional[str] = None, stream: Optional[bool] = None):
+        super().__init__(model)
+        if client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            base_url = os.getenv("LLM_BASE_URL")
+            if base_url:
+                # Local servers ignore the key, but the client requires one
+                client = OpenAI(api_key=api_key or "local", base_url=base_url)
+            elif not api_key:
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
+            else:
+                client = OpenAI(api_key=api_key)
+        self.client = client
+        self.stream = os.getenv("LLM_STREAM", "0") == "1" if stream is None else stream
+
+    def complete(self, prompt: str) -> Dict[str, Any]:
+        messages = [{"role": "user", "content": prompt}]
+        token = cancellation.current()
+        options = {}
+        if token is not None and token.remaining() is not None:
+            # Don't wait on the provider past the question's deadline
+            options["timeout"] = max(token.remaining(), 0.001)
+        if not self.stream:
+            response = self.client.chat.completions.create(model=self.model, messages=messages, **options)
+            return {
+                "output_text": response.choices[0].message.content,
+                "output_tokens": response.usage.completion_tokens,
+                "input_tokens": response.usage.prompt_tokens,
+            }
+
+        parts = []
+        usage = None
+        chunks = self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, stream_options={"include_usage": True}, **options
+        )
+        for chunk in chunks:
+            if token is not None and token.cancelled:
+                # Closing the stream aborts the request and frees the provider's slot
+                chunks.close()
+                raise cancellation.GenerationCancelled(token.reason)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            if chunk.usage is not None:
+                usage = chunk.usage
+        return {
+            "output_text": "".join(parts),
+            "output_tokens": usage.completion_tokens if usage else 0,
+            "input_tokens": usage.prompt_tokens if usage else 0,
+        }
+
+
+class StubProvider(LLMProvider):
+    """Seeded deterministic completions computed in-process, without network or latency"""
+
+    name = "stub"
+
+    def __init__(self, model: Optional[str] = None, seed: Optional[int] = None):
+        from services.llm_stub import StubConfig
+
+        super().__init__(model)
+        self.config = StubConfig(seed=int(os.getenv("LLM_STUB_SEED", "0")) if seed is None else seed)
+
+    def complete(self, prompt: str) -> Dict[str, Any]:
+        from services.llm_stub import generate_completion
+
+        return generate_completion(prompt, self.model, self.config)
+
+
+PROVIDERS = {provider.name: provider for provider in (OpenAIProvider, StubProvider)}
+
+
+def provider_from_env() -> LLMProvider:
+    """The provider named by LLM_PROVIDER (default "openai")"""
+    name = os.getenv("LLM_PROVIDER", OpenAIProvider.name)
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r}, expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+class CompletionCache:
+    """
+    Completions by provider, model and prompt, so a repeated prompt is not
+    sent again. Kept in a SQLite file that later runs reuse, or in memory
+    with path ":memory:".
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS completion (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._connection.commit()
+
+    @staticmethod
+    def key(provider: str, model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{provider}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM completion WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, completion: Dict[str, Any]):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO completion (key, value) VALUES (?, ?)", (key, json.dumps(completion))
+            )
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# Shared by every caller of generate_output: API background tasks, bulk batches and offline runs
+rate_limiter: Optional[RateLimiter] = per_minute(os.getenv("LLM_RATE_LIMIT_RPM"), os.getenv("LLM_RATE_LIMIT_BURST"))
+completion_cache: Optional[CompletionCache] = (
+    CompletionCache(os.environ["LLM_CACHE_PATH"]) if os.getenv("LLM_CACHE_PATH") else None
+)
+hedge_policy: Optional[HedgePolicy] = hedging_from_env(
+    os.getenv("LLM_HEDGE_PERCENTILE"), os.getenv("LLM_HEDGE_BUDGET"), os.getenv("LLM_HEDGE_MIN_SAMPLES")
+)
+
+
+def configure_rate_limiter(limiter: Optional[RateLimiter]):
+    global rate_limiter
+    rate_limiter = limiter
+
+
+def configure_cache(cache: Optional[CompletionCache]):
+    global completion_cache
+    completion_cache = cache
+
+
+def configure_hedging(policy: Optional[HedgePolicy]):
+    global hedge_policy
+    hedge_policy = policy
+
+
+def _resolve_provider(client: Optional[OpenAI], provider: Optional[LLMProvider]) -> LLMProvider:
+    if provider is not None:
+        return provider
+    if client is not None:
+        return OpenAIProvider(client)
+    return provider_from_env()
+
+
+def generate_output(
+    template: Template, question: Question, client: OpenAI = None, provider: LLMProvider = None
+) -> Dict[str, Any]:
+    provider = _resolve_provider(client, provider)
     template_text = render_template(template, question)
+    model = provider.model
+
+    cache, limiter, hedging = completion_cache, rate_limiter, hedge_policy
+    cache_key = cache.key(provider.name, model, template_text) if cache else None
+    completion = cache.get(cache_key) if cache else None
+    if cache:
+        metrics.LLM_CACHE_LOOKUPS.inc(result="hit" if completion is not None else "miss")
+
+    with tracing.span("generate_output", template=template.key, model=model, cached=completion is not None) as span:
+        if completion is None:
+            cancellation.check()
+            if limiter:
+                metrics.LLM_RATE_LIMIT_WAIT.observe(limiter.acquire())
+                cancellation.check()
+            started = time.perf_counter()
+            try:
+                if hedging is not None:
+                    # On a pipeline worker, hedges queue for a worker of their own and a losing primary
+                    # keeps this one busy, so duplicates stay within GENERATION_CONCURRENCY
+                    completion = hedging.run(
+                        (template.key, model),
+                        lambda: provider.complete(template_text),
+                        before_hedge=limiter.acquire if limiter else None,
+                        start_hedge=scheduler.submit_alongside if scheduler.in_pipeline() else None,
+                        hold=scheduler.hold_slot,
+                    )
+                else:
+                    completion = cancellation.abortable(provider.complete, template_text)
+            except cancellation.GenerationCancelled:
+                raise
+            except Exception:
+                metrics.LLM_ERRORS.inc(template=template.key, model=model)
+                raise
+            seconds = time.perf_counter() - started
+            metrics.LLM_REQUEST_DURATION.observe(seconds, template=template.key, model=model)
+            # Cached with the completion, so a cache hit reports the latency of the call that produced it
+            completion = {**completion, "latency": seconds}
+            metrics.LLM_TOKENS.observe(completion["input_tokens"], template=template.key, model=model, direction="input")
+            metrics.LLM_TOKENS.observe(completion["output_tokens"], template=template.key, model=model, direction="output")
+            if cache:
+                cache.put(cache_key, completion)
+        span.set_attribute("input_tokens", completion["input_tokens"])
+        span.set_attribute("output_tokens", completion["output_tokens"])
+    return _output(completion, model)
+
+
+def _output(completion: Dict[str, Any], model: str) -> Dict[str, Any]:
+    return {
+        "output_text": completion["output_text"],
+        # Completions cached before latencies were recorded have none
+        "latency": completion.get("latency", 0.0),
+        "output_tokens": completion["output_tokens"],
+        "input_tokens": completion["input_tokens"],
+        "llm_model": model,
+    }
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": template_text}]
+def generate_outputs(
+    templates: List[Template],
+    question: Question,
+    client: OpenAI = None,
+    provider: LLMProvider = None,
+    priority: str = scheduler.INTERACTIVE,
+) -> List[Generation]:
+    """
+    Every template's output, generated concurrently on the shared pipeline in
+    the given scheduler class. Cancelling the context's cancellation token
+    drops the calls still queued, frees the workers of the running ones and
+    raises GenerationCancelled right away. A running non-streamed request is
+    not interrupted: it finishes in the background, within the deadline's
+    request timeout, and its result is dropped.
+    """
+    provider = _resolve_provider(client, provider)
+    token = cancellation.current()
+    futures = [
+        scheduler.pipeline.submit(generate_output, template, question, None, provider, priority=priority)
+        for template in templates
+    ]
+    if token is not None:
+        token.on_cancel(lambda: [future.cancel() for future in futures])
+    try:
+        return [
+            generation_from_output(template, question, cancellation.wait(future, token))
+            for template, future in zip(templates, futures)
+        ]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def generation_from_output(template: Template, question: Question, output: Dict[str, Any]) -> Generation:
+    return Generation(
+        template_id=template.id,
+        question_id=question.id,
+        output_text=output["output_text"],
+        llm_model=output["llm_model"],
+        latency=output["latency"],
+        output_tokens=output["output_tokens"],
+        input_tokens=output["input_tokens"],
     )
+
+
+def _completion_from_body(body: Dict[str, Any]) -> Dict[str, Any]:
+    usage = body.get("usage") or {}
     return {
-        "output_text": response.choices[0].message.content,
-        "latency": response.usage.completion_tokens / 150,
-        "output_tokens": response.usage.completion_tokens,
-        "input_tokens": response.usage.prompt_tokens,
-        "llm_model": "gpt-4o-mini",
-    }    
-
-def generate_outputs(templates: List[Template], question: Question, client: OpenAI = None) -> List[Generation]:
-    if client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is not set")
-        client = OpenAI(api_key=api_key)
-    outputs = []
-    for template in templates:
-        output = generate_output(template, question, client)
-        outputs.append(Generation(
-            template_id=template.id,
-            question_id=question.id,
-            output_text=output["output_text"],
-            llm_model="gpt-4o-mini",
-            latency=output["latency"],
-            output_tokens=output["output_tokens"],
-            input_tokens=output["input_tokens"],
-        ))
-    return outputs
\ No newline at end of file
+        "output_text": body["choices"][0]["message"]["content"],
+        "output_tokens": usage.get("completion_tokens", 0),
+        "input_tokens": usage.get("prompt_tokens", 0),
+    }
+
+
+def submit_chat_batch(client: OpenAI, model: str, prompts: Dict[str, str]) -> str:
+    """Send prompts, keyed by custom id, as one Batch API job and return the job's id"""
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT,
+                    "body": {"model": model, "messages": [{"role": "user", "content": prompt}]}})
+        for custom_id, prompt in prompts.items()
+    ]
+    upload = client.files.create(
+        file=("requests.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl"), purpose="batch"
+    )
+    return client.batches.create(input_file_id=upload.id, endpoint=BATCH_ENDPOINT, completion_window="24h").id
+
+
+def wait_chat_batch(
+    client: OpenAI,
+    batch_id: str,
+    poll_seconds: float = 30.0,
+    timeout: Optional[float] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    on_status: Optional[Callable[[str], None]] = None,
+):
+    """
+    The Batch API job once it is finished, polled every `poll_seconds`;
+    `on_status` is called with every status seen. A job still running after
+    `timeout` seconds is cancelled and raises TimeoutError.
+    """
+    started = time.monotonic()
+    batch = client.batches.retrieve(batch_id)
+    while True:
+        if on_status is not None:
+            on_status(batch.status)
+        if batch.status in BATCH_FINAL_STATUSES:
+            return batch
+        if timeout is not None and time.monotonic() - started >= timeout:
+            client.batches.cancel(batch_id)
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout:g}s")
+        sleep(poll_seconds)
+        batch = client.batches.retrieve(batch_id)
+
+
+def chat_batch_results(client: OpenAI, batch) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+    """Completions and error messages, by custom id, of the requests a finished Batch API job ran"""
+    completions, errors = {}, {}
+    # Expired and cancelled batches may still have results for the requests that ran
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") == 200:
+                completions[result["custom_id"]] = _completion_from_body(response["body"])
+            else:
+                error = result.get("error") or (response.get("body") or {}).get("error") or {}
+                errors[result["custom_id"]] = error.get("message") or f"status {response.get('status_code')}"
+    return completions, errors
+
+
+def run_chat_batch(
+    client: OpenAI,
+    model: str,
+    prompts: Dict[str, str],
+    poll_seconds: float = 30.0,
+    timeout: Optional[float] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+    """
+    Send prompts, keyed by custom id, through the Batch API and wait for the
+    batch to finish. Returns the completions and an error message for every
+    request that failed or was not run. A batch still running after
+    `timeout` seconds is cancelled and raises TimeoutError.
+    """
+    with tracing.span("llm_batch", model=model, requests=len(prompts)) as span:
+        batch_id = submit_chat_batch(client, model, prompts)
+        span.set_attribute("batch_id", batch_id)
+        batch = wait_chat_batch(client, batch_id, poll_seconds, timeout, sleep)
+        span.set_attribute("status", batch.status)
+
+    completions, errors = chat_batch_results(client, batch)
+    for custom_id in prompts:
+        if custom_id not in completions and custom_id not in errors:
+            errors[custom_id] = f"Batch {batch.id} {batch.status}"
+    return completions, errors
+
+
+def _batch_provider(provider: Optional[LLMProvider]) -> "OpenAIProvider":
+    provider = _resolve_provider(None, provider)
+    if not isinstance(provider, OpenAIProvider):
+        raise ValueError("Batch generation needs the openai provider")
+    return provider
+
+
+def _batch_prompts(templates: List[Template], questions: Dict[str, Question]) -> Dict[str, str]:
+    return {
+        f"{key}:{template.id}": render_template(template, question)
+        for key, question in questions.items()
+        for template in templates
+    }
+
+
+def start_outputs_batch(
+    templates: List[Template], questions: Dict[str, Question], provider: Optional[LLMProvider] = None
+) -> Optional[str]:
+    """
+    Submit the prompts of every template for each question that are not in
+    the shared cache as one Batch API job. Returns the job's id, or None when
+    every completion is cached. finish_outputs_batch collects the outputs.
+    """
+    provider = _batch_provider(provider)
+    cache = completion_cache
+    missing = {}
+    for custom_id, prompt in _batch_prompts(templates, questions).items():
+        cached = cache.get(cache.key(provider.name, provider.model, prompt)) if cache else None
+        if cache:
+            metrics.LLM_CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        if cached is None:
+            missing[custom_id] = prompt
+    return submit_chat_batch(provider.client, provider.model, missing) if missing else None
+
+
+def finish_outputs_batch(
+    templates: List[Template],
+    questions: Dict[str, Question],
+    batch=None,
+    provider: Optional[LLMProvider] = None,
+    seconds: float = 0.0,
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    """
+    Outputs of a job from start_outputs_batch once `batch` is finished, with
+    the completions that were cached instead of sent. Returns the outputs in
+    template order by question key, and an error for each question that has
+    a failed request. `seconds` is the time the job took.
+    """
+    provider = _batch_provider(provider)
+    model = provider.model
+    fetched, errors = chat_batch_results(provider.client, batch) if batch is not None else ({}, {})
+    cache = completion_cache
+    completions: Dict[str, Dict[str, Any]] = {}
+    for custom_id, prompt in _batch_prompts(templates, questions).items():
+        if custom_id in fetched:
+            # A batch request has no latency of its own: each output waited for the whole job
+            completions[custom_id] = {**fetched[custom_id], "latency": seconds}
+            if cache:
+                cache.put(cache.key(provider.name, model, prompt), completions[custom_id])
+        elif custom_id not in errors:
+            cached = cache.get(cache.key(provider.name, model, prompt)) if cache else None
+            if cached is not None:
+                completions[custom_id] = cached
+            else:
+                errors[custom_id] = f"Batch {batch.id} {batch.status}" if batch is not None else "Not generated"
+
+    outputs, failed = {}, {}
+    for key in questions:
+        results = []
+        for template in templates:
+            custom_id = f"{key}:{template.id}"
+            if custom_id in errors:
+                metrics.LLM_ERRORS.inc(template=template.key, model=model)
+                failed[key] = errors[custom_id]
+                continue
+            completion = completions[custom_id]
+            if custom_id in fetched:
+                metrics.LLM_TOKENS.observe(completion["input_tokens"], template=template.key, model=model,
+                                           direction="input")
+                metrics.LLM_TOKENS.observe(completion["output_tokens"], template=template.key, model=model,
+                                           direction="output")
+            results.append(_output(completion, model))
+        if key not in failed:
+            outputs[key] = results
+    return outputs, failed
+
+
+def generate_outputs_batch(
+    templates: List[Template],
+    questions: Dict[str, Question],
+    provider: Optional[LLMProvider] = None,
+    poll_seconds: float = 30.0,
+    timeout: Optional[float] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    """
+    Outputs of every template for each question, generated with one Batch API
+    job: cheaper, and outside the per-minute rate limits, but with no latency
+    bound. Returns the outputs in template order by question key, and an
+    error for each question that has a failed request. Completions in the
+    shared cache are not sent again.
+    """
+    provider = _batch_provider(provider)
+    started = time.perf_counter()
+    batch_id = start_outputs_batch(templates, questions, provider)
+    batch = None
+    if batch_id is not None:
+        with tracing.span("llm_batch", model=provider.model, batch_id=batch_id) as span:
+            batch = wait_chat_batch(provider.client, batch_id, poll_seconds, timeout, sleep)
+            span.set_attribute("status", batch.status)
+    return finish_outputs_batch(templates, questions, batch, provider, time.perf_counter() - started)
@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Any, Dict, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from services.synthetic import LatencyModel, count_prompt_tokens
+
+_WORDS = (
+    "the answer depends on context but in most cases a careful reading of the question shows that "
+    "capital city population river history language climate economy border mountain region coast "
+    "because therefore however first second finally example evidence source estimate roughly about "
+    "north south east west century modern ancient largest smallest official known commonly"
+).split()
+
+
+class StubConfig:
+    """Behaviour of the stub server. Rates are probabilities per request."""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        first_token_latency: Optional[LatencyModel] = None,
+        tokens_per_second: float = 0.0,
+        output_tokens_mean: int = 120,
+        output_tokens_stddev: int = 40,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 120.0,
+        retry_after_seconds: float = 1.0,
+        batch_seconds: float = 0.0,
+    ):
+        self.seed = seed
+        self.first_token_latency = first_token_latency or LatencyModel()
+        # 0 streams every token at once
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens_mean = output_tokens_mean
+        self.output_tokens_stddev = output_tokens_stddev
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        # Time from creating a batch until it reports completed
+        self.batch_seconds = batch_seconds
+
+
+def generate_completion(prompt: str, model: str, config: StubConfig) -> Dict[str, Any]:
+    """
+    Deterministic completion for a prompt: the same seed, model and prompt
+    always give the same text and token counts.
+    """
+    rng = random.Random(f"{config.seed}:{model}:{prompt}")
+    output_tokens = max(1, round(rng.gauss(config.output_tokens_mean, config.output_tokens_stddev)))
+    words = [rng.choice(_WORDS) for _ in range(output_tokens)]
+    sentences = []
+    for start in range(0, len(words), 12):
+        sentence = " ".join(words[start:start + 12])
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+    return {
+        "output_text": " ".join(sentences),
+        "input_tokens": count_prompt_tokens(prompt),
+        "output_tokens": output_tokens,
+    }
+
+
+def _error(status: int, message: str, error_type: str, code: Optional[str] = None, headers=None) -> JSONResponse:
+    body = {"error": {"message": message, "type": error_type, "param": None, "code": code}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def _prompt(messages) -> str:
+    return "\n".join(str(message.get("content", "")) for message in messages if isinstance(message, dict))
+
+
+def _multipart_fields(body: bytes, content_type: str) -> Dict[str, Any]:
+    """Form fields of a multipart/form-data body; file fields map to (filename, bytes)"""
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True)
+        fields[name] = (filename, payload) if filename else payload.decode("utf-8")
+    return fields
+
+
+def _run_batch_requests(input_data: bytes, config: StubConfig, rng: random.Random):
+    """Output and error JSONL for a batch input file, with server errors injected at server_error_rate"""
+    output, errors = [], []
+    for line in input_data.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        result = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request.get("custom_id"), "error": None}
+        if rng.random() < config.server_error_rate:
+            body = {"error": {"message": "The server had an error while processing your request",
+                              "type": "server_error", "param": None, "code": None}}
+            errors.append({**result, "response": {"status_code": 500, "request_id": result["id"], "body": body}})
+            continue
+        body = request.get("body", {})
+        model = body.get("model", "gpt-4o-mini")
+        completion = generate_completion(_prompt(body.get("messages", [])), model, config)
+        output.append({**result, "response": {"status_code": 200, "request_id": result["id"], "body": {
+            "id": f"chatcmpl-{result['id']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": completion["output_text"]},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": completion["input_tokens"],
+                "completion_tokens": completion["output_tokens"],
+                "total_tokens": completion["input_tokens"] + completion["output_tokens"],
+            },
+        }}})
+    return output, errors
+
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    """
+    OpenAI-compatible /v1/chat/completions with seeded outputs, latency and
+    fault injection, plus the /v1/files and /v1/batches subset used by the
+    Batch API.
+    """
+    config = config or StubConfig()
+    app = FastAPI(title="LLM stub")
+    # Latency and faults come from one seeded sequence, so a run's request order reproduces them
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "completed": 0, "rate_limited": 0, "server_errors": 0, "timeouts": 0,
+             "batches": 0, "batches_completed": 0}
+    app.state.stats = stats
+
+    @app.get("/v1/models")
+    def list_models():
+        return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "stub"}]}
+
+    @app.get("/stub/stats")
+    def get_stats():
+        return stats
+
+    files: Dict[str, Dict[str, Any]] = {}
+    batches: Dict[str, Dict[str, Any]] = {}
+
+    def store_file(filename: str, purpose: str, data: bytes) -> Dict[str, Any]:
+        file = {"id": f"file-{uuid.uuid4().hex}", "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        files[file["id"]] = {**file, "data": data}
+        return file
+
+    @app.post("/v1/files")
+    async def upload_file(request: Request):
+        fields = _multipart_fields(await request.body(), request.headers.get("content-type", ""))
+        if "file" not in fields or not isinstance(fields["file"], tuple):
+            return _error(400, "Missing file", "invalid_request_error")
+        filename, data = fields["file"]
+        return store_file(filename, fields.get("purpose", "batch"), data)
+
+    @app.get("/v1/files/{file_id}/content")
+    def file_content(file_id: str):
+        if file_id not in files:
+            return _error(404, f"No such File object: {file_id}", "invalid_request_error")
+        return Response(files[file_id]["data"], media_type="application/octet-stream")
+
+    def batch_view(batch: Dict[str, Any]) -> Dict[str, Any]:
+        # Batches finish batch_seconds after creation, on the first look after that
+        if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= config.batch_seconds:
+            output, errors = _run_batch_requests(files[batch["input_file_id"]]["data"], config, rng)
+            jsonl = lambda lines: "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+            if output:
+                batch["output_file_id"] = store_file("batch_output.jsonl", "batch_output", jsonl(output))["id"]
+            if errors:
+                batch["error_file_id"] = store_file("batch_errors.jsonl", "batch_output", jsonl(errors))["id"]
+            batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output),
+                                       "failed": len(errors)}
+            batch["status"] = "completed"
+            batch["completed_at"] = int(time.time())
+            stats["batches_completed"] += 1
+        return batch
+
+    @app.post("/v1/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        if body.get("input_file_id") not in files:
+            return _error(400, f"No such File object: {body.get('input_file_id')}", "invalid_request_error")
+        created = int(time.time())
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": body.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress",
+            "created_at": created,
+            "in_progress_at": created,
+            "expires_at": created + 24 * 3600,
+            "metadata": body.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        batches[batch["id"]] = batch
+        stats["batches"] += 1
+        return batch
+
+    @app.get("/v1/batches/{batch_id}")
+    def retrieve_batch(batch_id: str):
+        if batch_id not in batches:
+            return _error(404, f"No such Batch object: {batch_id}", "invalid_request_error")
+        return batch_view(batches[batch_id])
+
+    @app.post("/v1/batches/{batch_id}/cancel")
+    def cancel_batch(batch_id: str):
+        if batch_id not in batches:
+            return _error(404, f"No such Batch object: {batch_id}", "invalid_request_error")
+        batch = batch_view(batches[batch_id])
+        if batch["status"] == "in_progress":
+            batch["status"] = "cancelled"
+            batch["cancelled_at"] = int(time.time())
+        return batch
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        model = body.get("model", "gpt-4o-mini")
+
+        fault = rng.random()
+        if fault < config.timeout_rate:
+            stats["timeouts"] += 1
+            # Hang like an overloaded provider; clients should give up before this returns
+            await asyncio.sleep(config.timeout_seconds)
+            return _error(504, "Upstream request timed out", "timeout")
+        fault -= config.timeout_rate
+        if fault < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return _error(
+                429, "Rate limit reached for requests", "requests", "rate_limit_exceeded",
+                headers={"Retry-After": f"{config.retry_after_seconds:g}"},
+            )
+        fault -= config.rate_limit_rate
+        if fault < config.server_error_rate:
+            stats["server_errors"] += 1
+            status = rng.choice((500, 502, 503))
+            return _error(status, "The server had an error while processing your request", "server_error")
+
+        completion = generate_completion(_prompt(body.get("messages", [])), model, config)
+        first_token = config.first_token_latency.sample(rng)
+        tokens_per_second = config.tokens_per_second
+        usage = {
+            "prompt_tokens": completion["input_tokens"],
+            "completion_tokens": completion["output_tokens"],
+            "total_tokens": completion["input_tokens"] + completion["output_tokens"],
+        }
+        completion_id = f"chatcmpl-stub-{stats['requests']}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            generation = completion["output_tokens"] / tokens_per_second if tokens_per_second > 0 else 0.0
+            await asyncio.sleep(first_token + generation)
+            stats["completed"] += 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": completion["output_text"]},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def chunk(choices, **extra: Any) -> str:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": choices, **extra}
+            return f"data: {json.dumps(data)}\n\n"
+
+        def delta(content: Dict[str, Any], finish_reason: Optional[str] = None):
+            return [{"index": 0, "delta": content, "finish_reason": finish_reason}]
+
+        async def events():
+            await asyncio.sleep(first_token)
+            yield chunk(delta({"role": "assistant", "content": ""}))
+            words = completion["output_text"].split(" ")
+            # A few words per event keeps the event count reasonable for long answers
+            for start in range(0, len(words), 4):
+                piece = " ".join(words[start:start + 4])
+                if start:
+                    piece = " " + piece
+                if tokens_per_second > 0:
+                    await asyncio.sleep(len(words[start:start + 4]) / tokens_per_second)
+                yield chunk(delta({"content": piece}))
+            yield chunk(delta({}, "stop"))
+            if include_usage:
+                yield chunk([], usage=usage)
+            yield "data: [DONE]\n\n"
+            stats["completed"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal",
+                        help="Distribution of the time to first token")
+    parser.add_argument("--latency-mean", type=float, default=0.5, help="Seconds")
+    parser.add_argument("--latency-stddev", type=float, default=0.3, help="Seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="0 for no generation delay")
+    parser.add_argument("--output-tokens-mean", type=int, default=120)
+    parser.add_argument("--output-tokens-stddev", type=int, default=40)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Share answered with 500/502/503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share that hang for --timeout-seconds")
+    parser.add_argument("--timeout-seconds", type=float, default=120.0)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of 429 responses, in seconds")
+    parser.add_argument("--batch-seconds", type=float, default=0.0, help="Time until a batch completes")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    stub_config = StubConfig(
+        seed=args.seed,
+        first_token_latency=LatencyModel(args.latency, args.latency_mean, args.latency_stddev),
+        tokens_per_second=args.tokens_per_second,
+        output_tokens_mean=args.output_tokens_mean,
+        output_tokens_stddev=args.output_tokens_stddev,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        retry_after_seconds=args.retry_after,
+        batch_seconds=args.batch_seconds,
+    )
+    uvicorn.run(create_app(stub_config), host=args.host, port=args.port, log_level=args.log_level)
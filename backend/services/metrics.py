@@ -0,0 +1,310 @@
+import bisect
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Instrumentation is a no-op and /metrics is not served when METRICS_ENABLED=0
+enabled = os.getenv("METRICS_ENABLED", "1") != "0"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+DB_LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), registry: Optional[list] = None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        (_registry if registry is None else registry).append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    @abstractmethod
+    def _samples(self) -> Iterable[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), registry: Optional[list] = None):
+        super().__init__(name, documentation, labels, registry)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        if not enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        if not enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: Optional[list] = None,
+    ):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket (non-cumulative) counts with a final +Inf slot, sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        if not enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def time(self, **labels: str) -> "_Timer":
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.started: Optional[float] = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def reset():
+    for metric in _registry:
+        metric.clear()
+
+
+# HTTP
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to serve HTTP requests", ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", ["method"])
+
+# LLM
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds", "LLM completion latency", ["template", "model"], LLM_LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram("llm_tokens", "Tokens per LLM completion", ["template", "model", "direction"], TOKEN_BUCKETS)
+LLM_ERRORS = Counter("llm_request_errors", "Failed LLM completions", ["template", "model"])
+LLM_CACHE_LOOKUPS = Counter("llm_cache_lookups", "Completion cache lookups", ["result"])
+LLM_HEDGES = Counter(
+    "llm_hedged_requests",
+    "Slow LLM calls by hedge outcome: primary_won, hedge_won, failed, or over_budget when no duplicate was sent",
+    ["template", "model", "outcome"],
+)
+LLM_RATE_LIMIT_WAIT = Histogram(
+    "llm_rate_limit_wait_seconds", "Time LLM calls waited for the shared rate limiter", buckets=LLM_LATENCY_BUCKETS
+)
+
+# Background work
+BACKGROUND_TASKS_QUEUED = Gauge("background_tasks_queued", "Background tasks scheduled but not started", ["task"])
+BACKGROUND_TASKS_RUNNING = Gauge("background_tasks_running", "Background tasks in progress", ["task"])
+BACKGROUND_TASK_DURATION = Histogram(
+    "background_task_duration_seconds", "Background task run time", ["task", "outcome"], LLM_LATENCY_BUCKETS
+)
+DUEL_CREATION_DURATION = Histogram("duel_creation_duration_seconds", "Time to create the duels of a question")
+DUELS_CREATED = Counter("duels_created", "Duels created")
+PIPELINE_CALLS_IN_FLIGHT = Gauge(
+    "generation_pipeline_calls_in_flight", "LLM calls running on generation pipeline workers", ["priority"]
+)
+PIPELINE_QUEUE_DEPTH = Gauge("generation_pipeline_queue_depth", "LLM calls waiting for a pipeline worker", ["priority"])
+PIPELINE_CALLS_CANCELLED = Counter(
+    "generation_pipeline_calls_cancelled", "LLM calls dropped from the pipeline queue before they started", ["priority"]
+)
+GENERATIONS_CANCELLED = Counter(
+    "generations_cancelled", "Question generations abandoned before they were stored", ["reason"]
+)
+PIPELINE_QUEUE_WAIT = Histogram(
+    "generation_pipeline_queue_wait_seconds", "Time LLM calls waited for a pipeline worker", ["priority"],
+    LLM_LATENCY_BUCKETS,
+)
+
+# Database
+DB_QUERIES = Counter("db_queries", "SQL statements executed", ["operation"])
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ["operation"], DB_LATENCY_BUCKETS
+)
+DB_LOCK_ERRORS = Counter("db_lock_errors", "Requests that failed because the database was locked")
+
+# Threadpool running sync endpoints, dependencies and background tasks
+THREADPOOL_BUSY = Gauge("threadpool_threads_busy", "Worker threads in use")
+THREADPOOL_LIMIT = Gauge("threadpool_threads_limit", "Maximum worker threads")
+THREADPOOL_WAITING = Gauge("threadpool_tasks_waiting", "Calls waiting for a worker thread")
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA") else "OTHER"
+
+
+def _record_statement(statement: str, start_ns: int, duration: float):
+    operation = _operation(statement)
+    DB_QUERIES.inc(operation=operation)
+    DB_QUERY_DURATION.observe(duration, operation=operation)
+
+
+def instrument_engines():
+    """Count and time SQL statements of every engine"""
+    from services.instrumentation import observe_statements
+
+    if enabled:
+        observe_statements(_record_statement)
+
+
+def record_threadpool():
+    """Sample the default anyio thread limiter. Must run on the event loop."""
+    from anyio.to_thread import current_default_thread_limiter
+
+    limiter = current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_LIMIT.set(limiter.total_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+
+
+class MetricsMiddleware:
+    """Records latency per route template and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc(method=method)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_PROGRESS.dec(method=method)
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=method,
+                # Templated path keeps the label set bounded
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
@@ -1,18 +1,70 @@
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional
+from sqlalchemy.orm import defer
 from sqlmodel import Session, select, case, func as sql_func
+from models.archive import ArchivedTemplateStats
 from models.duel import Duel, DuelGeneration
 from models.generation import Generation
-from models.questions import Question
+from models.questions import Question, QuestionResults
 from models.template import Template
+from services.blobs import load_output_texts
+from services.cache import DUELS, QUESTIONS, TEMPLATES, change_counters, question_key
+from services.singleflight import SingleFlight
 
+# Concurrent identical aggregate requests share one in-flight computation
+performance_flight = SingleFlight()
 
-def get_generation_performance_stats(question_id: int, db: Session) -> List[Dict[str, Any]]:
+
+def _coalesced(key: tuple, depends_on: List[str], fn):
+    """
+    performance_flight.do, shared only by calls made at the same version of
+    the entities the result depends on. A call starting after a write never
+    joins a computation that may have read the data before it, so a
+    response cached under the new version never carries the old data.
+    """
+    return performance_flight.do(key + (change_counters.version(depends_on),), fn)
+
+
+# Keys of each entry returned by get_generation_performance_stats
+GENERATION_PERFORMANCE_FIELDS = (
+    "generation_id", "template_id", "template_name", "template_key", "output_text",
+    "llm_model", "latency", "output_tokens", "input_tokens", "created_at",
+    "wins", "total_duels", "win_rate",
+)
+
+# Default keys: output_text is only returned when asked for, so summaries stay
+# small and the text column is not read
+GENERATION_PERFORMANCE_SUMMARY_FIELDS = tuple(
+    field for field in GENERATION_PERFORMANCE_FIELDS if field != "output_text"
+)
+
+
+def get_generation_performance_stats(
+    question_id: int,
+    db: Session,
+    fields: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
     """
     Get performance statistics for all generations of a specific question.
     Returns list of generation performance data with win rates.
+    
+    Args:
+        fields: Keys to keep in each entry (see GENERATION_PERFORMANCE_FIELDS).
+            Defaults to GENERATION_PERFORMANCE_SUMMARY_FIELDS. output_text is
+            only read from the database when it is requested.
     """
+    fields = frozenset(fields if fields is not None else GENERATION_PERFORMANCE_SUMMARY_FIELDS)
+    return _coalesced(
+        ("generation_performance", question_id, fields),
+        [question_key(question_id), TEMPLATES],
+        lambda: _generation_performance_stats(question_id, db, fields),
+    )
+
+
+def _generation_performance_stats(question_id: int, db: Session, fields: frozenset) -> List[Dict[str, Any]]:
+    include_output = "output_text" in fields
+    
     # Single query with joins to get generation stats and template data
-    generation_stats = db.exec(
+    statement = (
         select(
             Generation,
             Template,
@@ -28,7 +80,14 @@ def get_generation_performance_stats(question_id: int, db: Session) -> List[Dict
             Duel.winner_id.isnot(None)  # Only count decided duels
         )
         .group_by(Generation.id, Template.id)
-    ).all()
+    )
+    if not include_output:
+        # Leave the potentially large inline text column out of the query
+        statement = statement.options(defer(Generation.output_text))
+    generation_stats = db.exec(statement).all()
+    
+    if include_output:
+        load_output_texts((gen for gen, _, _, _ in generation_stats), db)
     
     # Format the results
     performance_data = []
@@ -40,7 +99,7 @@ def get_generation_performance_stats(question_id: int, db: Session) -> List[Dict
             "template_id": gen.template_id,
             "template_name": template.name,
             "template_key": template.key,
-            "output_text": gen.output_text,
+            "output_text": gen.output_text if include_output else None,
             "llm_model": gen.llm_model,
             "latency": gen.latency,
             "output_tokens": gen.output_tokens,
@@ -54,6 +113,12 @@ def get_generation_performance_stats(question_id: int, db: Session) -> List[Dict
     # Sort by win rate descending
     performance_data.sort(key=lambda x: x["win_rate"], reverse=True)
     
+    if len(fields) < len(GENERATION_PERFORMANCE_FIELDS):
+        performance_data = [
+            {key: value for key, value in entry.items() if key in fields}
+            for entry in performance_data
+        ]
+    
     return performance_data
 
 
@@ -62,6 +127,14 @@ def get_template_performance_stats(db: Session, question_id: Optional[int] = Non
     Get template performance statistics, optionally filtered by question.
     Reuses the logic from templates.py but allows filtering by question.
     """
+    return _coalesced(
+        ("template_performance", question_id or None),
+        [question_key(question_id), TEMPLATES] if question_id else [TEMPLATES, QUESTIONS, DUELS],
+        lambda: _template_performance_stats(db, question_id),
+    )
+
+
+def _template_performance_stats(db: Session, question_id: Optional[int]) -> Dict[str, Any]:
     # Single query with joins to get template performance and template data
     overall_query = select(
         Template,
@@ -91,9 +164,23 @@ def get_template_performance_stats(db: Session, question_id: Optional[int] = Non
     # Execute query
     overall_results = db.exec(overall_query).all()
     
+    # Archived questions only keep their per-template totals, which count towards overall stats
+    totals = {template.id: [template, total_duels, wins or 0] for template, total_duels, wins in overall_results}
+    if not question_id:
+        archived_results = db.exec(
+            select(Template, ArchivedTemplateStats.total_duels, ArchivedTemplateStats.wins)
+            .join(ArchivedTemplateStats, ArchivedTemplateStats.template_id == Template.id)
+        ).all()
+        for template, total_duels, wins in archived_results:
+            if template.id in totals:
+                totals[template.id][1] += total_duels
+                totals[template.id][2] += wins
+            else:
+                totals[template.id] = [template, total_duels, wins]
+    
     # Format overall performance
     overall_performance = []
-    for template, total_duels, wins in overall_results:
+    for template, total_duels, wins in totals.values():
         win_rate = (wins / total_duels * 100) if total_duels > 0 else 0
         overall_performance.append({
             "template_id": template.id,
@@ -110,3 +197,112 @@ def get_template_performance_stats(db: Session, question_id: Optional[int] = Non
     return {
         "overall": overall_performance
     }
+
+
+def get_question_template_performance_stats(db: Session) -> List[Dict[str, Any]]:
+    """
+    Get template performance for every decided question, grouped by question.
+    """
+    return _coalesced(
+        ("question_template_performance",),
+        [TEMPLATES, QUESTIONS, DUELS],
+        lambda: _question_template_performance_stats(db),
+    )
+
+
+def _question_template_performance_stats(db: Session) -> List[Dict[str, Any]]:
+    # Single optimized query for per-question performance with template data
+    question_query = select(
+        Template,
+        Duel.question_id,
+        sql_func.count().label('total_duels'),
+        sql_func.sum(case((Generation.id == Duel.winner_id, 1), else_=0)).label('wins')
+    ).select_from(
+        Duel
+    ).join(
+        DuelGeneration, Duel.id == DuelGeneration.duel_id
+    ).join(
+        Generation, DuelGeneration.generation_id == Generation.id
+    ).join(
+        Template, Generation.template_id == Template.id
+    ).join(
+        Question, Duel.question_id == Question.id
+    ).where(
+        Duel.winner_id.isnot(None),
+        Question.selected_generation_id.isnot(None)
+    ).group_by(
+        Template.id,
+        Duel.question_id
+    )
+    
+    # Execute question query
+    question_results = db.exec(question_query).all()
+    
+    # Get all questions
+    all_questions = {q.id: q for q in db.exec(select(Question)).all()}
+    
+    # Format per-question performance
+    question_performance_map: Dict[int, List[Dict[str, Any]]] = {}
+    
+    for template, question_id, total_duels, wins in question_results:
+        if question_id not in question_performance_map:
+            question = all_questions.get(question_id)
+            question_performance_map[question_id] = {
+                "question_data": {
+                    "question_id": question_id,
+                    "question_text": question.text if question else f"Question {question_id}",
+                    "template_performance": []
+                }
+            }
+        
+        win_rate = (wins / total_duels * 100) if total_duels > 0 else 0
+        
+        question_performance_map[question_id]["question_data"]["template_performance"].append({
+            "template_id": template.id,
+            "template_name": template.name,
+            "template_key": template.key,
+            "wins": wins,
+            "total_duels": total_duels,
+            "win_rate": round(win_rate, 2)
+        })
+    
+    # Sort each question's templates by win rate and format final structure
+    by_question = []
+    for question_id, data in question_performance_map.items():
+        data["question_data"]["template_performance"].sort(key=lambda x: x["win_rate"], reverse=True)
+        by_question.append(data["question_data"])
+    
+    return by_question
+
+
+def build_question_results(
+    question_id: int,
+    db: Session,
+    fields: Optional[Iterable[str]] = None,
+) -> Optional[QuestionResults]:
+    """
+    Build the results of a question: the question, its selected generation and
+    per-generation performance. Returns None if the question does not exist.
+    """
+    # Single query to get question with its selected generation
+    statement = (
+        select(Question, Generation)
+        .outerjoin(Generation, Question.selected_generation_id == Generation.id)
+        .where(Question.id == question_id)
+    )
+    
+    result = db.exec(statement).first()
+    if not result:
+        return None
+    
+    question, selected_generation = result
+    load_output_texts([selected_generation], db)
+    
+    # Get generation performance stats for this question
+    generation_performance = get_generation_performance_stats(question_id, db, fields=fields)
+    
+    return QuestionResults(
+        question=question,
+        selected_generation=selected_generation,
+        generation_performance=generation_performance
+    )
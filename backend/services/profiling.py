@@ -0,0 +1,141 @@
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Per-request query profiling and the Server-Timing header are off with QUERY_PROFILER_ENABLED=0
+enabled = os.getenv("QUERY_PROFILER_ENABLED", "1") != "0"
+# Statements slower than this are logged, inside or outside a request
+slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "100"))
+# The same statement executed this many times in one request is logged as a likely N+1
+repeated_query_threshold = int(os.getenv("REPEATED_QUERY_THRESHOLD", "5"))
+
+
+class QueryProfile:
+    """SQL statements executed while serving one request"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.statements: Counter = Counter()
+        # Set once the response has started; later statements (background tasks) are not counted
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float):
+        with self._lock:
+            if self.closed:
+                return
+            self.count += 1
+            self.total += duration
+            self.statements[statement] += 1
+            if duration >= self.slowest:
+                self.slowest = duration
+                self.slowest_statement = statement
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements executed at least `threshold` times"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        queries = "query" if self.count == 1 else "queries"
+        timing = f'db;desc="{self.count} {queries}";dur={self.total * 1000:.2f}'
+        if self.slowest_statement is not None:
+            timing += f', db-slowest;desc="{describe_statement(self.slowest_statement)}";dur={self.slowest * 1000:.2f}'
+        return timing
+
+
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+
+
+def describe_statement(statement: str) -> str:
+    """Operation and table of a statement, e.g. "SELECT duel", without any values"""
+    words = statement.split(None, 1)
+    operation = words[0].upper() if words else ""
+    table = _TABLE.search(statement)
+    return f"{operation} {table.group(1)}" if table else operation
+
+
+_current: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+
+class profile_queries:
+    """
+    Context manager collecting the statements executed in its block, including
+    those run in the threadpool (the profile is shared through a context variable).
+    """
+
+    def __init__(self, label: str = ""):
+        self.profile = QueryProfile(label)
+        self._token = None
+
+    def __enter__(self) -> QueryProfile:
+        self._token = _current.set(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc):
+        self.profile.closed = True
+        _current.reset(self._token)
+        return False
+
+
+def _shorten(statement: str, limit: int = 500) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def _record_statement(statement: str, start_ns: int, duration: float):
+    profile = _current.get()
+    if profile is not None:
+        profile.record(statement, duration)
+    if duration * 1000 >= slow_query_ms:
+        where = f" [{profile.label}]" if profile is not None and profile.label else ""
+        logger.warning("Slow query (%.1f ms)%s: %s", duration * 1000, where, _shorten(statement))
+
+
+def instrument_engines():
+    """Time SQL statements of every engine for the per-request profile and the slow-query log"""
+    from services.instrumentation import observe_statements
+
+    if enabled:
+        observe_statements(_record_statement)
+
+
+class QueryProfilerMiddleware:
+    """
+    Counts the SQL statements of each request and reports the count, total DB
+    time and slowest statement in a Server-Timing header. Statements repeated
+    within a request, the usual sign of an N+1 query, are logged.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries(f"{scope['method']} {scope['path']}") as profile:
+
+            async def send_with_timing(message: Message):
+                if message["type"] == "http.response.start":
+                    profile.closed = True
+                    MutableHeaders(scope=message).append("Server-Timing", profile.server_timing())
+                    for statement, count in profile.repeated(repeated_query_threshold):
+                        logger.warning(
+                            "Repeated query (%dx) [%s], possible N+1: %s", count, profile.label, _shorten(statement)
+                        )
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
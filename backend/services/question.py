@@ -1,37 +1,170 @@
-from sqlmodel import Session, select
+import logging
+import os
+import threading
+import time
+import zlib
+from fastapi import BackgroundTasks
+from sqlmodel import Session, select, update, func as sql_func
 from models.duel import Duel, DuelGeneration
 from models.generation import Generation
 from models.template import Template
-from models.questions import Question
+from models.questions import Question, QuestionStatus
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Set
 from db import engine
+from services.blobs import externalize_output
+from services.cache import DUELS, bump_question
+from services import cancellation, events, metrics, tracing
+from services.snapshots import freeze_question_results
 
-def generation_and_duels_background_task(question_id: int):
+logger = logging.getLogger(__name__)
+
+GENERATION_TASK = "generation_and_duels"
+
+# Questions whose template ratings are waiting to be published
+_ratings_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="template_ratings")
+_pending_ratings: Set[int] = set()
+_pending_ratings_lock = threading.Lock()
+
+
+def enqueue_generation(background_tasks: BackgroundTasks, question_id: int):
+    """Schedule generation_and_duels_background_task, tracking the queue depth and the caller's trace"""
+    metrics.BACKGROUND_TASKS_QUEUED.inc(task=GENERATION_TASK)
+    background_tasks.add_task(_run_queued_generation, question_id, tracing.current_context(), time.time_ns())
+
+
+def _run_queued_generation(question_id: int, trace_parent: Optional[tracing.SpanContext], queued_ns: int):
+    metrics.BACKGROUND_TASKS_QUEUED.dec(task=GENERATION_TASK)
+    tracing.finish(tracing.start_span("generation_queued", parent=trace_parent, start_ns=queued_ns, question_id=question_id))
+    generation_and_duels_background_task(question_id, trace_parent)
+
+
+def generation_and_duels_background_task(question_id: int, trace_parent: Optional[tracing.SpanContext] = None):
     """Background task to generate outputs and save them to the database"""
+    metrics.BACKGROUND_TASKS_RUNNING.inc(task=GENERATION_TASK)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracing.span("generation_and_duels_background_task", parent=trace_parent, question_id=question_id):
+            _generate_outputs_and_duels(question_id)
+        outcome = "ok"
+    except cancellation.GenerationCancelled as exc:
+        outcome = "cancelled"
+        metrics.GENERATIONS_CANCELLED.inc(reason=exc.reason)
+        logger.info("Generation for question %s cancelled: %s", question_id, exc.reason)
+        if exc.reason != cancellation.DELETED:
+            record_generation_failure(question_id, str(exc))
+    except Exception as exc:
+        record_generation_failure(question_id, str(exc))
+        raise
+    finally:
+        metrics.BACKGROUND_TASKS_RUNNING.dec(task=GENERATION_TASK)
+        metrics.BACKGROUND_TASK_DURATION.observe(time.perf_counter() - started, task=GENERATION_TASK, outcome=outcome)
+
+
+def _generate_outputs_and_duels(question_id: int):
     from services.llm import generate_outputs
     
+    # Deleting the question or passing the deadline cancels the token (0 disables the deadline)
+    token = cancellation.register(question_id, float(os.getenv("GENERATION_DEADLINE_SECONDS", "600")))
+    try:
+        with cancellation.active(token), Session(engine) as db:
+            question = db.exec(select(Question).where(Question.id == question_id)).first()
+            if not question:
+                return
+            
+            # Generate outputs and save them
+            templates = db.exec(select(Template)).all()
+            outputs = generate_outputs(templates, question)
+            # Nothing is written before this point; a delete landing after it fails the insert's foreign keys
+            token.check()
+            store_outputs_and_duels(question_id, outputs, db)
+    finally:
+        cancellation.unregister(question_id, token)
+
+
+def record_generation_failure(question_id: int, error: str):
+    """Mark a question whose outputs will not be generated, so its status reports "failed" """
     with Session(engine) as db:
-        question = db.exec(select(Question).where(Question.id == question_id)).first()
-        if not question:
-            return
-        
-        # Generate outputs and save them
-        templates = db.exec(select(Template)).all()
-        outputs = generate_outputs(templates, question)
-        for output in outputs:
-            db.add(output)
+        db.exec(update(Question).where(Question.id == question_id).values(generation_error=error[:1000]))
         db.commit()
-        
-        # Create duels for all generation pairs
-        generations = db.exec(select(Generation).where(Generation.question_id == question_id)).all()
-        for i, gen_a in enumerate(generations):
-            for gen_b in generations[i+1:]:
+    bump_question(question_id)
+
+
+def store_outputs_and_duels(question_id: int, outputs: List[Generation], db: Session):
+    """Store a question's generations, then create its duels, publishing an event after each step"""
+    for output in outputs:
+        db.add(externalize_output(output, db))
+    db.flush()
+    finished = [(output.id, output.template_id) for output in outputs]
+    db.commit()
+    bump_question(question_id, DUELS)
+    for generation_id, template_id in finished:
+        events.publish(events.GENERATION_FINISHED, question_id, generation_id=generation_id, template_id=template_id)
+    
+    # Create duels for all generation pairs
+    duel_creation_started = time.perf_counter()
+    with tracing.span("create_duels", question_id=question_id) as span:
+        duels = create_duels(question_id, db)
+        span.set_attribute("duels", duels)
+    metrics.DUEL_CREATION_DURATION.observe(time.perf_counter() - duel_creation_started)
+    metrics.DUELS_CREATED.inc(duels)
+    bump_question(question_id, DUELS)
+    events.publish(events.DUELS_READY, question_id, duels=duels)
+
+
+def store_outputs_and_duels_bulk(outputs_by_question: Dict[int, List[Generation]], db: Session) -> int:
+    """
+    Store the generations and duels of many questions in one transaction,
+    then publish their events. Returns the number of duels created.
+    """
+    for outputs in outputs_by_question.values():
+        for output in outputs:
+            db.add(externalize_output(output, db))
+    db.flush()
+    pairs = []
+    for question_id, outputs in outputs_by_question.items():
+        for i, gen_a in enumerate(outputs):
+            for gen_b in outputs[i+1:]:
                 duel = Duel(question_id=question_id)
                 db.add(duel)
-                db.flush()
-                db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
-                db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
-        db.commit()
+                pairs.append((duel, gen_a.id, gen_b.id))
+    db.flush()
+    for duel, gen_a_id, gen_b_id in pairs:
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a_id, role="generation_a"))
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b_id, role="generation_b"))
+    finished = {
+        question_id: [(output.id, output.template_id) for output in outputs]
+        for question_id, outputs in outputs_by_question.items()
+    }
+    db.commit()
+    metrics.DUELS_CREATED.inc(len(pairs))
+
+    for question_id, generations in finished.items():
+        bump_question(question_id, DUELS)
+        for generation_id, template_id in generations:
+            events.publish(events.GENERATION_FINISHED, question_id, generation_id=generation_id, template_id=template_id)
+        duels = len(generations) * (len(generations) - 1) // 2
+        events.publish(events.DUELS_READY, question_id, duels=duels)
+    return len(pairs)
+
+
+def create_duels(question_id: int, db: Session) -> int:
+    """Create and commit a duel for every pair of the question's generations. Returns the number created."""
+    generations = db.exec(select(Generation).where(Generation.question_id == question_id)).all()
+    duels = 0
+    for i, gen_a in enumerate(generations):
+        for gen_b in generations[i+1:]:
+            duel = Duel(question_id=question_id)
+            db.add(duel)
+            db.flush()
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
+            duels += 1
+    db.commit()
+    return duels
 
 
 def set_question_winner(question_id: int, db: Session):
@@ -74,5 +207,95 @@ def set_question_winner(question_id: int, db: Session):
         return None
     
     question.selected_generation_id = winner_id
+    question.decided_at = datetime.now()
     db.commit()
-    return question
\ No newline at end of file
+    
+    # Results of a decided question no longer change, so serve them from a snapshot
+    freeze_question_results(question_id, db)
+    
+    events.publish(events.WINNER_SELECTED, question_id, generation_id=winner_id)
+    _publish_template_ratings(question_id, db)
+    return question
+
+
+def _publish_template_ratings(question_id: int, db: Session):
+    """
+    Publish the new overall standing of every template that competed in a
+    newly decided question. The aggregate is computed on a worker thread,
+    once for all questions decided meanwhile, and skipped when nobody listens.
+    """
+    if not events.has_subscribers():
+        return
+    with _pending_ratings_lock:
+        idle = not _pending_ratings
+        _pending_ratings.add(question_id)
+    if idle:
+        _ratings_executor.submit(_publish_pending_template_ratings, db.get_bind())
+
+
+def _publish_pending_template_ratings(bind):
+    from services.performance import get_template_performance_stats
+    
+    with _pending_ratings_lock:
+        question_ids = sorted(_pending_ratings)
+        _pending_ratings.clear()
+    try:
+        with Session(bind) as db:
+            competed = db.exec(
+                select(Generation.question_id, Generation.template_id).where(Generation.question_id.in_(question_ids))
+            ).all()
+            overall = get_template_performance_stats(db)["overall"]
+    except Exception:
+        logger.exception("Template ratings for questions %s failed", question_ids)
+        return
+    
+    template_ids: Dict[int, set] = {}
+    for question_id, template_id in competed:
+        template_ids.setdefault(question_id, set()).add(template_id)
+    for question_id in question_ids:
+        for entry in overall:
+            if entry["template_id"] in template_ids.get(question_id, ()):
+                events.publish(events.TEMPLATE_RATING_CHANGED, question_id, **entry)
+
+
+def get_question_status(question_id: int, db: Session) -> Optional[QuestionStatus]:
+    """
+    Processing progress of a question from index-backed counts, in one query.
+    Returns None if the question does not exist.
+    """
+    generations_done = select(sql_func.count()).where(Generation.question_id == question_id).scalar_subquery()
+    templates = select(sql_func.count()).select_from(Template).scalar_subquery()
+    duels_total = select(sql_func.count()).where(Duel.question_id == question_id).scalar_subquery()
+    duels_decided = select(sql_func.count(Duel.winner_id)).where(Duel.question_id == question_id).scalar_subquery()
+    row = db.exec(
+        select(
+            Question.selected_generation_id, Question.generation_error, generations_done, templates, duels_total,
+            duels_decided,
+        )
+        .where(Question.id == question_id)
+    ).first()
+    if row is None:
+        return None
+    
+    selected_generation_id, error, generations_done, templates, duels_total, duels_decided = row
+    if selected_generation_id is not None:
+        state = "decided"
+    elif duels_total:
+        state = "ready"
+    elif error is not None:
+        state = "failed"
+    else:
+        state = "generating"
+    
+    return QuestionStatus(
+        question_id=question_id,
+        state=state,
+        generations_done=generations_done,
+        # Once duels exist every generation has been stored, templates may have changed since
+        generations_expected=generations_done if duels_total else templates,
+        duels_total=duels_total,
+        duels_decided=duels_decided,
+        error=error if state == "failed" else None,
+        # Derived from the stored state, so every worker and restart reports the same version
+        version=zlib.crc32(repr(tuple(row)).encode()),
+    )
@@ -0,0 +1,47 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread: `rate` acquisitions per second on
+    average, with bursts of up to `burst`. Callers reserve a token under the
+    lock and sleep outside it, so waiting threads are served in arrival order.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or max(1, round(rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, waiting until one is available. Returns the seconds waited."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+def per_minute(requests_per_minute: Optional[str], burst: Optional[str] = None) -> Optional[RateLimiter]:
+    """Limiter for a requests-per-minute setting, None when unset or 0"""
+    if not requests_per_minute or float(requests_per_minute) <= 0:
+        return None
+    return RateLimiter(float(requests_per_minute) / 60, int(burst) if burst else None)
@@ -0,0 +1,222 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import Engine, text
+from sqlmodel import Session, select, case, func as sql_func
+from models.archive import ArchivedQuestion, ArchivedTemplateStats
+from models.duel import Duel, DuelGeneration
+from models.generation import Generation
+from models.questions import Question
+from services.blobs import delete_orphan_blobs, load_output_texts
+from services.cache import DUELS, bump_question
+from services.deletion import delete_questions
+
+# Number of questions archived per transaction
+DEFAULT_BATCH_SIZE = 200
+
+# Pages returned to the filesystem per incremental vacuum run
+DEFAULT_VACUUM_PAGES = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _build_archive_payload(question: Question, db: Session) -> bytes:
+    """Serialize a question with its generations and duels into a compressed JSON blob"""
+    generations = db.exec(select(Generation).where(Generation.question_id == question.id)).all()
+    load_output_texts(generations, db)
+    duel_rows = db.exec(
+        select(Duel, DuelGeneration.generation_id, DuelGeneration.role)
+        .join(DuelGeneration, Duel.id == DuelGeneration.duel_id)
+        .where(Duel.question_id == question.id)
+    ).all()
+
+    duels: Dict[int, Dict[str, Any]] = {}
+    for duel, generation_id, role in duel_rows:
+        if duel.id not in duels:
+            duels[duel.id] = duel.model_dump(mode="json")
+        duels[duel.id][role] = generation_id
+
+    payload = {
+        "question": question.model_dump(mode="json"),
+        "generations": [generation.model_dump(mode="json") for generation in generations],
+        "duels": list(duels.values()),
+    }
+    return zlib.compress(json.dumps(payload).encode("utf-8"), level=9)
+
+
+def _accumulate_template_stats(question_ids: List[int], db: Session):
+    """Add the decided duels of the given questions to the archived per-template totals"""
+    contributions = db.exec(
+        select(
+            Generation.template_id,
+            sql_func.count().label('total_duels'),
+            sql_func.sum(case((Generation.id == Duel.winner_id, 1), else_=0)).label('wins')
+        )
+        .select_from(Duel)
+        .join(DuelGeneration, Duel.id == DuelGeneration.duel_id)
+        .join(Generation, DuelGeneration.generation_id == Generation.id)
+        .where(Duel.question_id.in_(question_ids), Duel.winner_id.isnot(None))
+        .group_by(Generation.template_id)
+    ).all()
+
+    for template_id, total_duels, wins in contributions:
+        stats = db.get(ArchivedTemplateStats, template_id)
+        if stats is None:
+            stats = ArchivedTemplateStats(template_id=template_id)
+        stats.total_duels += total_duels
+        stats.wins += wins or 0
+        db.add(stats)
+
+
+def archive_decided_questions(
+    db: Session,
+    older_than: datetime,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Move decided questions created before `older_than` into the archive.
+
+    Each question is stored as a compressed payload in ArchivedQuestion, its
+    duel results are folded into ArchivedTemplateStats and the live rows are
+    removed. Every batch runs in its own transaction.
+    Returns the number of questions archived.
+    """
+    archived = 0
+    while True:
+        rows = db.exec(
+            select(Question, Generation.template_id)
+            .join(Generation, Question.selected_generation_id == Generation.id)
+            .where(Question.created_at < older_than)
+            .order_by(Question.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        question_ids = [question.id for question, _ in rows]
+        for question, selected_template_id in rows:
+            db.add(ArchivedQuestion(
+                question_id=question.id,
+                text=question.text,
+                created_at=question.created_at,
+                selected_template_id=selected_template_id,
+                payload=_build_archive_payload(question, db),
+            ))
+        _accumulate_template_stats(question_ids, db)
+        delete_questions(question_ids, db)
+        db.commit()
+        for question_id in question_ids:
+            bump_question(question_id, DUELS)
+
+        archived += len(question_ids)
+    return archived
+
+
+def load_archived_question(question_id: int, db: Session) -> Optional[Dict[str, Any]]:
+    """Return the decompressed archive payload of a question, or None if it is not archived"""
+    archived = db.exec(
+        select(ArchivedQuestion)
+        .where(ArchivedQuestion.question_id == question_id)
+        .order_by(ArchivedQuestion.id.desc())
+    ).first()
+    if archived is None:
+        return None
+    return json.loads(zlib.decompress(archived.payload))
+
+
+def enable_incremental_vacuum(engine: Engine) -> bool:
+    """
+    Switch the database to incremental auto-vacuum. This needs one full
+    VACUUM, which rewrites the file and locks it throughout, so it runs from
+    the command line rather than in the API process.
+    Returns False when the database already uses incremental auto-vacuum.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2:  # 2 = INCREMENTAL
+            return False
+        connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        connection.execute(text("VACUUM"))
+    return True
+
+
+def compact_database(engine: Engine, pages: int = DEFAULT_VACUUM_PAGES):
+    """
+    Release up to `pages` free pages and refresh the query planner statistics.
+    Free pages are only released once enable_incremental_vacuum has run.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            connection.execute(text(f"PRAGMA incremental_vacuum({int(pages)})"))
+        else:
+            logger.info("Skipping incremental vacuum: run python -m services.retention once to enable it")
+        connection.execute(text("ANALYZE"))
+
+
+def run_retention(engine: Engine, retention_days: int, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Archive decided questions older than `retention_days`, drop unused output blobs and compact the database"""
+    with Session(engine) as db:
+        archived = archive_decided_questions(
+            db, datetime.now() - timedelta(days=retention_days), batch_size=batch_size
+        )
+        delete_orphan_blobs(db)
+    compact_database(engine)
+    return archived
+
+
+class RetentionScheduler:
+    """Runs the retention job periodically on a daemon thread"""
+
+    def __init__(self, engine: Engine, retention_days: int, interval_seconds: float):
+        self.engine = engine
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                archived = run_retention(self.engine, self.retention_days)
+                logger.info("Retention: archived %d decided questions", archived)
+            except Exception:
+                logger.exception("Retention job failed")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def scheduler_from_env(engine: Engine) -> Optional[RetentionScheduler]:
+    """
+    Build a scheduler from RETENTION_DAYS and RETENTION_INTERVAL_HOURS.
+    Returns None when RETENTION_DAYS is not set, leaving retention disabled.
+    """
+    retention_days = os.getenv("RETENTION_DAYS")
+    if not retention_days:
+        return None
+    interval_hours = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+    return RetentionScheduler(engine, int(retention_days), interval_hours * 3600)
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    parser = argparse.ArgumentParser(description="Archive decided questions and compact the database")
+    parser.add_argument("--days", type=int, required=True, help="Archive decided questions older than this many days")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if enable_incremental_vacuum(engine):
+        print("✓ Switched the database to incremental auto-vacuum")
+    archived = run_retention(engine, args.days, batch_size=args.batch_size)
+    print(f"✓ Archived {archived} decided questions and compacted the database")
@@ -0,0 +1,182 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from typing import Dict, List, Optional
+from services import metrics
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+BACKFILL = "backfill"
+DEFAULT_WEIGHTS = {INTERACTIVE: 8.0, BULK: 2.0, BACKFILL: 1.0}
+
+
+class _Slot:
+    """The pipeline worker running the current call"""
+
+    def __init__(self, pipeline: "GenerationPipeline", priority: str):
+        self.pipeline = pipeline
+        self.priority = priority
+        # Work the call left running, which keeps the worker busy after the call returns
+        self.holds: List[Future] = []
+
+
+_slot: contextvars.ContextVar[Optional[_Slot]] = contextvars.ContextVar("pipeline_slot", default=None)
+
+
+def in_pipeline() -> bool:
+    """Whether the current code runs as a pipeline call"""
+    return _slot.get() is not None
+
+
+def submit_alongside(fn, *args) -> Future:
+    """
+    Queue a call in the same pipeline and class as the current pipeline
+    call, so it counts against the same concurrency limit
+    """
+    slot = _slot.get()
+    if slot is None:
+        raise RuntimeError("submit_alongside needs a pipeline call")
+    return slot.pipeline.submit(fn, *args, priority=slot.priority)
+
+
+def hold_slot(future: Future):
+    """
+    Keep the current call's worker busy until `future` is done, after the
+    call itself has returned its result. Does nothing outside a pipeline call.
+    """
+    slot = _slot.get()
+    if slot is not None:
+        slot.holds.append(future)
+
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    """Class weights from "interactive=8,bulk=2,backfill=1"; unset classes keep their default weight"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in weights or not value.strip() or float(value) <= 0:
+            raise ValueError(f"Invalid priority weight {item.strip()!r}: expected one of {', '.join(weights)} "
+                             f"with a positive weight")
+        weights[name] = float(value)
+    return weights
+
+
+class GenerationPipeline:
+    """
+    Worker threads shared by every caller, so LLM calls of different
+    questions overlap while at most `workers` run at once.
+
+    Calls wait in one FIFO queue per priority class. Each class has a pass
+    that grows by 1/weight per call started. A free worker takes the next
+    call of the backlogged class whose next call would finish first in
+    virtual time (pass + 1/weight), as in weighted fair queuing. Classes with
+    queued calls get workers in proportion to their weights: an interactive
+    question goes ahead of thousands of queued bulk calls, and bulk work
+    still progresses while interactive traffic is heavy.
+    """
+
+    def __init__(self, workers: int, weights: Optional[Dict[str, float]] = None):
+        self.workers = workers
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self._queues = {priority: deque() for priority in self.weights}
+        self._pass = {priority: 0.0 for priority in self.weights}
+        # Pass of the last call started; idle classes rejoin here instead of spending saved-up credit
+        self._virtual_time = 0.0
+        self._threads = []
+        self._idle = 0
+        self._condition = threading.Condition()
+
+    def submit(self, fn, *args, priority: str = BULK) -> Future:
+        """Queue a call; cancelling the returned future before it starts drops the call"""
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority {priority!r}: expected one of {', '.join(self.weights)}")
+        future = Future()
+        # Run in the caller's context so LLM spans join the caller's trace
+        task = (future, contextvars.copy_context(), fn, args, time.perf_counter())
+        with self._condition:
+            queue = self._queues[priority]
+            if not queue:
+                self._pass[priority] = max(self._pass[priority], self._virtual_time)
+            queue.append(task)
+            metrics.PIPELINE_QUEUE_DEPTH.set(len(queue), priority=priority)
+            # Calls cancelled while queued leave the queue at once, wherever they are in it
+            future.add_done_callback(lambda future: future.cancelled() and self._remove(priority, task))
+            if self._idle:
+                # Claimed here rather than when the woken worker gets the lock, so the next call of a
+                # burst starts another worker instead of counting on this one
+                self._idle -= 1
+                self._condition.notify()
+            elif len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"generation_{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return future
+
+    def queue_depths(self) -> Dict[str, int]:
+        with self._condition:
+            return {priority: len(queue) for priority, queue in self._queues.items()}
+
+    def _remove(self, priority: str, task):
+        with self._condition:
+            queue = self._queues[priority]
+            try:
+                queue.remove(task)
+            except ValueError:
+                # Already taken by a worker, which drops it
+                return
+            metrics.PIPELINE_CALLS_CANCELLED.inc(priority=priority)
+            metrics.PIPELINE_QUEUE_DEPTH.set(len(queue), priority=priority)
+
+    def _next(self):
+        with self._condition:
+            while not any(self._queues.values()):
+                # submit takes the worker off the idle count when it wakes it
+                self._idle += 1
+                self._condition.wait()
+            # Ties go to the heavier class
+            priority = min(
+                (priority for priority, queue in self._queues.items() if queue),
+                key=lambda priority: (self._pass[priority] + 1 / self.weights[priority], -self.weights[priority]),
+            )
+            self._virtual_time = self._pass[priority]
+            self._pass[priority] += 1 / self.weights[priority]
+            queue = self._queues[priority]
+            task = queue.popleft()
+            metrics.PIPELINE_QUEUE_DEPTH.set(len(queue), priority=priority)
+        return priority, task
+
+    def _work(self):
+        while True:
+            priority, (future, context, fn, args, queued) = self._next()
+            metrics.PIPELINE_QUEUE_WAIT.observe(time.perf_counter() - queued, priority=priority)
+            if not future.set_running_or_notify_cancel():
+                metrics.PIPELINE_CALLS_CANCELLED.inc(priority=priority)
+                continue
+            metrics.PIPELINE_CALLS_IN_FLIGHT.inc(priority=priority)
+            slot = _Slot(self, priority)
+            try:
+                result = context.run(self._run_in_slot, slot, fn, args)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                # The caller already has its result; the worker waits for what the call left running
+                wait(slot.holds)
+                metrics.PIPELINE_CALLS_IN_FLIGHT.dec(priority=priority)
+
+    @staticmethod
+    def _run_in_slot(slot: _Slot, fn, args):
+        _slot.set(slot)
+        return fn(*args)
+
+
+pipeline = GenerationPipeline(
+    int(os.getenv("GENERATION_CONCURRENCY", "8")), parse_weights(os.getenv("GENERATION_PRIORITY_WEIGHTS"))
+)
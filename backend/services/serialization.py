@@ -0,0 +1,48 @@
+from typing import Any, List
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+from models.duel import DuelWithGenerations
+from models.questions import QuestionSummary
+
+try:
+    import orjson
+except ImportError:  # a dependency, but pydantic-core's serializer is used where it is missing
+    orjson = None
+
+
+# Serializers of the hot response models, built once at import
+QUESTION_SUMMARY_LIST = TypeAdapter(List[QuestionSummary])
+DUEL_WITH_GENERATIONS = TypeAdapter(DuelWithGenerations)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize a response body to compact JSON. Handles plain dicts and lists,
+    datetimes and pydantic/SQLModel instances without a jsonable_encoder pass.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def serialize(adapter: TypeAdapter, value: Any, **kwargs) -> bytes:
+    """
+    Serialize an already-built response value with a precompiled adapter,
+    skipping the validation FastAPI would run for the route's response_model.
+    """
+    return adapter.dump_json(value, **kwargs)
@@ -0,0 +1,70 @@
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a computation for a key is in
+    flight, other callers with the same key wait for it and share its result
+    instead of running it again.
+
+    Keys are tuples whose first element names the operation; hit counts are
+    kept per operation name.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, field: str):
+        stats = self._stats.setdefault(name, {"calls": 0, "executions": 0, "coalesced": 0})
+        stats[field] += 1
+
+    def do(self, key: Tuple[Hashable, ...], fn: Callable[[], Any]) -> Any:
+        name = str(key[0])
+        with self._lock:
+            self._count(name, "calls")
+            call = self._calls.get(key)
+            if call is not None:
+                self._count(name, "coalesced")
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._count(name, "executions")
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Callers must not see each other's mutations of the shared result
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
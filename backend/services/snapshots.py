@@ -0,0 +1,81 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select, delete
+from models.generation import Generation
+from models.questions import QuestionResults
+from models.snapshot import QuestionResultSnapshot
+
+# Snapshots only change when a related template or generation is deleted, so
+# clients may reuse them for a day and then revalidate with the ETag
+SNAPSHOT_CACHE_CONTROL = "public, max-age=86400"
+
+
+def _etag(payload: str) -> str:
+    return '"' + hashlib.sha1(payload.encode("utf-8")).hexdigest() + '"'
+
+
+def store_results_snapshot(results: QuestionResults, db: Session) -> QuestionResultSnapshot:
+    """Freeze the serialized results of a decided question, replacing any previous snapshot"""
+    payload = json.dumps(jsonable_encoder(results))
+    etag = _etag(payload)
+    values = {
+        "question_id": results.question.id,
+        "payload": payload,
+        "etag": etag,
+        "created_at": datetime.now(),
+    }
+    db.exec(
+        insert(QuestionResultSnapshot)
+        .values(**values)
+        .on_conflict_do_update(index_elements=["question_id"], set_=values)
+    )
+    db.commit()
+    return QuestionResultSnapshot(**values)
+
+
+def freeze_question_results(question_id: int, db: Session) -> Optional[QuestionResultSnapshot]:
+    """Compute and store the results snapshot of a decided question, with every performance key"""
+    from services.performance import GENERATION_PERFORMANCE_FIELDS, build_question_results
+
+    results = build_question_results(question_id, db, fields=GENERATION_PERFORMANCE_FIELDS)
+    if results is None or results.question.selected_generation_id is None:
+        return None
+    return store_results_snapshot(results, db)
+
+
+def get_results_snapshot(question_id: int, db: Session) -> Optional[QuestionResultSnapshot]:
+    return db.get(QuestionResultSnapshot, question_id)
+
+
+def project_results_snapshot(snapshot: QuestionResultSnapshot, fields: Iterable[str]) -> Tuple[str, str]:
+    """
+    Payload and ETag of a snapshot keeping only the given generation_performance
+    keys. A snapshot holds every key, so any ?fields= selection is served from it.
+    """
+    from services.performance import GENERATION_PERFORMANCE_FIELDS
+
+    fields = set(fields)
+    if fields == set(GENERATION_PERFORMANCE_FIELDS):
+        return snapshot.payload, snapshot.etag
+    results = json.loads(snapshot.payload)
+    results["generation_performance"] = [
+        {key: value for key, value in entry.items() if key in fields}
+        for entry in results["generation_performance"]
+    ]
+    payload = json.dumps(results)
+    return payload, _etag(payload)
+
+
+def delete_results_snapshots(question_ids: List[int], db: Session):
+    """Drop snapshots of the given questions without committing"""
+    db.exec(delete(QuestionResultSnapshot).where(QuestionResultSnapshot.question_id.in_(question_ids)))
+
+
+def delete_snapshots_for_generations(generation_ids: List[int], db: Session):
+    """Drop snapshots of the questions the given generations belong to, without committing"""
+    questions = select(Generation.question_id).where(Generation.id.in_(generation_ids))
+    db.exec(delete(QuestionResultSnapshot).where(QuestionResultSnapshot.question_id.in_(questions)))
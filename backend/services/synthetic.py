@@ -0,0 +1,32 @@
+import math
+import random
+
+
+class LatencyModel:
+    """
+    Seconds drawn from a distribution: "fixed" (always `mean`), "uniform"
+    (mean ± stddev), "normal" or "lognormal" (with the given mean and stddev).
+    """
+
+    def __init__(self, distribution: str = "fixed", mean: float = 0.0, stddev: float = 0.0):
+        if distribution not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {distribution!r}")
+        self.distribution = distribution
+        self.mean = mean
+        self.stddev = stddev
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "fixed" or self.mean <= 0:
+            return max(0.0, self.mean)
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(self.mean - self.stddev, self.mean + self.stddev))
+        if self.distribution == "normal":
+            return max(0.0, rng.gauss(self.mean, self.stddev))
+        # Parameters of the underlying normal so the samples have the requested mean and stddev
+        sigma = math.sqrt(math.log(1 + (self.stddev / self.mean) ** 2))
+        return rng.lognormvariate(math.log(self.mean) - sigma ** 2 / 2, sigma)
+
+
+def count_prompt_tokens(prompt: str) -> int:
+    # About four characters per token for English text
+    return max(1, round(len(prompt) / 4))
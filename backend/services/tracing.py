@@ -0,0 +1,461 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.profiling import describe_statement
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "llm-tournament-api"
+
+
+class Span:
+    """A timed operation in a trace. Finished spans are handed to the exporter as dicts."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def context(self) -> "SpanContext":
+        return SpanContext(self.trace_id, self.span_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+
+class SpanContext(NamedTuple):
+    """Identifies a span, to continue its trace in background work"""
+
+    trace_id: str
+    span_id: str
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+# Receives finished spans; tracing is off while None
+exporter = None
+
+
+def configure_exporter(new_exporter):
+    global exporter
+    exporter = new_exporter
+
+
+def current_context() -> Optional[SpanContext]:
+    """Context of the active span, to pass to work that runs outside this request"""
+    span = _current.get()
+    return span.context if span is not None else None
+
+
+def _new_span(name: str, parent: Optional[SpanContext], attributes: Dict[str, Any]) -> Span:
+    if parent is None:
+        parent = current_context()
+    if parent is None:
+        return Span(name, secrets.token_hex(16), None, attributes)
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+class _ActiveSpan:
+    def __init__(self, name: str, parent: Optional[SpanContext], attributes: Dict[str, Any]):
+        self.span = _new_span(name, parent, attributes)
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        finish(self.span)
+        return False
+
+
+def span(name: str, parent: Optional[SpanContext] = None, **attributes: Any):
+    """
+    Context manager timing its block as a span. It is a child of the active span
+    unless `parent` is given, and a no-op while no exporter is configured.
+    """
+    if exporter is None:
+        return _NOOP_SPAN
+    return _ActiveSpan(name, parent, attributes)
+
+
+def start_span(
+    name: str, parent: Optional[SpanContext] = None, start_ns: Optional[int] = None, **attributes: Any
+) -> Optional[Span]:
+    """A span that does not become the active span; end it with `finish`"""
+    if exporter is None:
+        return None
+    span = _new_span(name, parent, attributes)
+    if start_ns is not None:
+        span.start_ns = start_ns
+    return span
+
+
+def finish(span: Optional[Span], end_ns: Optional[int] = None):
+    if span is None or span.end_ns is not None:
+        return
+    span.end_ns = end_ns or time.time_ns()
+    target = exporter
+    if target is not None:
+        target.export(span.to_dict())
+
+
+# W3C trace context: 00-<trace id>-<parent span id>-<flags>
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return SpanContext(parts[1].lower(), parts[2].lower())
+
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-01"
+
+
+class TracingMiddleware:
+    """
+    Root span per HTTP request, continuing the caller's trace when a
+    `traceparent` header is sent. The span ends with the response body, so
+    background tasks that run afterwards are not part of its duration; they
+    start their own spans in the same trace.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if exporter is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        request_span = _ActiveSpan(f"{scope['method']} {scope['path']}", parent, {"http.method": scope["method"]})
+        span = request_span.span
+
+        async def send_with_trace(message: Message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+                MutableHeaders(scope=message).append("traceparent", format_traceparent(span.context))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish(span)
+
+        with request_span:
+            await self.app(scope, receive, send_with_trace)
+
+
+def _record_statement(statement: str, start_ns: int, duration: float):
+    # Statements outside any trace (schedulers, scripts) are not recorded
+    if exporter is None or _current.get() is None:
+        return
+    span = start_span(describe_statement(statement), start_ns=start_ns, **{"db.statement": statement[:1000]})
+    finish(span, start_ns + int(duration * 1e9))
+
+
+def instrument_engines():
+    """Record a span for every SQL statement executed inside a trace"""
+    from services.instrumentation import observe_statements
+
+    observe_statements(_record_statement)
+
+
+class JsonlExporter:
+    """Appends one JSON object per finished span to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Dict[str, Any]):
+        line = json.dumps(span, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        with self._lock:
+            self._file.close()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """OTLP/JSON trace export request for a batch of spans"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "services.tracing"},
+            "spans": [{
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                "parentSpanId": span["parent_id"] or "",
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(span["start_ns"]),
+                "endTimeUnixNano": str(span["end_ns"]),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span["attributes"].items()],
+                "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+def from_otlp(payload: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    """Spans of an OTLP/JSON export request, in the JSONL exporter's format"""
+    for resource_spans in payload.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                attributes = {}
+                for attribute in span.get("attributes", []):
+                    value = attribute.get("value", {})
+                    if "intValue" in value:
+                        attributes[attribute["key"]] = int(value["intValue"])
+                    else:
+                        attributes[attribute["key"]] = next(iter(value.values()), None)
+                start_ns, end_ns = int(span["startTimeUnixNano"]), int(span["endTimeUnixNano"])
+                status = span.get("status", {})
+                yield {
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_id": span.get("parentSpanId") or None,
+                    "name": span["name"],
+                    "start_ns": start_ns,
+                    "end_ns": end_ns,
+                    "duration_ms": round((end_ns - start_ns) / 1e6, 3),
+                    "attributes": attributes,
+                    "status": "error" if status.get("code") == 2 else "ok",
+                    "error": status.get("message"),
+                }
+
+
+class OtlpExporter:
+    """
+    Batches spans and posts them as OTLP/JSON to a collector's /v1/traces,
+    from a background thread. Spans are dropped, not buffered without bound,
+    when the collector falls behind or is unreachable.
+    """
+
+    def __init__(self, endpoint: str, batch_size: int = 256, flush_seconds: float = 1.0, max_queue: int = 10000):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def export(self, span: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _post(self, spans: List[Dict[str, Any]]):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(to_otlp(spans), default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except OSError as exc:
+            self.dropped += len(spans)
+            logger.warning("Trace export to %s failed: %s", self.url, exc)
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        spans = []
+        while len(spans) < self.batch_size:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            while spans := self._drain():
+                self._post(spans)
+
+    def flush(self):
+        while spans := self._drain():
+            self._post(spans)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+def exporter_from_env():
+    """
+    An OtlpExporter when TRACING_OTLP_ENDPOINT is set, a JsonlExporter when
+    TRACING_JSONL_PATH is set, else None and tracing stays off.
+    """
+    endpoint = os.getenv("TRACING_OTLP_ENDPOINT")
+    if endpoint:
+        return OtlpExporter(endpoint)
+    path = os.getenv("TRACING_JSONL_PATH")
+    if path:
+        return JsonlExporter(path)
+    return None
+
+
+def run_collector(host: str, port: int, output: str) -> ThreadingHTTPServer:
+    """
+    OTLP/HTTP collector stand-in: accepts JSON export requests on /v1/traces
+    and appends the spans to `output` as JSONL. Returns the server; call
+    serve_forever() on it.
+    """
+    sink = JsonlExporter(output)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                for span in from_otlp(payload):
+                    sink.export(span)
+            except (ValueError, KeyError):
+                self.send_error(400)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def fold_stacks(spans: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Self time in microseconds per span stack ("root;child;leaf"), the input
+    format of flamegraph.pl and speedscope.
+    """
+    by_id = {span["span_id"]: span for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        if span["parent_id"] in by_id:
+            children[span["parent_id"]].append(span)
+
+    def stack(span):
+        names = []
+        while span is not None:
+            names.append(span["name"].replace(";", ","))
+            span = by_id.get(span["parent_id"])
+        return ";".join(reversed(names))
+
+    folded: Dict[str, int] = defaultdict(int)
+    for span in spans:
+        duration = span["end_ns"] - span["start_ns"]
+        # Background work may outlive its parent, so self time never goes below zero
+        self_time = max(0, duration - sum(child["end_ns"] - child["start_ns"] for child in children[span["span_id"]]))
+        folded[stack(span)] += self_time // 1000
+    return dict(folded)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trace collection and analysis")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    collector = subparsers.add_parser("collector", help="OTLP/HTTP collector stand-in writing JSONL")
+    collector.add_argument("--host", default="127.0.0.1")
+    collector.add_argument("--port", type=int, default=4318)
+    collector.add_argument("--output", default="traces.jsonl")
+    fold = subparsers.add_parser("fold", help="Folded stacks of a JSONL trace file, for flame graphs")
+    fold.add_argument("path")
+    fold.add_argument("--trace-id", help="Only this trace")
+    args = parser.parse_args()
+
+    if args.command == "collector":
+        server = run_collector(args.host, args.port, args.output)
+        print(f"Trace collector listening on {args.host}:{args.port}, writing {args.output}")
+        server.serve_forever()
+    else:
+        spans = load_spans(args.path)
+        if args.trace_id:
+            spans = [span for span in spans if span["trace_id"] == args.trace_id]
+        for stack, micros in sorted(fold_stacks(spans).items()):
+            print(f"{stack} {micros}")
@@ -1,18 +1,22 @@
 import pytest
 import tempfile
 import os
-from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel import SQLModel, create_engine, Session, func, select
 from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
 
 # Import all models so they register with SQLModel.metadata
 from models.template import Template
-from models.questions import Question
+from models.questions import BatchApiJob, Question
 from models.generation import Generation
+from models.blob import OutputBlob
 from models.duel import Duel, DuelGeneration
+from models.archive import ArchivedQuestion, ArchivedTemplateStats
+from models.snapshot import QuestionResultSnapshot
 
 from main import app
+from services.cache import change_counters, response_cache
 
 
 @pytest.fixture(scope="function")
@@ -59,6 +63,10 @@ def client(test_db):
     
     app.dependency_overrides[get_db] = override_get_db
     
+    # Cached responses and change counters are process-wide; each test starts from a new database
+    response_cache.clear()
+    change_counters.clear()
+    
     with TestClient(app) as test_client:
         yield test_client
     
@@ -76,6 +84,23 @@ def sample_template():
     )
 
 
+@pytest.fixture
+def templates(db_session):
+    """Three stored templates, a, b and c, whose prompts start with their key"""
+    templates = [Template(key=key, name=key.upper(), template_text=f"{key}: {{{{question}}}}") for key in ("a", "b", "c")]
+    db_session.add_all(templates)
+    db_session.commit()
+    for template in templates:
+        db_session.refresh(template)
+    return templates
+
+
+@pytest.fixture
+def count(db_session):
+    """Number of rows of a model in the test database"""
+    return lambda model: db_session.exec(select(func.count()).select_from(model)).one()
+
+
 @pytest.fixture
 def sample_question():
     """Create a sample question for testing"""
@@ -0,0 +1,166 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import Session, select
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.blob import OutputBlob
+from models.duel import Duel, DuelGeneration
+from services.blobs import (
+    delete_orphan_blobs,
+    externalize_inline_outputs,
+    externalize_output,
+    get_output_text,
+    load_output_texts,
+    output_hash,
+    store_output,
+)
+
+
+@pytest.fixture
+def question_with_template(db_session, sample_template, sample_question):
+    db_session.add(sample_template)
+    db_session.add(sample_question)
+    db_session.commit()
+    db_session.refresh(sample_template)
+    db_session.refresh(sample_question)
+    return sample_template, sample_question
+
+
+def _generation(template, question, text):
+    return Generation(
+        template_id=template.id,
+        question_id=question.id,
+        output_text=text,
+        llm_model="gpt-4o-mini",
+        latency=0.5,
+        output_tokens=10,
+        input_tokens=20
+    )
+
+
+class TestBlobService:
+    """Test content-addressed storage of generation outputs"""
+
+    def test_store_output_deduplicates(self, db_session):
+        """Test that identical texts are stored once"""
+        first = store_output("The capital of France is Paris.", db_session)
+        second = store_output("The capital of France is Paris.", db_session)
+        other = store_output("Paris.", db_session)
+        db_session.commit()
+
+        assert first == second == output_hash("The capital of France is Paris.")
+        assert other != first
+        assert len(db_session.exec(select(OutputBlob)).all()) == 2
+        assert get_output_text(first, db_session) == "The capital of France is Paris."
+        assert get_output_text("missing", db_session) is None
+
+    def test_externalize_output_keeps_hash_and_length(self, db_session, question_with_template):
+        """Test that an externalized generation row no longer holds its text"""
+        template, question = question_with_template
+        generation = externalize_output(_generation(template, question, "Paris " * 100), db_session)
+        db_session.add(generation)
+        db_session.commit()
+
+        row = db_session.exec(
+            text("SELECT output_text, output_hash, output_length FROM generation")
+        ).one()
+        assert row.output_text == ""
+        assert row.output_hash == output_hash("Paris " * 100)
+        assert row.output_length == 600
+
+        blob = db_session.get(OutputBlob, row.output_hash)
+        assert len(blob.data) < 600
+
+    def test_load_output_texts_is_not_written_back(self, db_session, question_with_template):
+        """Test that hydrated text is served without being flushed into the generation row"""
+        template, question = question_with_template
+        db_session.add(externalize_output(_generation(template, question, "Paris"), db_session))
+        db_session.add(_generation(template, question, "Legacy inline text"))
+        db_session.commit()
+        db_session.expire_all()
+
+        generations = db_session.exec(select(Generation).order_by(Generation.id)).all()
+        load_output_texts(generations + [None], db_session)
+        assert [g.output_text for g in generations] == ["Paris", "Legacy inline text"]
+
+        db_session.commit()
+        inline = db_session.exec(text("SELECT output_text FROM generation ORDER BY id")).scalars().all()
+        assert inline == ["", "Legacy inline text"]
+
+    def test_externalize_inline_outputs_and_orphans(self, db_session, question_with_template):
+        """Test migrating legacy inline rows and removing unreferenced blobs"""
+        template, question = question_with_template
+        for output in ("Paris", "Paris", "Lyon"):
+            db_session.add(_generation(template, question, output))
+        store_output("Nobody references this", db_session)
+        db_session.commit()
+
+        assert externalize_inline_outputs(db_session, batch_size=2) == 3
+        assert externalize_inline_outputs(db_session) == 0
+        assert len(db_session.exec(select(OutputBlob)).all()) == 3
+
+        assert delete_orphan_blobs(db_session) == 1
+        hashes = {blob.hash for blob in db_session.exec(select(OutputBlob)).all()}
+        assert hashes == {output_hash("Paris"), output_hash("Lyon")}
+
+    def test_add_missing_columns_upgrades_legacy_table(self, tmp_path):
+        """Test that an existing generation table gains the blob columns"""
+        from db import add_missing_columns
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE generation (id INTEGER PRIMARY KEY, template_id INTEGER NOT NULL, "
+                "question_id INTEGER NOT NULL, output_text VARCHAR NOT NULL, llm_model VARCHAR NOT NULL, "
+                "latency FLOAT NOT NULL, output_tokens INTEGER NOT NULL, input_tokens INTEGER NOT NULL, "
+                "created_at DATETIME NOT NULL)"
+            ))
+
+        add_missing_columns(engine)
+
+        columns = {column["name"] for column in inspect(engine).get_columns("generation")}
+        assert {"output_hash", "output_length"} <= columns
+        engine.dispose()
+
+
+class TestBlobBackedEndpoints:
+    """Test that endpoints serve text for blob-backed generations"""
+
+    def test_duel_and_results_include_output_text(self, client: TestClient, test_db):
+        """Test get_next_duel, get_question and results with externalized outputs"""
+        with Session(test_db) as db:
+            template = Template(key="t", name="T", template_text="{{question}}")
+            question = Question(text="Capital of France?")
+            db.add(template)
+            db.add(question)
+            db.commit()
+            gen_a = externalize_output(_generation(template, question, "Paris"), db)
+            gen_b = externalize_output(_generation(template, question, "Lyon"), db)
+            db.add(gen_a)
+            db.add(gen_b)
+            db.commit()
+            duel = Duel(question_id=question.id)
+            db.add(duel)
+            db.flush()
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
+            db.commit()
+            question_id, duel_id, gen_a_id = question.id, duel.id, gen_a.id
+
+        response = client.get(f"/questions/{question_id}/duels/next")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["generation_a"]["output_text"] == "Paris"
+        assert data["generation_b"]["output_text"] == "Lyon"
+
+        response = client.post(f"/questions/{question_id}/duels/{duel_id}/decide", json={"winner_id": gen_a_id})
+        assert response.status_code == 200
+
+        data = client.get(f"/questions/{question_id}").json()
+        assert data["selected_generation"]["output_text"] == "Paris"
+
+        data = client.get(f"/questions/{question_id}/results?fields=generation_id,output_text").json()
+        assert data["selected_generation"]["output_text"] == "Paris"
+        assert {p["output_text"] for p in data["generation_performance"]} == {"Paris", "Lyon"}
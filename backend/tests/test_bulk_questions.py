@@ -0,0 +1,157 @@
+import json
+import re
+import threading
+import time
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel
+from services import batches
+from services.llm import LLMProvider, StubProvider
+
+
+@pytest.fixture
+def batch_db(test_db):
+    """Run batch generation against the test database with the stub provider"""
+    with patch("services.batches.engine", test_db), patch("services.question.engine", test_db), \
+            patch.dict("os.environ", {"LLM_PROVIDER": "stub"}):
+        yield test_db
+
+
+class ConcurrencyProvider(LLMProvider):
+    """Slow provider recording how many calls overlap, failing on prompts that contain `fail_on`"""
+
+    name = "concurrency"
+
+    def __init__(self, delay: float = 0.02, fail_on: str = None):
+        super().__init__("test-model")
+        self.delay = delay
+        self.fail_on = fail_on
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def complete(self, prompt):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            if self.fail_on and self.fail_on in prompt:
+                raise RuntimeError("provider error")
+            return StubProvider(seed=0).complete(prompt)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class TestBulkQuestions:
+    """Test POST /questions/bulk and batch progress"""
+
+    def test_json_upload(self, client: TestClient, batch_db, templates, db_session: Session, count):
+        questions = [{"text": f"Question {i}?"} for i in range(30)]
+        response = client.post("/questions/bulk", json=questions)
+
+        assert response.status_code == 202
+        batch = response.json()
+        assert batch["total"] == 30
+        assert len(batch["question_ids"]) == 30
+        created = db_session.exec(select(Question.created_at).where(Question.id.in_(batch["question_ids"]))
+                                  .order_by(Question.id)).all()
+        # Ids and creation times both follow the upload order
+        assert batch["question_ids"] == sorted(batch["question_ids"])
+        assert created == sorted(set(created))
+
+        progress = client.get(f"/questions/batches/{batch['id']}").json()
+        assert progress["status"] == "completed"
+        assert progress["generated"] == 30
+        assert progress["failed"] == 0
+        assert count(Generation) == 90
+        assert count(Duel) == 90
+        assert client.get(f"/questions/{batch['question_ids'][0]}").json()["text"] == "Question 0?"
+        status = client.get(f"/questions/{batch['question_ids'][-1]}/status").json()
+        assert status["state"] == "ready"
+
+    def test_ndjson_upload(self, client: TestClient, batch_db, templates):
+        body = "\n".join([json.dumps({"text": "First?"}), "", json.dumps("Second?")]) + "\n"
+        response = client.post("/questions/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+        assert response.status_code == 202
+        ids = response.json()["question_ids"]
+        assert [client.get(f"/questions/{i}").json()["text"] for i in ids] == ["First?", "Second?"]
+
+    def test_wrapped_json(self, client: TestClient, batch_db, templates):
+        response = client.post("/questions/bulk", json={"questions": ["Why?"]})
+        assert response.status_code == 202
+        assert response.json()["total"] == 1
+
+    @pytest.mark.parametrize("body,status", [
+        ("[]", 422),
+        ("not json", 422),
+        ('[{"text": ""}]', 422),
+        ('[{"question": "Why?"}]', 422),
+        ('{"text": "Why?"}', 422),
+    ])
+    def test_invalid_upload(self, client: TestClient, body, status, db_session: Session):
+        response = client.post("/questions/bulk", content=body, headers={"Content-Type": "application/json"})
+        assert response.status_code == status
+        assert client.get("/questions/").json() == []
+
+    def test_too_many_questions(self, client: TestClient):
+        with patch("routers.questions.MAX_BULK_QUESTIONS", 2):
+            response = client.post("/questions/bulk", json=["a", "b", "c"])
+        assert response.status_code == 413
+
+    def test_single_transaction(self, client: TestClient, batch_db, templates):
+        """Test that the upload's statement count does not grow with the number of questions"""
+        def statements(count):
+            response = client.post("/questions/bulk", json=[f"Question {i}?" for i in range(count)])
+            return int(re.search(r'db;desc="(\d+) quer', response.headers["server-timing"]).group(1))
+
+        assert statements(50) == statements(5)
+
+    def test_overlaps_llm_calls_across_questions(self, client: TestClient, batch_db, templates):
+        provider = ConcurrencyProvider()
+        with patch("services.llm.provider_from_env", return_value=provider):
+            response = client.post("/questions/bulk", json=[f"Question {i}?" for i in range(12)])
+
+        batch = client.get(f"/questions/batches/{response.json()['id']}").json()
+        assert batch["generated"] == 12
+        # Three templates per question, so more than three concurrent calls span several questions
+        assert provider.max_running > 3
+
+    def test_failed_questions(self, client: TestClient, batch_db, templates, db_session: Session):
+        provider = ConcurrencyProvider(delay=0, fail_on="broken")
+        with patch("services.llm.provider_from_env", return_value=provider):
+            response = client.post("/questions/bulk", json=["Fine?", "A broken one?", "Also fine?"])
+
+        ids = response.json()["question_ids"]
+        batch = client.get(f"/questions/batches/{response.json()['id']}").json()
+        assert batch["status"] == "completed"
+        assert batch["generated"] == 2
+        assert batch["failed_question_ids"] == [ids[1]]
+        assert client.get(f"/questions/{ids[1]}/status").json()["state"] == "failed"
+        assert db_session.exec(select(Generation).where(Generation.question_id == ids[1])).first() is None
+
+    def test_provider_unavailable(self, client: TestClient, batch_db, templates):
+        with patch("services.llm.provider_from_env", side_effect=ValueError("OPENAI_API_KEY environment variable is not set")):
+            response = client.post("/questions/bulk", json=["Why?"])
+
+        batch = client.get(f"/questions/batches/{response.json()['id']}").json()
+        assert batch["status"] == "failed"
+        assert "OPENAI_API_KEY" in batch["error"]
+
+    def test_finished_batches_evicted(self, client: TestClient, batch_db, templates):
+        with patch("services.batches.MAX_FINISHED_BATCHES", 2):
+            ids = [client.post("/questions/bulk", json=[f"Question {i}?"]).json()["id"] for i in range(4)]
+        # Evicted when the next batch is created, keeping the two most recent finished ones
+        assert [client.get(f"/questions/batches/{batch_id}").status_code for batch_id in ids] == [404, 200, 200, 200]
+        with patch("services.batches.FINISHED_RETENTION_SECONDS", 0):
+            batches.create_batch([])
+        assert [batches.get_batch(batch_id) for batch_id in ids] == [None] * 4
+
+    def test_unknown_batch(self, client: TestClient):
+        assert client.get("/questions/batches/missing").status_code == 404
@@ -0,0 +1,223 @@
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel
+from services import cancellation, metrics, scheduler
+from services.batches import create_batch, get_batch, question_batch_background_task
+from services.cancellation import CancellationToken, GenerationCancelled
+from services.llm import LLMProvider, StubProvider
+from services.question import generation_and_duels_background_task, get_question_status
+from services.scheduler import BULK, GenerationPipeline
+
+
+class BlockingProvider(LLMProvider):
+    """Provider whose calls on prompts containing `block_on` wait until released"""
+
+    name = "blocking"
+
+    def __init__(self, block_on: str = None):
+        super().__init__("test-model")
+        self.block_on = block_on
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.calls = 0
+
+    def complete(self, prompt):
+        self.calls += 1
+        if self.block_on and self.block_on in prompt:
+            self.started.set()
+            self.released.wait(5)
+        return StubProvider(seed=0).complete(prompt)
+
+
+@pytest.fixture
+def question_id(db_session: Session, templates) -> int:
+    question = Question(text="Why?")
+    db_session.add(question)
+    db_session.commit()
+    return question.id
+
+
+@pytest.fixture
+def generation(test_db):
+    """A one-worker pipeline and a blocking provider for generations against the test database"""
+    provider = BlockingProvider()
+    pipeline = GenerationPipeline(1)
+    with patch("services.question.engine", test_db), patch("services.batches.engine", test_db), \
+            patch("services.scheduler.pipeline", pipeline), patch("services.batches.pipeline", pipeline), \
+            patch("services.llm.provider_from_env", return_value=provider):
+        yield provider
+    provider.released.set()
+
+
+def _in_thread(fn, *args) -> threading.Thread:
+    thread = threading.Thread(target=fn, args=args)
+    thread.start()
+    return thread
+
+
+class TestCancellationToken:
+    def test_cancel_runs_callbacks_once(self):
+        token = CancellationToken()
+        calls = []
+        token.on_cancel(lambda: calls.append(1))
+        assert token.cancel("deleted")
+        assert not token.cancel("deadline")
+        token.on_cancel(lambda: calls.append(2))
+
+        assert calls == [1, 2]
+        assert token.reason == "deleted"
+        with pytest.raises(GenerationCancelled, match="deleted"):
+            token.check()
+
+    def test_deadline(self):
+        now = [0.0]
+        token = CancellationToken(deadline_seconds=10, clock=lambda: now[0])
+        assert token.remaining() == 10
+        assert not token.cancelled
+        now[0] = 10
+        assert token.cancelled
+        assert token.reason == cancellation.DEADLINE
+        assert CancellationToken().remaining() is None
+
+    def test_wait_wakes_on_cancel(self):
+        token = CancellationToken()
+        future = Future()
+        threading.Timer(0.05, token.cancel, ["deleted"]).start()
+        started = time.perf_counter()
+        with pytest.raises(GenerationCancelled):
+            cancellation.wait(future, token)
+        assert time.perf_counter() - started < 1
+        assert future.cancelled()
+
+    def test_wait_wakes_at_deadline(self):
+        with pytest.raises(GenerationCancelled, match="deadline"):
+            cancellation.wait(Future(), CancellationToken(deadline_seconds=0.05))
+
+    def test_wait_returns_result(self):
+        future = Future()
+        future.set_result(42)
+        assert cancellation.wait(future, CancellationToken()) == 42
+        assert cancellation.wait(future) == 42
+
+    def test_registry(self):
+        token = cancellation.register(7)
+        assert cancellation.cancel_question(7) == 1
+        assert token.reason == cancellation.DELETED
+        cancellation.unregister(7, token)
+        assert cancellation.cancel_question(7) == 0
+
+
+class TestPipelineCancellation:
+    def test_cancelled_calls_never_start(self):
+        metrics.reset()
+        pipeline = GenerationPipeline(1)
+        released = threading.Event()
+        blocker = pipeline.submit(released.wait, 5)
+        ran = []
+        queued = [pipeline.submit(ran.append, i) for i in range(3)]
+        for future in queued:
+            future.cancel()
+        after = pipeline.submit(ran.append, "after")
+        released.set()
+        after.result(5)
+
+        assert ran == ["after"]
+        assert blocker.result(5)
+        assert metrics.PIPELINE_CALLS_CANCELLED.value(priority=BULK) == 3
+
+    def test_cancelled_calls_leave_the_queue(self):
+        metrics.reset()
+        pipeline = GenerationPipeline(1)
+        started, released = threading.Event(), threading.Event()
+        blocker = pipeline.submit(lambda: started.set() or released.wait(5))
+        assert started.wait(5)
+        queued = [pipeline.submit(str, i) for i in range(3)]
+        # Behind another queued call, so it is not at the head of the queue
+        queued[1].cancel()
+
+        assert pipeline.queue_depths()[BULK] == 2
+        assert metrics.PIPELINE_QUEUE_DEPTH.value(priority=BULK) == 2
+        assert metrics.PIPELINE_CALLS_CANCELLED.value(priority=BULK) == 1
+        released.set()
+        assert [queued[0].result(5), queued[2].result(5)] == ["0", "2"]
+        assert blocker.result(5)
+
+
+class TestQuestionCancellation:
+    """Test that deleting a question or passing its deadline stops its generation"""
+
+    def test_delete_aborts_generation(self, client: TestClient, generation, question_id, count):
+        metrics.reset()
+        generation.block_on = "a: "
+        task = _in_thread(generation_and_duels_background_task, question_id)
+        assert generation.started.wait(5)
+
+        assert client.delete(f"/questions/{question_id}").status_code == 200
+        task.join(2)
+
+        # The task returned while the first call was still blocked, and the queued calls never ran
+        assert not task.is_alive()
+        assert generation.calls == 1
+        assert count(Generation) == 0
+        assert count(Duel) == 0
+        assert metrics.GENERATIONS_CANCELLED.value(reason="deleted") == 1
+        assert metrics.BACKGROUND_TASK_DURATION.count(task="generation_and_duels", outcome="cancelled") == 1
+
+    def test_delete_frees_running_call_worker(self, client: TestClient, generation, question_id):
+        generation.block_on = "a: "
+        task = _in_thread(generation_and_duels_background_task, question_id)
+        assert generation.started.wait(5)
+
+        assert client.delete(f"/questions/{question_id}").status_code == 200
+        task.join(2)
+
+        # The only worker runs other calls while the deleted question's call is still blocked
+        assert scheduler.pipeline.submit(str, 1).result(1) == "1"
+        assert not generation.released.is_set()
+
+    def test_deadline(self, generation, question_id, db_session: Session, count):
+        metrics.reset()
+        generation.block_on = "a: "
+        with patch.dict("os.environ", {"GENERATION_DEADLINE_SECONDS": "0.2"}):
+            started = time.perf_counter()
+            generation_and_duels_background_task(question_id)
+
+        assert time.perf_counter() - started < 2
+        assert count(Generation) == 0
+        assert metrics.GENERATIONS_CANCELLED.value(reason="deadline") == 1
+        # Reported as failed instead of generating forever
+        assert get_question_status(question_id, db_session).state == "failed"
+
+    def test_completes_without_cancellation(self, generation, question_id, count):
+        generation_and_duels_background_task(question_id)
+        assert count(Generation) == 3
+        assert count(Duel) == 3
+        assert cancellation.cancel_question(question_id) == 0
+
+    def test_delete_in_bulk_batch(self, client: TestClient, generation, templates, db_session: Session, count):
+        questions = [Question(text="First?"), Question(text="Second?")]
+        db_session.add_all(questions)
+        db_session.commit()
+        ids = [question.id for question in questions]
+        generation.block_on = "First?"
+        batch = create_batch(ids)
+        task = _in_thread(question_batch_background_task, batch.id)
+        assert generation.started.wait(5)
+
+        client.delete(f"/questions/{ids[1]}")
+        generation.released.set()
+        task.join(5)
+
+        batch = get_batch(batch.id)
+        assert batch.status == "completed"
+        assert batch.failed_question_ids == [ids[1]]
+        # The first question's three calls ran; the second's were dropped from the queue
+        assert generation.calls == 3
+        assert count(Generation) == 3
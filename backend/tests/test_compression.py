@@ -0,0 +1,149 @@
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from services import compression
+from services.compression import CompressionMiddleware, negotiate_encoding
+
+LONG_ANSWER = "The capital of France is Paris, which sits on the Seine. " * 60
+
+
+@pytest.fixture
+def small_app():
+    app = FastAPI()
+
+    @app.get("/large")
+    def large():
+        return {"output_text": LONG_ANSWER}
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse(LONG_ANSWER, headers={"ETag": '"abc"'})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((LONG_ANSWER.encode() for _ in range(3)), media_type="text/plain")
+
+    @app.get("/binary")
+    def binary():
+        return StreamingResponse(iter([b"\x00" * 4096]), media_type="application/octet-stream")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return TestClient(app)
+
+
+class TestNegotiation:
+    """Test Accept-Encoding negotiation"""
+
+    def test_prefers_server_order_on_ties(self):
+        assert negotiate_encoding("gzip, br", ["br", "gzip"]) == "br"
+
+    def test_honours_q_values(self):
+        assert negotiate_encoding("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+        assert negotiate_encoding("gzip;q=0", ["gzip"]) is None
+        assert negotiate_encoding("*", ["gzip"]) == "gzip"
+
+    def test_unsupported_or_missing(self):
+        assert negotiate_encoding("", ["gzip"]) is None
+        assert negotiate_encoding("identity", ["gzip"]) is None
+        assert negotiate_encoding("br", ["gzip"]) is None
+
+
+class TestCompressionMiddleware:
+    """Test response compression"""
+
+    def test_large_json_is_gzipped(self, small_app):
+        response = small_app.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) < len(LONG_ANSWER) / 5
+        assert response.json() == {"output_text": LONG_ANSWER}
+
+    def test_small_and_identity_not_compressed(self, small_app):
+        assert "content-encoding" not in small_app.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+        assert "content-encoding" not in small_app.get("/large", headers={"Accept-Encoding": "identity"}).headers
+
+    def test_etag_made_weak(self, small_app):
+        response = small_app.get("/text", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["etag"] == 'W/"abc"'
+
+    def test_streaming_response(self, small_app):
+        response = small_app.get("/stream", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.text == LONG_ANSWER * 3
+
+    def test_binary_not_compressed(self, small_app):
+        response = small_app.get("/binary", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+    def test_threshold_configurable(self):
+        app = FastAPI()
+        app.get("/small")(lambda: {"ok": True})
+        app.add_middleware(CompressionMiddleware, minimum_size=0, gzip_level=1)
+        response = TestClient(app).get("/small", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == {"ok": True}
+
+    def test_bodiless_responses_not_compressed(self):
+        app = FastAPI()
+        app.get("/not-modified")(lambda: Response(status_code=304, media_type="application/json", headers={"ETag": '"abc"'}))
+        app.get("/no-content")(lambda: Response(status_code=204, media_type="application/json"))
+        app.get("/empty")(lambda: Response(b"", media_type="application/json"))
+        app.head("/head")(lambda: Response(b"", media_type="application/json", headers={"Content-Length": "1234"}))
+        app.add_middleware(CompressionMiddleware, minimum_size=0)
+        client = TestClient(app)
+
+        for method, path in [("GET", "/not-modified"), ("GET", "/no-content"), ("GET", "/empty"), ("HEAD", "/head")]:
+            response = client.request(method, path, headers={"Accept-Encoding": "gzip"})
+            assert "content-encoding" not in response.headers, path
+            assert response.content == b""
+        assert client.get("/not-modified", headers={"Accept-Encoding": "gzip"}).headers["etag"] == '"abc"'
+
+    def test_brotli_preferred(self, small_app):
+        brotli = pytest.importorskip("brotli")
+        assert compression.brotli is brotli
+        response = small_app.get("/large", headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["content-encoding"] == "br"
+
+
+class TestCompressedEndpoints:
+    """Test compression and revalidation on the API"""
+
+    def test_results_compressed_and_revalidated(self, client: TestClient, test_db):
+        """Test that long answers are compressed and weak ETags still revalidate"""
+        with Session(test_db) as db:
+            template = Template(key="t", name="T", template_text="{{question}}")
+            question = Question(text="Capital of France?")
+            db.add(template)
+            db.add(question)
+            db.commit()
+            generation = Generation(template_id=template.id, question_id=question.id, output_text=LONG_ANSWER,
+                                    llm_model="gpt-4o-mini", latency=0.5, output_tokens=600, input_tokens=5)
+            db.add(generation)
+            db.commit()
+            question.selected_generation_id = generation.id
+            db.commit()
+            question_id = question.id
+
+        response = client.get(f"/questions/{question_id}/results", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["selected_generation"]["output_text"] == LONG_ANSWER
+
+        response = client.get(f"/questions/{question_id}", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"].startswith("W/")
+
+        response = client.get(
+            f"/questions/{question_id}",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]},
+        )
+        assert response.status_code == 304
@@ -0,0 +1,196 @@
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, select
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from services.deletion import (
+    create_template_deletion_job,
+    delete_question_cascade,
+    delete_template_cascade,
+    get_template_deletion_job,
+    template_deletion_background_task,
+)
+
+
+def _create_question_with_duels(db_session, templates, text="What is 2 + 2?", winner_index=0):
+    """Create a question with one generation per template and all pairwise duels decided"""
+    question = Question(text=text)
+    db_session.add(question)
+    db_session.commit()
+    db_session.refresh(question)
+
+    generations = []
+    for template in templates:
+        generation = Generation(
+            template_id=template.id,
+            question_id=question.id,
+            output_text=f"Answer from {template.key}",
+            llm_model="gpt-4o-mini",
+            latency=0.5,
+            output_tokens=10,
+            input_tokens=20
+        )
+        db_session.add(generation)
+        generations.append(generation)
+    db_session.commit()
+
+    for i, gen_a in enumerate(generations):
+        for gen_b in generations[i+1:]:
+            duel = Duel(question_id=question.id, winner_id=gen_a.id)
+            db_session.add(duel)
+            db_session.flush()
+            db_session.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
+            db_session.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
+
+    question.selected_generation_id = generations[winner_index].id
+    db_session.commit()
+    return question
+
+
+class TestDeletionService:
+    """Test set-based cascading deletes"""
+
+    def test_delete_template_cascade_in_chunks(self, db_session, templates):
+        """Test that template deletion removes generations and duels chunk by chunk"""
+        questions = [_create_question_with_duels(db_session, templates, text=f"Q{i}") for i in range(5)]
+
+        template_id = templates[0].id
+        progress = []
+        result = delete_template_cascade(
+            template_id, db_session, chunk_size=2,
+            progress=lambda deleted, total: progress.append((deleted, total))
+        )
+
+        assert result == {"generations": 5, "duels": 10}
+        assert progress == [(2, 5), (4, 5), (5, 5)]
+        assert db_session.get(Template, template_id) is None
+
+        # Only the duel between the two remaining templates survives per question
+        assert len(db_session.exec(select(Duel)).all()) == 5
+        assert len(db_session.exec(select(DuelGeneration)).all()) == 10
+        assert len(db_session.exec(select(Generation)).all()) == 10
+
+        # The selected generation belonged to the deleted template and was cleared
+        for question in questions:
+            db_session.refresh(question)
+            assert question.selected_generation_id is None
+
+    def test_delete_template_cascade_not_found(self, db_session):
+        """Test deleting a non-existent template"""
+        assert delete_template_cascade(999, db_session) is None
+
+    def test_delete_question_cascade(self, db_session, templates):
+        """Test that deleting a question removes its generations and duels but nothing else"""
+        question = _create_question_with_duels(db_session, templates, text="Delete me")
+        other = _create_question_with_duels(db_session, templates, text="Keep me")
+
+        result = delete_question_cascade(question.id, db_session)
+
+        assert result == {"generations": 3, "duels": 3}
+        assert db_session.get(Question, question.id) is None
+        remaining_generations = db_session.exec(select(Generation)).all()
+        assert {g.question_id for g in remaining_generations} == {other.id}
+        remaining_duels = db_session.exec(select(Duel)).all()
+        assert {d.question_id for d in remaining_duels} == {other.id}
+        assert len(db_session.exec(select(DuelGeneration)).all()) == 6
+
+    def test_delete_question_cascade_not_found(self, db_session):
+        """Test deleting a non-existent question"""
+        assert delete_question_cascade(999, db_session) is None
+
+    def test_finished_jobs_evicted(self, test_db):
+        with patch("services.deletion.engine", test_db), patch("services.deletion.MAX_FINISHED_JOBS", 1):
+            jobs = [create_template_deletion_job(999).id for _ in range(2)]
+            for job_id in jobs:
+                template_deletion_background_task(job_id, 999)
+            running = create_template_deletion_job(999).id
+
+        assert get_template_deletion_job(jobs[0]) is None
+        assert get_template_deletion_job(jobs[1]).status == "failed"
+        # Unfinished jobs are never evicted
+        with patch("services.deletion.FINISHED_RETENTION_SECONDS", 0):
+            create_template_deletion_job(999)
+        assert get_template_deletion_job(jobs[1]) is None
+        assert get_template_deletion_job(running).status == "pending"
+
+    def test_database_level_cascade(self, tmp_path, templates):
+        """Test that the schema cascades deletes when SQLite foreign keys are enabled"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'cascade.db'}")
+
+        @event.listens_for(engine, "connect")
+        def enable_foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            local_templates = [Template(key=t.key, name=t.name, template_text=t.template_text) for t in templates]
+            for template in local_templates:
+                db.add(template)
+            db.commit()
+            question = _create_question_with_duels(db, local_templates)
+
+            db.delete(question)
+            db.commit()
+
+            assert db.exec(select(Generation)).all() == []
+            assert db.exec(select(Duel)).all() == []
+            assert db.exec(select(DuelGeneration)).all() == []
+        engine.dispose()
+
+
+class TestDeletionEndpoints:
+    """Test deletion endpoints built on the cascade service"""
+
+    def test_delete_question_removes_generations(self, client: TestClient, test_db):
+        """Test that DELETE /questions/{id} no longer leaves orphan generations and duels"""
+        with Session(test_db) as db:
+            template = Template(key="t", name="T", template_text="{{question}}")
+            other = Template(key="o", name="O", template_text="{{question}}")
+            db.add(template)
+            db.add(other)
+            db.commit()
+            question_id = _create_question_with_duels(db, [template, other]).id
+
+        response = client.delete(f"/questions/{question_id}")
+        assert response.status_code == 200
+
+        with Session(test_db) as db:
+            assert db.exec(select(Generation)).all() == []
+            assert db.exec(select(Duel)).all() == []
+            assert db.exec(select(DuelGeneration)).all() == []
+
+    def test_delete_template_in_background(self, client: TestClient, test_db):
+        """Test the background deletion job and its progress endpoint"""
+        with Session(test_db) as db:
+            template = Template(key="t", name="T", template_text="{{question}}")
+            other = Template(key="o", name="O", template_text="{{question}}")
+            db.add(template)
+            db.add(other)
+            db.commit()
+            template_id = template.id
+            _create_question_with_duels(db, [template, other])
+
+        with patch('services.deletion.engine', test_db):
+            response = client.delete(f"/templates/{template_id}?background=true")
+        assert response.status_code == 202
+        job = response.json()
+        assert job["template_id"] == template_id
+
+        # TestClient runs background tasks before returning the response
+        response = client.get(f"/templates/deletions/{job['id']}")
+        assert response.status_code == 200
+        job = response.json()
+        assert job["status"] == "completed"
+        assert job["deleted_generations"] == 1
+        assert job["total_generations"] == 1
+
+        assert client.get(f"/templates/{template_id}").status_code == 404
+
+    def test_get_deletion_job_not_found(self, client: TestClient):
+        """Test polling an unknown deletion job"""
+        response = client.get("/templates/deletions/unknown")
+        assert response.status_code == 404
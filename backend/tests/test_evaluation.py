@@ -0,0 +1,199 @@
+import json
+import pytest
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel
+from services import llm
+from services.evaluation import EvaluationRun, load_questions, load_templates
+from services.llm import CompletionCache, StubProvider, generate_output
+from services.ratelimit import RateLimiter, per_minute
+
+
+class CountingProvider(StubProvider):
+    """Stub provider counting calls and failing on prompts containing one of `fail_on`"""
+
+    def __init__(self, fail_on=()):
+        super().__init__(seed=0)
+        self.calls = 0
+        self.fail_on = fail_on
+
+    def complete(self, prompt):
+        self.calls += 1
+        if any(text in prompt for text in self.fail_on):
+            raise RuntimeError("provider error")
+        return super().complete(prompt)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def templates(templates, test_db):
+    """The shared templates as an evaluation run loads them"""
+    return load_templates(test_db)
+
+
+@pytest.fixture
+def questions_file(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    lines = [json.dumps({"id": f"q{i}", "text": f"Question {i}?"}) for i in range(10)]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def no_shared_limits():
+    """Tests configure the shared limiter and cache themselves"""
+    limiter, cache = llm.rate_limiter, llm.completion_cache
+    llm.configure_rate_limiter(None)
+    llm.configure_cache(None)
+    yield
+    llm.configure_rate_limiter(limiter)
+    llm.configure_cache(cache)
+
+
+def _lines(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class TestRateLimiter:
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+        waits = [limiter.acquire() for _ in range(5)]
+        assert waits[:3] == [0, 0, 0]
+        assert waits[3:] == [0.5, 0.5]
+
+    def test_refills(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1, burst=1, clock=clock, sleep=clock.sleep)
+        limiter.acquire()
+        clock.now += 10
+        assert limiter.acquire() == 0
+
+    def test_per_minute(self):
+        assert per_minute(None) is None
+        assert per_minute("0") is None
+        assert per_minute("120").rate == 2
+
+
+class TestSharedLimits:
+    """Test that generate_output goes through the shared limiter and cache"""
+
+    def test_cache_across_runs(self, tmp_path):
+        template = Template(key="a", name="A", template_text="{{question}}")
+        provider = CountingProvider()
+        path = str(tmp_path / "cache.db")
+
+        llm.configure_cache(CompletionCache(path))
+        first = generate_output(template, Question(text="Why?"), provider=provider)
+        llm.completion_cache.close()
+        llm.configure_cache(CompletionCache(path))
+        second = generate_output(template, Question(text="Why?"), provider=provider)
+
+        assert second == first
+        assert provider.calls == 1
+        generate_output(template, Question(text="How?"), provider=provider)
+        assert provider.calls == 2
+
+    def test_rate_limiter(self):
+        acquired = []
+
+        class Limiter:
+            def acquire(self):
+                acquired.append(1)
+                return 0.0
+
+        llm.configure_rate_limiter(Limiter())
+        generate_output(Template(key="a", name="A", template_text="{{question}}"), Question(text="Why?"),
+                        provider=StubProvider())
+        assert acquired == [1]
+
+
+class TestEvaluationRun:
+    def test_results_file(self, tmp_path, templates, questions_file):
+        output = str(tmp_path / "results.jsonl")
+        run = EvaluationRun(load_questions(questions_file), templates, output + ".checkpoint", output_path=output,
+                            concurrency=8, provider=StubProvider())
+        summary = run.run()
+
+        assert summary["completed"] == 10
+        results = _lines(output)
+        assert [r["key"] for r in results] == [f"q{i}" for i in range(10)]
+        assert [g["template"] for g in results[0]["generations"]] == ["a", "b", "c"]
+        assert results[0]["generations"][0]["output_text"]
+        assert results[0]["question_id"] is None
+
+    def test_write_db(self, tmp_path, test_db, templates, questions_file, count):
+        run = EvaluationRun(load_questions(questions_file), templates, str(tmp_path / "run.checkpoint"),
+                            engine=test_db, provider=StubProvider())
+        assert run.run()["completed"] == 10
+
+        assert count(Question) == 10
+        assert count(Generation) == 30
+        assert count(Duel) == 30
+        assert all(line["question_id"] for line in _lines(str(tmp_path / "run.checkpoint")))
+
+    def test_resume(self, tmp_path, templates, questions_file):
+        output = str(tmp_path / "results.jsonl")
+        checkpoint = output + ".checkpoint"
+        questions = load_questions(questions_file)
+
+        failing = CountingProvider(fail_on=("Question 3?", "Question 7?"))
+        summary = EvaluationRun(questions, templates, checkpoint, output_path=output, provider=failing).run()
+        assert (summary["completed"], summary["failed"]) == (8, 2)
+        # A result line written just before an interruption, without its checkpoint line
+        with open(output, "a") as file:
+            file.write(json.dumps({"key": "q3", "generations": []}) + "\n")
+
+        healthy = CountingProvider()
+        summary = EvaluationRun(questions, templates, checkpoint, output_path=output, provider=healthy).run(resume=True)
+        assert (summary["completed"], summary["resumed"]) == (2, 8)
+        assert healthy.calls == 2 * len(templates)
+        keys = [r["key"] for r in _lines(output)]
+        assert sorted(keys) == sorted(f"q{i}" for i in range(10))
+
+    def test_fresh_run_discards_checkpoint(self, tmp_path, templates, questions_file):
+        output = str(tmp_path / "results.jsonl")
+        questions = load_questions(questions_file)
+        EvaluationRun(questions, templates, output + ".checkpoint", output_path=output, provider=StubProvider()).run()
+        summary = EvaluationRun(questions, templates, output + ".checkpoint", output_path=output,
+                                provider=StubProvider()).run()
+        assert summary["completed"] == 10
+        assert len(_lines(output)) == 10
+
+    def test_nothing_to_write(self, templates):
+        with pytest.raises(ValueError):
+            EvaluationRun([], templates, "run.checkpoint")
+
+
+class TestLoading:
+    def test_load_questions(self, tmp_path):
+        path = tmp_path / "questions.jsonl"
+        path.write_text('"Plain?"\n\n{"text": "Object?"}\n{"id": 7, "text": "With id?"}\n')
+        assert load_questions(str(path)) == [("1", "Plain?"), ("3", "Object?"), ("7", "With id?")]
+
+        path.write_text('{"question": "Wrong field?"}\n')
+        with pytest.raises(ValueError, match=":1:"):
+            load_questions(str(path))
+
+        path.write_text('{"id": 1, "text": "A?"}\n{"id": 1, "text": "B?"}\n')
+        with pytest.raises(ValueError, match="unique"):
+            load_questions(str(path))
+
+    def test_load_templates(self, test_db, templates):
+        assert [t.key for t in load_templates(test_db, ["c", "a"])] == ["a", "c"]
+        with pytest.raises(ValueError, match="Unknown templates"):
+            load_templates(test_db, ["a", "missing"])
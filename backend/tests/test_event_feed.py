@@ -0,0 +1,204 @@
+import asyncio
+import json
+import socket
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from services import events
+from services import question as question_service
+from services.events import EventHub, RelayBroker, run_relay
+
+
+def _receive(websocket, count: int):
+    return [json.loads(websocket.receive_text()) for _ in range(count)]
+
+
+@pytest.fixture
+def undecided_duel(test_db):
+    """A question with two generations and one undecided duel"""
+    with Session(test_db) as db:
+        templates = [Template(key=key, name=key.upper(), template_text="{{question}}") for key in ("a", "b")]
+        question = Question(text="Capital of France?")
+        for template in templates:
+            db.add(template)
+        db.add(question)
+        db.commit()
+        generations = [
+            Generation(template_id=template.id, question_id=question.id, output_text=f"Answer {template.key}",
+                       llm_model="gpt-4o-mini", latency=0.5, output_tokens=2, input_tokens=5)
+            for template in templates
+        ]
+        for generation in generations:
+            db.add(generation)
+        db.commit()
+        duel = Duel(question_id=question.id)
+        db.add(duel)
+        db.flush()
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=generations[0].id, role="generation_a"))
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=generations[1].id, role="generation_b"))
+        db.commit()
+        return {"question_id": question.id, "duel_id": duel.id, "winner_id": generations[0].id,
+                "template_ids": [template.id for template in templates]}
+
+
+class TestEventFeed:
+    """Test the WebSocket event feed"""
+
+    def test_decision_events(self, client: TestClient, undecided_duel):
+        """Test the events published when the last duel of a question is decided"""
+        question_id = undecided_duel["question_id"]
+        with client.websocket_connect("/events/ws") as websocket:
+            client.post(f"/questions/{question_id}/duels/{undecided_duel['duel_id']}/decide",
+                        json={"winner_id": undecided_duel["winner_id"]})
+            received = _receive(websocket, 4)
+
+        assert [event["type"] for event in received] == [
+            events.DUEL_DECIDED, events.WINNER_SELECTED,
+            events.TEMPLATE_RATING_CHANGED, events.TEMPLATE_RATING_CHANGED,
+        ]
+        assert all(event["question_id"] == question_id for event in received)
+        assert received[0]["winner_id"] == undecided_duel["winner_id"]
+        assert received[1]["generation_id"] == undecided_duel["winner_id"]
+        ratings = {event["template_id"]: event["win_rate"] for event in received[2:]}
+        assert ratings == {undecided_duel["template_ids"][0]: 100.0, undecided_duel["template_ids"][1]: 0.0}
+
+    def test_ratings_skipped_without_subscribers(self, client: TestClient, undecided_duel):
+        """Test that deciding a question does not compute template ratings nobody listens to"""
+        question_id = undecided_duel["question_id"]
+        with patch("services.performance.get_template_performance_stats") as stats:
+            client.post(f"/questions/{question_id}/duels/{undecided_duel['duel_id']}/decide",
+                        json={"winner_id": undecided_duel["winner_id"]})
+            question_service._ratings_executor.submit(lambda: None).result(5)
+        stats.assert_not_called()
+
+    def test_question_filter(self, client: TestClient):
+        """Test that a subscriber to one question only gets that question's events"""
+        with client.websocket_connect("/events/ws?question_id=2") as websocket:
+            events.publish(events.DUEL_DECIDED, 1, duel_id=1)
+            events.publish(events.DUEL_DECIDED, 2, duel_id=2)
+            assert _receive(websocket, 1)[0]["duel_id"] == 2
+
+    def test_background_task_events(self, client: TestClient, test_db):
+        """Test generation and duel creation events from the background task"""
+        from services.question import generation_and_duels_background_task
+
+        with Session(test_db) as db:
+            for key in ("a", "b", "c"):
+                db.add(Template(key=key, name=key, template_text="{{question}}"))
+            question = Question(text="Capital of France?")
+            db.add(question)
+            db.commit()
+            question_id = question.id
+            template_ids = list(db.exec(select(Template.id)).all())
+
+        def fake_outputs(templates, question):
+            return [
+                Generation(template_id=template.id, question_id=question.id, output_text="Paris",
+                           llm_model="gpt-4o-mini", latency=0.1, output_tokens=1, input_tokens=1)
+                for template in templates
+            ]
+
+        with client.websocket_connect(f"/events/ws?question_id={question_id}") as websocket:
+            with patch("services.question.engine", test_db), patch("services.llm.generate_outputs", fake_outputs):
+                generation_and_duels_background_task(question_id)
+            received = _receive(websocket, 4)
+
+        assert [event["type"] for event in received] == [events.GENERATION_FINISHED] * 3 + [events.DUELS_READY]
+        assert sorted(event["template_id"] for event in received[:3]) == sorted(template_ids)
+        assert received[3]["duels"] == 3
+
+
+class TestEventHub:
+    """Test fan-out and slow consumer handling"""
+
+    def test_slow_consumer_dropped(self):
+        """Test that a full queue drops the subscriber without affecting others"""
+        async def scenario():
+            hub = EventHub(max_queue=2)
+            slow = hub.subscribe()
+            fast = hub.subscribe()
+            received = []
+            for i in range(3):
+                hub.deliver({"type": "test", "n": i})
+                await asyncio.sleep(0)
+                received.append(json.loads(await fast.get())["n"])
+            hub.unsubscribe(slow)
+            return hub, slow, received
+
+        hub, slow, received = asyncio.run(scenario())
+        assert received == [0, 1, 2]
+        assert slow.dropped.is_set()
+        assert hub.dropped == 1
+        assert hub.subscribers == 1
+
+    def test_no_subscribers_skips_serialization(self):
+        hub = EventHub()
+        with patch("services.events.dumps") as dumps:
+            hub.deliver({"type": "test"})
+        dumps.assert_not_called()
+
+
+class TestRelayBroker:
+    """Test fan-out across workers through the relay"""
+
+    def test_events_reach_other_workers(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        async def scenario():
+            relay = asyncio.ensure_future(run_relay("127.0.0.1", port))
+            worker_a, worker_b = EventHub(), EventHub()
+            broker_a = RelayBroker(worker_a, "127.0.0.1", port, reconnect_seconds=0.05)
+            broker_b = RelayBroker(worker_b, "127.0.0.1", port, reconnect_seconds=0.05)
+            subscription_a, subscription_b = worker_a.subscribe(), worker_b.subscribe()
+            broker_a.start()
+            broker_b.start()
+            try:
+                for _ in range(100):
+                    if broker_a._socket is not None and broker_b._socket is not None:
+                        break
+                    await asyncio.sleep(0.02)
+                broker_a.publish({"type": "test", "question_id": 1})
+                received = await asyncio.wait_for(
+                    asyncio.gather(subscription_a.get(), subscription_b.get()), timeout=5
+                )
+            finally:
+                await asyncio.to_thread(broker_a.stop)
+                await asyncio.to_thread(broker_b.stop)
+                relay.cancel()
+            return [json.loads(text) for text in received]
+
+        assert asyncio.run(scenario()) == [{"type": "test", "question_id": 1}] * 2
+
+    def test_falls_back_to_local_delivery(self):
+        """Test that events still reach this worker's subscribers while the relay is down"""
+        async def scenario():
+            hub = EventHub()
+            subscription = hub.subscribe()
+            broker = RelayBroker(hub, "127.0.0.1", 1)
+            broker.start()
+            try:
+                broker.publish({"type": "test"})
+                return await asyncio.wait_for(subscription.get(), timeout=1)
+            finally:
+                await asyncio.to_thread(broker.stop)
+
+        assert json.loads(asyncio.run(scenario())) == {"type": "test"}
+
+    def test_publish_does_not_block_on_the_relay(self):
+        """Test that publish only queues, delivering locally once the outbox is full"""
+        async def scenario():
+            hub = EventHub()
+            subscription = hub.subscribe()
+            broker = RelayBroker(hub, "127.0.0.1", 1, max_outbox=1)
+            broker.publish({"type": "queued"})
+            broker.publish({"type": "overflow"})
+            return await asyncio.wait_for(subscription.get(), timeout=1)
+
+        assert json.loads(asyncio.run(scenario())) == {"type": "overflow"}
@@ -0,0 +1,145 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from services.blobs import externalize_output
+from services.performance import GENERATION_PERFORMANCE_SUMMARY_FIELDS
+
+
+@pytest.fixture
+def decided_question(test_db):
+    """A question with a blob-backed winner and an inline legacy loser"""
+    with Session(test_db) as db:
+        template = Template(key="t", name="T", template_text="{{question}}")
+        question = Question(text="Capital of France?")
+        db.add(template)
+        db.add(question)
+        db.commit()
+        winner = externalize_output(Generation(
+            template_id=template.id, question_id=question.id, output_text="Paris " * 50,
+            llm_model="gpt-4o-mini", latency=0.5, output_tokens=100, input_tokens=20
+        ), db)
+        loser = Generation(
+            template_id=template.id, question_id=question.id, output_text="Lyon",
+            llm_model="gpt-4o-mini", latency=0.6, output_tokens=2, input_tokens=20
+        )
+        db.add(winner)
+        db.add(loser)
+        db.commit()
+        duel = Duel(question_id=question.id, winner_id=winner.id)
+        db.add(duel)
+        db.flush()
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=winner.id, role="generation_a"))
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=loser.id, role="generation_b"))
+        question.selected_generation_id = winner.id
+        db.commit()
+        return question.id
+
+
+@pytest.fixture
+def statements(test_db):
+    """Capture SQL statements executed against the test database"""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    event.listen(test_db, "before_cursor_execute", capture)
+    yield captured
+    event.remove(test_db, "before_cursor_execute", capture)
+
+
+class TestFieldProjection:
+    """Test sparse fieldsets and deferred loading of output text"""
+
+    def test_question_list_summary_has_no_output_text(self, client: TestClient, decided_question, statements):
+        """Test that the default details summary neither returns nor reads output_text"""
+        response = client.get("/questions/?details=true")
+        assert response.status_code == 200
+        generation = response.json()[0]["selected_generation"]
+        assert "output_text" not in generation
+        assert generation["output_length"] == 300
+        assert generation["llm_model"] == "gpt-4o-mini"
+
+        assert not any("output_text" in statement for statement in statements)
+        assert not any("outputblob" in statement for statement in statements)
+
+    def test_question_list_with_fields(self, client: TestClient, decided_question):
+        """Test requesting specific selected generation fields"""
+        response = client.get("/questions/?details=true&fields=id,output_text")
+        assert response.status_code == 200
+        question = response.json()[0]
+        assert question["text"] == "Capital of France?"
+        assert question["selected_generation"] == {
+            "id": question["selected_generation_id"],
+            "output_text": "Paris " * 50,
+        }
+
+    def test_question_list_unknown_field(self, client: TestClient):
+        """Test that unknown fields are rejected"""
+        response = client.get("/questions/?details=true&fields=id,password")
+        assert response.status_code == 400
+        assert "password" in response.json()["detail"]
+
+    def test_results_fields(self, client: TestClient, decided_question, statements):
+        """Test projecting generation performance entries without output text"""
+        response = client.get(f"/questions/{decided_question}/results?fields=generation_id,win_rate")
+        assert response.status_code == 200
+        performance = response.json()["generation_performance"]
+        assert [set(entry) for entry in performance] == [{"generation_id", "win_rate"}] * 2
+        assert [entry["win_rate"] for entry in performance] == [100.0, 0.0]
+
+        stats_queries = [s for s in statements if "count(distinct(duel.id))" in s.lower()]
+        assert stats_queries and "output_text" not in stats_queries[0]
+
+    def test_results_default_leaves_out_output_text(self, client: TestClient, decided_question, statements):
+        """Test that default results carry every key but output text, which is not read"""
+        response = client.get(f"/questions/{decided_question}/results")
+        performance = response.json()["generation_performance"]
+        assert [set(entry) for entry in performance] == [set(GENERATION_PERFORMANCE_SUMMARY_FIELDS)] * 2
+        assert response.json()["selected_generation"]["output_text"] == "Paris " * 50
+
+        stats_queries = [s for s in statements if "count(distinct(duel.id))" in s.lower()]
+        assert stats_queries and "output_text" not in stats_queries[0]
+
+    def test_results_output_text_on_request(self, client: TestClient, decided_question):
+        """Test that output text is returned when asked for"""
+        response = client.get(f"/questions/{decided_question}/results?fields=generation_id,output_text")
+        performance = response.json()["generation_performance"]
+        assert {entry["output_text"] for entry in performance} == {"Paris " * 50, "Lyon"}
+
+    def test_next_duel_loads_text_for_returned_duel_only(self, client: TestClient, test_db):
+        """Test that get_next_duel defers output text and hydrates the chosen duel"""
+        with Session(test_db) as db:
+            template = Template(key="t", name="T", template_text="{{question}}")
+            question = Question(text="Capital of Italy?")
+            db.add(template)
+            db.add(question)
+            db.commit()
+            generations = [
+                Generation(
+                    template_id=template.id, question_id=question.id, output_text=f"Answer {i}",
+                    llm_model="gpt-4o-mini", latency=0.5, output_tokens=10, input_tokens=20
+                )
+                for i in range(2)
+            ]
+            for generation in generations:
+                db.add(generation)
+            db.commit()
+            duel = Duel(question_id=question.id)
+            db.add(duel)
+            db.flush()
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=generations[0].id, role="generation_a"))
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=generations[1].id, role="generation_b"))
+            db.commit()
+            question_id = question.id
+
+        response = client.get(f"/questions/{question_id}/duels/next")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["generation_a"]["output_text"] == "Answer 0"
+        assert data["generation_b"]["output_text"] == "Answer 1"
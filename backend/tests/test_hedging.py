@@ -0,0 +1,224 @@
+import itertools
+import threading
+import time
+import pytest
+from models.template import Template
+from models.questions import Question
+from services import cancellation, llm, metrics
+from services.scheduler import INTERACTIVE, GenerationPipeline
+from services.cancellation import CancellationToken, GenerationCancelled
+from services.hedging import HEDGE_LOST, HedgePolicy, from_env
+from services.llm import StubProvider, generate_output
+
+KEY = ("direct", "gpt-4o-mini")
+
+
+@pytest.fixture(autouse=True)
+def no_shared_hedging():
+    policy = llm.hedge_policy
+    llm.configure_hedging(None)
+    metrics.reset()
+    yield
+    llm.configure_hedging(policy)
+
+
+def _policy(budget: float = 1.0, latency: float = 0.02, max_credit: float = 10) -> HedgePolicy:
+    """A policy that hedges calls slower than `latency`"""
+    policy = HedgePolicy(percentile=50, budget=budget, min_samples=1, max_credit=max_credit)
+    policy.record(KEY, latency)
+    return policy
+
+
+class SlowFirst:
+    """Call whose first attempt hangs until its cancellation token fires, recording that token"""
+
+    def __init__(self, first="primary", then="hedge"):
+        self.calls = itertools.count()
+        self.tokens = []
+        self.first, self.then = first, then
+
+    def __call__(self):
+        if next(self.calls) == 0:
+            token = cancellation.current()
+            self.tokens.append(token)
+            cancelled = threading.Event()
+            token.on_cancel(cancelled.set)
+            cancelled.wait(5)
+            return self.first
+        return self.then
+
+
+def _hedges(outcome: str) -> float:
+    return metrics.LLM_HEDGES.value(template=KEY[0], model=KEY[1], outcome=outcome)
+
+
+class TestHedgePolicy:
+    def test_delay_is_recent_percentile(self):
+        policy = HedgePolicy(percentile=95, min_samples=20, window=100)
+        for i in range(19):
+            policy.record(KEY, i)
+        assert policy.delay(KEY) is None
+        for i in range(19, 200):
+            policy.record(KEY, i / 100 if i >= 100 else i)
+        # Only the last 100 samples count: 1.00 .. 1.99
+        assert policy.delay(KEY) == pytest.approx(1.94)
+        assert policy.delay(("other", "gpt-4o-mini")) is None
+
+    def test_fast_call_is_not_hedged(self):
+        calls = []
+        result = _policy(latency=1.0).run(KEY, lambda: calls.append(1) or "ok")
+        assert result == "ok"
+        assert len(calls) == 1
+        assert _hedges("hedge_won") == _hedges("primary_won") == 0
+
+    def test_hedge_wins_and_cancels_primary(self):
+        call = SlowFirst()
+        assert _policy().run(KEY, call) == "hedge"
+        assert call.tokens[0].reason == HEDGE_LOST
+        assert _hedges("hedge_won") == 1
+
+    def test_primary_wins(self):
+        primary_done = threading.Event()
+
+        def call(calls=itertools.count()):
+            if next(calls) == 0:
+                time.sleep(0.05)
+                primary_done.set()
+                return "primary"
+            primary_done.wait(5)
+            time.sleep(0.05)
+            return "hedge"
+
+        assert _policy().run(KEY, call) == "primary"
+        assert _hedges("primary_won") == 1
+
+    def test_hedge_win_records_caller_latency(self):
+        policy = _policy(latency=0.05)
+        recorded = []
+        policy.record = lambda key, seconds: recorded.append(seconds)
+        assert policy.run(KEY, SlowFirst()) == "hedge"
+        # The caller waited for the hedge delay too, not only for the hedge itself
+        assert recorded[0] >= 0.05
+
+    def test_before_hedge(self):
+        acquired = []
+        _policy().run(KEY, SlowFirst(), before_hedge=lambda: acquired.append(1))
+        assert acquired == [1]
+
+    def test_over_budget(self):
+        policy = _policy(budget=0)
+        call = SlowFirst()
+        threading.Timer(0.1, lambda: call.tokens[0].cancel("test")).start()
+        with pytest.raises(GenerationCancelled):
+            policy.run(KEY, call)
+        assert next(call.calls) == 1
+        assert _hedges("over_budget") == 1
+
+    def test_budget_caps_extra_calls(self):
+        policy = _policy(budget=0.25, max_credit=1)
+        # Keep the hedge delay fixed while the slow calls are recorded
+        policy.record = lambda key, seconds: None
+        sent = []
+
+        def slow():
+            sent.append(1)
+            time.sleep(0.04)
+            return "ok"
+
+        for _ in range(8):
+            policy.run(KEY, slow)
+        assert len(sent) - 8 == 2
+
+    def test_both_fail(self):
+        def call(calls=itertools.count()):
+            time.sleep(0.05)
+            raise RuntimeError(f"attempt {next(calls)}")
+
+        with pytest.raises(RuntimeError):
+            _policy().run(KEY, call)
+        assert _hedges("failed") == 1
+
+    def test_parent_cancellation(self):
+        token = CancellationToken()
+        threading.Timer(0.1, token.cancel, ["deleted"]).start()
+        started = time.perf_counter()
+        with cancellation.active(token), pytest.raises(GenerationCancelled, match="deleted"):
+            _policy(budget=0).run(KEY, SlowFirst())
+        assert time.perf_counter() - started < 2
+
+    def test_from_env(self):
+        assert from_env(None) is None
+        assert from_env("0") is None
+        policy = from_env("99", "0.1", "50")
+        assert (policy.percentile, policy.budget, policy.min_samples) == (99, 0.1, 50)
+
+
+class TestGenerateOutputHedging:
+    def test_slow_completion_is_hedged(self):
+        template = Template(key="direct", name="Direct", template_text="{{question}}")
+        provider = StubProvider()
+        expected = provider.complete("Why?")
+        slow = SlowFirst(first={"output_text": "slow", "output_tokens": 1, "input_tokens": 1}, then=expected)
+        provider.complete = lambda prompt: slow()
+        policy = _policy()
+        policy.record(("direct", provider.model), 0.02)
+        llm.configure_hedging(policy)
+
+        output = generate_output(template, Question(text="Why?"), provider=provider)
+        assert output["output_text"] == expected["output_text"]
+        assert metrics.LLM_HEDGES.value(template="direct", model=provider.model, outcome="hedge_won") == 1
+
+    def _hedged(self, provider: StubProvider):
+        template = Template(key="direct", name="Direct", template_text="{{question}}")
+        policy = _policy()
+        policy.record(("direct", provider.model), 0.02)
+        llm.configure_hedging(policy)
+        return template
+
+    def test_hedges_wait_for_a_worker(self):
+        provider = StubProvider()
+        complete, running, peak = provider.complete, [0], [0]
+
+        def slow(prompt, calls=itertools.count()):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            time.sleep(0.2 if next(calls) == 0 else 0)
+            running[0] -= 1
+            return complete(prompt)
+
+        provider.complete = slow
+        template = self._hedged(provider)
+        pipeline = GenerationPipeline(1)
+        future = pipeline.submit(generate_output, template, Question(text="Why?"), None, provider,
+                                 priority=INTERACTIVE)
+
+        assert future.result(5)["output_text"]
+        # The only worker was busy with the primary, so the queued hedge was dropped when it won
+        assert peak[0] == 1
+        assert metrics.LLM_HEDGES.value(template="direct", model=provider.model, outcome="primary_won") == 1
+        assert metrics.PIPELINE_CALLS_CANCELLED.value(priority=INTERACTIVE) == 1
+
+    def test_losing_primary_keeps_its_worker(self):
+        provider = StubProvider()
+        complete, released = provider.complete, threading.Event()
+
+        def uninterruptible_first(prompt, calls=itertools.count()):
+            if next(calls) == 0:
+                released.wait(5)
+            return complete(prompt)
+
+        provider.complete = uninterruptible_first
+        template = self._hedged(provider)
+        pipeline = GenerationPipeline(2)
+        future = pipeline.submit(generate_output, template, Question(text="Why?"), None, provider,
+                                 priority=INTERACTIVE)
+
+        assert future.result(5)["output_text"]
+        assert metrics.LLM_HEDGES.value(template="direct", model=provider.model, outcome="hedge_won") == 1
+        # The caller has the hedge's result while the primary still holds a worker
+        assert metrics.PIPELINE_CALLS_IN_FLIGHT.value(priority=INTERACTIVE) == 1
+        released.set()
+        deadline = time.monotonic() + 5
+        while metrics.PIPELINE_CALLS_IN_FLIGHT.value(priority=INTERACTIVE) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert metrics.PIPELINE_CALLS_IN_FLIGHT.value(priority=INTERACTIVE) == 0
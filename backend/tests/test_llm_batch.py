@@ -0,0 +1,239 @@
+import json
+import time
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+from sqlalchemy import event
+from sqlmodel import Session, select
+from models.questions import BatchApiJob, Question
+from models.generation import Generation
+from models.duel import Duel
+from services import llm
+from services.batches import _store_in_chunks, resume_batch_api_jobs
+from services.evaluation import EvaluationRun, load_templates
+from services.llm import CompletionCache, OpenAIProvider, StubProvider, generate_outputs_batch, run_chat_batch
+from services.llm_stub import StubConfig, create_app
+
+
+def _no_sleep(seconds):
+    pass
+
+
+def _stub(config: StubConfig = None):
+    """An OpenAI provider whose requests are served in-process by the stub, and the stub's stats"""
+    app = create_app(config or StubConfig())
+    client = OpenAI(api_key="test-key", base_url="http://stub/v1", max_retries=0,
+                    http_client=TestClient(app, base_url="http://stub"))
+    return OpenAIProvider(client, model="gpt-4o-mini"), app.state.stats
+
+
+def _finished_batch(client: TestClient, batch_id: str) -> dict:
+    """A question batch once its Batch API job has been awaited and its outputs stored"""
+    deadline = time.monotonic() + 5
+    while True:
+        batch = client.get(f"/questions/batches/{batch_id}").json()
+        if batch["status"] in ("completed", "failed") or time.monotonic() > deadline:
+            return batch
+        time.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def no_shared_cache():
+    cache = llm.completion_cache
+    llm.configure_cache(None)
+    yield
+    llm.configure_cache(cache)
+
+
+class TestRunChatBatch:
+    def test_completes(self):
+        provider, stats = _stub()
+        completions, errors = run_chat_batch(provider.client, "gpt-4o-mini", {"x": "Why?", "y": "How?"},
+                                             sleep=_no_sleep)
+
+        assert errors == {}
+        assert set(completions) == {"x", "y"}
+        assert completions["x"]["output_text"]
+        assert completions["x"]["output_tokens"] > 0
+        assert (stats["batches"], stats["batches_completed"]) == (1, 1)
+        assert stats["requests"] == 0
+
+    def test_error_file(self):
+        provider, _ = _stub(StubConfig(server_error_rate=1.0))
+        completions, errors = run_chat_batch(provider.client, "gpt-4o-mini", {"x": "Why?"}, sleep=_no_sleep)
+
+        assert completions == {}
+        assert "server had an error" in errors["x"]
+
+    def test_timeout_cancels(self):
+        provider, _ = _stub(StubConfig(batch_seconds=3600))
+        with patch.object(provider.client.batches, "cancel", wraps=provider.client.batches.cancel) as cancel:
+            with pytest.raises(TimeoutError):
+                run_chat_batch(provider.client, "gpt-4o-mini", {"x": "Why?"}, timeout=0, sleep=_no_sleep)
+
+        assert provider.client.batches.retrieve(cancel.call_args.args[0]).status == "cancelled"
+
+    def test_polls_until_done(self):
+        config = StubConfig(batch_seconds=3600)
+        provider, _ = _stub(config)
+        polls = []
+
+        def sleep(seconds):
+            polls.append(seconds)
+            if len(polls) == 2:
+                config.batch_seconds = 0
+
+        completions, _ = run_chat_batch(provider.client, "gpt-4o-mini", {"x": "Why?"}, poll_seconds=5, sleep=sleep)
+        assert polls == [5, 5]
+        assert "x" in completions
+
+
+class TestGenerateOutputsBatch:
+    def test_outputs_in_template_order(self, templates):
+        provider, stats = _stub()
+        questions = {"1": Question(text="Why?"), "2": Question(text="How?")}
+        outputs, failed = generate_outputs_batch(templates, questions, provider=provider, sleep=_no_sleep)
+
+        assert failed == {}
+        assert set(outputs) == {"1", "2"}
+        assert len(outputs["1"]) == 3
+        assert outputs["1"][0]["llm_model"] == "gpt-4o-mini"
+        assert outputs["1"][0]["output_text"] != outputs["1"][1]["output_text"]
+        assert stats["batches"] == 1
+
+    def test_failed_questions(self, templates):
+        provider, _ = _stub(StubConfig(server_error_rate=1.0))
+        outputs, failed = generate_outputs_batch(templates, {"1": Question(text="Why?")}, provider=provider,
+                                                 sleep=_no_sleep)
+        assert outputs == {}
+        assert set(failed) == {"1"}
+
+    def test_uses_shared_cache(self, templates):
+        llm.configure_cache(CompletionCache())
+        provider, stats = _stub()
+        questions = {"1": Question(text="Why?")}
+        first, _ = generate_outputs_batch(templates, questions, provider=provider, sleep=_no_sleep)
+        second, _ = generate_outputs_batch(templates, questions, provider=provider, sleep=_no_sleep)
+
+        assert second == first
+        assert stats["batches"] == 1
+
+    def test_needs_openai_provider(self, templates):
+        with pytest.raises(ValueError, match="openai"):
+            generate_outputs_batch(templates, {"1": Question(text="Why?")}, provider=StubProvider())
+
+
+class TestBulkBatchMode:
+    """Test POST /questions/bulk?mode=batch_api"""
+
+    @pytest.fixture
+    def batch_db(self, test_db):
+        with patch("services.batches.engine", test_db), patch("services.question.engine", test_db), \
+                patch.dict("os.environ", {"LLM_BATCH_POLL_SECONDS": "0"}):
+            yield test_db
+
+    def test_one_batch_job(self, client: TestClient, batch_db, templates, count):
+        provider, stats = _stub()
+        with patch("services.llm.provider_from_env", return_value=provider):
+            response = client.post("/questions/bulk?mode=batch_api", json=[f"Question {i}?" for i in range(20)])
+
+        assert response.status_code == 202
+        assert response.json()["mode"] == "batch_api"
+        batch = _finished_batch(client, response.json()["id"])
+        assert (batch["status"], batch["generated"], batch["failed"]) == ("completed", 20, 0)
+        assert stats["batches"] == 1
+        assert stats["requests"] == 0
+        assert count(Generation) == 60
+        assert count(Duel) == 60
+        status = client.get(f"/questions/{batch['question_ids'][0]}/status").json()
+        assert status["state"] == "ready"
+
+    def test_failed_requests(self, client: TestClient, batch_db, templates, count):
+        provider, _ = _stub(StubConfig(server_error_rate=1.0))
+        with patch("services.llm.provider_from_env", return_value=provider):
+            response = client.post("/questions/bulk?mode=batch_api", json=["Why?", "How?"])
+
+        batch = _finished_batch(client, response.json()["id"])
+        assert batch["status"] == "completed"
+        assert batch["failed_question_ids"] == batch["question_ids"]
+        assert client.get(f"/questions/{batch['question_ids'][0]}/status").json()["state"] == "failed"
+        assert count(Generation) == 0
+
+    def test_job_recorded_until_stored(self, client: TestClient, batch_db, templates, db_session: Session):
+        provider, _ = _stub(StubConfig(batch_seconds=0.2))
+        with patch("services.llm.provider_from_env", return_value=provider):
+            response = client.post("/questions/bulk?mode=batch_api", json=["Why?"])
+            job = db_session.exec(select(BatchApiJob)).one()
+            assert job.batch_id == response.json()["id"]
+            batch = _finished_batch(client, job.batch_id)
+
+        assert (batch["status"], batch["generated"]) == ("completed", 1)
+        assert db_session.exec(select(BatchApiJob)).all() == []
+
+    def test_resumed_after_restart(self, client: TestClient, batch_db, templates, db_session: Session, count):
+        provider, stats = _stub()
+        question = Question(text="Why?")
+        db_session.add(question)
+        db_session.commit()
+        # Submitted by a server that stopped before the job finished
+        provider_batch_id = llm.start_outputs_batch(templates, {str(question.id): question}, provider)
+        db_session.add(BatchApiJob(
+            id=provider_batch_id, batch_id="before-restart", llm_model=provider.model, status="in_progress",
+            question_ids=json.dumps([question.id]), template_ids=json.dumps([t.id for t in templates]),
+        ))
+        db_session.commit()
+
+        with patch("services.llm.provider_from_env", return_value=provider):
+            assert resume_batch_api_jobs() == 1
+            batch = _finished_batch(client, "before-restart")
+
+        assert (batch["status"], batch["generated"]) == ("completed", 1)
+        assert stats["batches"] == 1
+        assert count(Generation) == 3
+        assert db_session.exec(select(BatchApiJob)).all() == []
+
+    def test_deleted_question_does_not_drop_others(self, batch_db, templates, db_session: Session, count):
+        event.listen(batch_db, "connect", lambda connection, record: connection.execute("PRAGMA foreign_keys=ON"))
+        questions = [Question(text=f"Question {i}?") for i in range(3)]
+        db_session.add_all(questions)
+        db_session.commit()
+        output = {"output_text": "Answer.", "llm_model": "gpt-4o-mini", "latency": 1.0, "output_tokens": 2,
+                  "input_tokens": 3}
+        by_id = {question.id: question for question in questions}
+        # Deleted after its outputs were generated
+        by_id[999] = Question(id=999, text="Deleted?")
+
+        stored = _store_in_chunks({question_id: [output] * 3 for question_id in by_id}, templates, by_id)
+        assert stored == {question.id for question in questions}
+        assert count(Generation) == 9
+        assert count(Duel) == 9
+
+    def test_provider_without_batches(self, client: TestClient, batch_db, templates):
+        with patch("services.llm.provider_from_env", return_value=StubProvider()):
+            response = client.post("/questions/bulk?mode=batch_api", json=["Why?"])
+
+        batch = client.get(f"/questions/batches/{response.json()['id']}").json()
+        assert batch["status"] == "failed"
+        assert "openai" in batch["error"]
+
+    def test_unknown_mode(self, client: TestClient):
+        assert client.post("/questions/bulk?mode=later", json=["Why?"]).status_code == 422
+        assert client.get("/questions/").json() == []
+
+
+class TestEvaluationBatchMode:
+    def test_run(self, tmp_path, test_db, templates, count):
+        provider, stats = _stub()
+        output = str(tmp_path / "results.jsonl")
+        questions = [(f"q{i}", f"Question {i}?") for i in range(5)]
+        summary = EvaluationRun(questions, load_templates(test_db), output + ".checkpoint", output_path=output,
+                                engine=test_db, provider=provider, batch_api=True, poll_seconds=0).run()
+
+        assert (summary["completed"], summary["failed"]) == (5, 0)
+        assert stats["batches"] == 1
+        with open(output) as file:
+            results = [json.loads(line) for line in file]
+        assert [r["key"] for r in results] == [key for key, _ in questions]
+        assert [g["template"] for g in results[0]["generations"]] == ["a", "b", "c"]
+        assert count(Generation) == 15
@@ -0,0 +1,137 @@
+import random
+import statistics
+import time
+from unittest.mock import patch
+import openai
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+from models.template import Template
+from models.questions import Question
+from services.llm import LLMProvider, OpenAIProvider, StubProvider, generate_output, generate_outputs, provider_from_env
+from services.llm_stub import StubConfig, create_app, generate_completion
+from services.synthetic import LatencyModel
+
+
+def _openai_client(config: StubConfig) -> OpenAI:
+    """An OpenAI client whose requests are served in-process by the stub"""
+    return OpenAI(api_key="test-key", base_url="http://stub/v1", max_retries=0,
+                  http_client=TestClient(create_app(config), base_url="http://stub"))
+
+
+@pytest.fixture
+def template():
+    return Template(key="direct", name="Direct", template_text="Answer this question: {{question}}")
+
+
+@pytest.fixture
+def question():
+    return Question(text="What is the capital of France?")
+
+
+class TestStubServer:
+    """Test the OpenAI-compatible stub through the OpenAI client"""
+
+    def test_completion(self, template, question):
+        provider = OpenAIProvider(_openai_client(StubConfig(seed=7)))
+        result = generate_output(template, question, provider=provider)
+
+        expected = generate_completion("Answer this question: What is the capital of France?", "gpt-4o-mini",
+                                       StubConfig(seed=7))
+        assert result["output_text"] == expected["output_text"]
+        assert result["output_tokens"] == expected["output_tokens"] == len(result["output_text"].split())
+        assert result["input_tokens"] == expected["input_tokens"]
+        assert result["llm_model"] == "gpt-4o-mini"
+
+    def test_streaming_matches_non_streaming(self, template, question):
+        client = _openai_client(StubConfig(seed=7))
+        plain = generate_output(template, question, provider=OpenAIProvider(client, stream=False))
+        streamed = generate_output(template, question, provider=OpenAIProvider(client, stream=True))
+        # Only the measured latencies differ
+        assert {**streamed, "latency": None} == {**plain, "latency": None}
+
+    def test_rate_limit(self, template, question):
+        client = _openai_client(StubConfig(rate_limit_rate=1.0, retry_after_seconds=2))
+        with pytest.raises(openai.RateLimitError) as error:
+            generate_output(template, question, client)
+        assert error.value.response.headers["retry-after"] == "2"
+
+    def test_server_errors(self, template, question):
+        client = _openai_client(StubConfig(server_error_rate=1.0))
+        for _ in range(5):
+            with pytest.raises(openai.InternalServerError) as error:
+                generate_output(template, question, client)
+            assert error.value.status_code in (500, 502, 503)
+
+    def test_timeout(self):
+        stub = TestClient(create_app(StubConfig(timeout_rate=1.0, timeout_seconds=0.1)))
+        started = time.perf_counter()
+        response = stub.post("/v1/chat/completions", json={"model": "gpt-4o-mini", "messages": []})
+        assert time.perf_counter() - started >= 0.1
+        assert response.status_code == 504
+        assert stub.get("/stub/stats").json()["timeouts"] == 1
+
+    def test_faults_reproducible(self):
+        """Test that the same seed gives the same sequence of faults"""
+        def statuses(seed):
+            stub = TestClient(create_app(StubConfig(seed=seed, rate_limit_rate=0.3, server_error_rate=0.2)))
+            return [stub.post("/v1/chat/completions", json={"messages": []}).status_code for _ in range(30)]
+
+        first = statuses(3)
+        assert first == statuses(3)
+        assert {200, 429} <= set(first)
+
+    def test_latency(self):
+        stub = TestClient(create_app(StubConfig(first_token_latency=LatencyModel("fixed", 0.05),
+                                                tokens_per_second=1000, output_tokens_mean=50,
+                                                output_tokens_stddev=0)))
+        started = time.perf_counter()
+        stub.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "Hi"}]})
+        assert time.perf_counter() - started >= 0.1
+
+
+class TestLatencyModel:
+    @pytest.mark.parametrize("distribution", ["uniform", "normal", "lognormal"])
+    def test_mean(self, distribution):
+        rng = random.Random(1)
+        model = LatencyModel(distribution, mean=2.0, stddev=0.5)
+        samples = [model.sample(rng) for _ in range(5000)]
+        assert statistics.mean(samples) == pytest.approx(2.0, rel=0.05)
+        assert min(samples) >= 0
+
+    def test_unknown_distribution(self):
+        with pytest.raises(ValueError):
+            LatencyModel("pareto")
+
+
+class TestProviders:
+    """Test provider selection"""
+
+    def test_stub_provider_deterministic(self, template, question):
+        first = generate_outputs([template], question, provider=StubProvider(seed=1))
+        second = generate_outputs([template], question, provider=StubProvider(seed=1))
+        other = generate_outputs([template], question, provider=StubProvider(seed=2))
+        assert first[0].output_text == second[0].output_text
+        assert first[0].output_text != other[0].output_text
+
+    def test_provider_must_complete(self):
+        class Incomplete(LLMProvider):
+            name = "incomplete"
+
+        with pytest.raises(TypeError, match="complete"):
+            Incomplete()
+
+    def test_provider_from_env(self, template, question):
+        with patch.dict("os.environ", {"LLM_PROVIDER": "stub", "LLM_MODEL": "stub-model"}, clear=True):
+            result = generate_output(template, question)
+        assert result["llm_model"] == "stub-model"
+
+        with patch.dict("os.environ", {"LLM_PROVIDER": "unknown"}):
+            with pytest.raises(ValueError, match="Unknown LLM_PROVIDER"):
+                provider_from_env()
+
+    @patch("services.llm.OpenAI")
+    def test_base_url_without_api_key(self, mock_openai_class):
+        with patch.dict("os.environ", {"LLM_BASE_URL": "http://127.0.0.1:8001/v1"}, clear=True):
+            provider_from_env()
+        mock_openai_class.assert_called_once_with(api_key="local", base_url="http://127.0.0.1:8001/v1")
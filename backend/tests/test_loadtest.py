@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+from unittest.mock import patch
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from benchmarks.loadtest import ROUTES, LoadTestConfig, percentiles, run_load
+from main import app
+from services import metrics
+
+
+class TestLoadTest:
+    """Test the load test harness against the app in-process, with the stub LLM provider"""
+
+    def test_run_load(self, client: TestClient, test_db):
+        config = LoadTestConfig(users=2, judges=4, duration=0.5, drain=10, asker_think=0.2, judge_think=0.01)
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await run_load(config, http)
+
+        with patch("services.question.engine", test_db), patch.dict("os.environ", {"LLM_PROVIDER": "stub"}):
+            report = asyncio.run(scenario())
+
+        assert report["config"]["judges"] == 4
+        assert set(report["routes"]) == set(ROUTES.values())
+        created = report["routes"][ROUTES["create_question"]]
+        assert created["requests"] >= 2
+        assert created["statuses"].get("200", 0) >= 2
+        assert report["routes"][ROUTES["decide_duel"]]["latency_ms"]["p50"] is not None
+        questions = report["questions"]
+        assert questions["asked"] >= 2
+        assert questions["decided"] >= 1
+        assert questions["time_to_winner_ms"]["p99"] >= questions["time_to_winner_ms"]["p50"] > 0
+        assert report["throughput_rps"] > 0
+
+    def test_percentiles(self):
+        result = percentiles([i / 1000 for i in range(1, 101)])
+        assert result == {"p50": 50.0, "p95": 95.0, "p99": 99.0, "mean": 50.5, "max": 100.0}
+        assert percentiles([])["p50"] is None
+
+
+class TestDatabaseLocked:
+    """Test that SQLite lock contention is reported as a retryable 503"""
+
+    def test_locked_is_503(self, client: TestClient):
+        metrics.reset()
+        locked = OperationalError("SELECT 1", {}, sqlite3.OperationalError("database is locked"))
+        with patch("routers.questions._load_question", side_effect=locked):
+            response = client.get("/questions/1")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        assert "locked" in response.json()["detail"]
+        assert metrics.DB_LOCK_ERRORS.value() == 1
+
+    def test_other_operational_errors_propagate(self, client: TestClient):
+        broken = OperationalError("SELECT 1", {}, sqlite3.OperationalError("no such table: question"))
+        with patch("routers.questions._load_question", side_effect=broken):
+            with pytest.raises(OperationalError):
+                client.get("/questions/1")
@@ -0,0 +1,127 @@
+from unittest.mock import MagicMock, patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from services import metrics
+from services.metrics import Counter, Gauge, Histogram
+from services.question import GENERATION_TASK
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _sample(text: str, line_prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_prefix} not found")
+
+
+class TestMetricTypes:
+    """Test the metric primitives and exposition format"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("test_seconds", "Test", ["route"], buckets=(0.1, 1.0), registry=[])
+        histogram.observe(0.05, route="/a")
+        histogram.observe(0.5, route="/a")
+        histogram.observe(5, route="/a")
+
+        text = histogram.render()
+        assert "# TYPE test_seconds histogram" in text
+        assert _sample(text, 'test_seconds_bucket{route="/a",le="0.1"}') == 1
+        assert _sample(text, 'test_seconds_bucket{route="/a",le="1.0"}') == 2
+        assert _sample(text, 'test_seconds_bucket{route="/a",le="+Inf"}') == 3
+        assert _sample(text, 'test_seconds_count{route="/a"}') == 3
+        assert _sample(text, 'test_seconds_sum{route="/a"}') == 5.55
+
+    def test_counter_and_gauge(self):
+        counter = Counter("test_events", "Test", ["kind"], registry=[])
+        counter.inc(kind='say "hi"')
+        counter.inc(2, kind='say "hi"')
+        gauge = Gauge("test_depth", "Test", registry=[])
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        assert _sample(counter.render(), 'test_events_total{kind="say \\"hi\\""}') == 3
+        assert _sample(gauge.render(), "test_depth") == 1
+
+    def test_metric_must_render_samples(self):
+        class Incomplete(metrics._Metric):
+            kind = "untyped"
+
+        with pytest.raises(TypeError, match="_samples"):
+            Incomplete("test_incomplete", "Test", registry=[])
+
+    def test_disabled_is_noop(self, monkeypatch):
+        monkeypatch.setattr(metrics, "enabled", False)
+        counter = Counter("test_disabled", "Test", registry=[])
+        counter.inc()
+        assert counter.value() == 0
+
+
+class TestMetricsEndpoint:
+    """Test the /metrics endpoint and the built-in instrumentation"""
+
+    def test_request_db_and_threadpool_metrics(self, client: TestClient):
+        client.get("/questions/")
+        client.get("/questions/999")
+        text = client.get("/metrics").text
+
+        assert _sample(text, 'http_request_duration_seconds_count{method="GET",route="/questions/",status="200"}') == 1
+        assert _sample(text, 'http_request_duration_seconds_count{method="GET",route="/questions/{question_id}",status="404"}') == 1
+        assert _sample(text, 'db_queries_total{operation="SELECT"}') >= 2
+        assert 'db_query_duration_seconds_bucket{operation="SELECT",le="+Inf"}' in text
+        assert _sample(text, "threadpool_threads_limit") > 0
+        assert "threadpool_threads_busy" in text
+
+    def test_generation_task_metrics(self, client: TestClient, test_db):
+        """Test queue depth, task duration and duel creation of a submitted question"""
+        with Session(test_db) as db:
+            for key in ("a", "b", "c"):
+                db.add(Template(key=key, name=key, template_text="{{question}}"))
+            db.commit()
+
+        def fake_outputs(templates, question):
+            return [
+                Generation(template_id=template.id, question_id=question.id, output_text="Paris",
+                           llm_model="gpt-4o-mini", latency=0.1, output_tokens=1, input_tokens=1)
+                for template in templates
+            ]
+
+        with patch("services.question.engine", test_db), patch("services.llm.generate_outputs", fake_outputs):
+            client.post("/questions/", json={"text": "Capital of France?"})
+
+        assert metrics.BACKGROUND_TASKS_QUEUED.value(task=GENERATION_TASK) == 0
+        assert metrics.BACKGROUND_TASKS_RUNNING.value(task=GENERATION_TASK) == 0
+        assert metrics.BACKGROUND_TASK_DURATION.count(task=GENERATION_TASK, outcome="ok") == 1
+        assert metrics.DUEL_CREATION_DURATION.count() == 1
+        assert metrics.DUELS_CREATED.value() == 3
+
+    def test_llm_metrics(self, mock_openai_response):
+        from services.llm import generate_output
+
+        client = MagicMock()
+        client.chat.completions.create.return_value = mock_openai_response
+        template = Template(key="direct", name="Direct", template_text="{{question}}")
+        generate_output(template, Question(text="Capital of France?"), client)
+
+        labels = {"template": "direct", "model": "gpt-4o-mini"}
+        assert metrics.LLM_REQUEST_DURATION.count(**labels) == 1
+        assert metrics.LLM_TOKENS.count(direction="output", **labels) == 1
+
+        client.chat.completions.create.side_effect = RuntimeError("rate limited")
+        with pytest.raises(RuntimeError):
+            generate_output(template, Question(text="Capital of France?"), client)
+        assert metrics.LLM_ERRORS.value(**labels) == 1
+
+    def test_disabled_endpoint(self, client: TestClient, monkeypatch):
+        monkeypatch.setattr(metrics, "enabled", False)
+        assert client.get("/metrics").status_code == 404
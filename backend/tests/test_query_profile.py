@@ -0,0 +1,190 @@
+import re
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from services import profiling
+from services.cache import response_cache
+from services.performance import GENERATION_PERFORMANCE_FIELDS
+from services.profiling import QueryProfile, profile_queries
+
+# Upper bounds on the SQL statements per request; raise one only for a deliberate change
+QUERY_BUDGETS = {
+    "list_questions": 2,
+    "get_question": 1,
+    "question_status": 1,
+    "list_duels": 1,
+    "next_duel": 5,
+    "decide_duel": 3,
+    "decide_last_duel": 12,
+    "question_results": 1,
+    "question_results_summary": 2,
+    "list_templates": 1,
+    "template_performance": 4,
+    "get_template": 1,
+    "create_template": 2,
+    "update_template": 3,
+    "update_question": 4,
+    "delete_question": 7,
+}
+
+
+def _query_count(response) -> int:
+    match = re.search(r'db;desc="(\d+) quer', response.headers["server-timing"])
+    return int(match.group(1))
+
+
+def _seed(test_db, templates: int = 3, questions: int = 1) -> dict:
+    """Questions with a generation per template and a duel per pair of generations"""
+    with Session(test_db) as db:
+        template_rows = [Template(key=f"t{i}", name=f"T{i}", template_text="{{question}}") for i in range(templates)]
+        for template in template_rows:
+            db.add(template)
+        db.commit()
+        question_id, duels = None, []
+        for q in range(questions):
+            question = Question(text=f"Question {q}?")
+            db.add(question)
+            db.commit()
+            generations = [
+                Generation(template_id=template.id, question_id=question.id, output_text="Paris",
+                           llm_model="gpt-4o-mini", latency=0.1, output_tokens=1, input_tokens=1)
+                for template in template_rows
+            ]
+            for generation in generations:
+                db.add(generation)
+            db.commit()
+            question_id, duels = question.id, []
+            for i, gen_a in enumerate(generations):
+                for gen_b in generations[i + 1:]:
+                    duel = Duel(question_id=question.id)
+                    db.add(duel)
+                    db.flush()
+                    db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
+                    db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
+                    duels.append((duel.id, gen_a.id))
+            db.commit()
+        return {"question_id": question_id, "template_id": template_rows[0].id, "duels": duels}
+
+
+class TestQueryBudgets:
+    """Test that no route issues more SQL statements than its budget"""
+
+    def test_routes_within_budget(self, client: TestClient, test_db):
+        seeded = _seed(test_db)
+        question_id, template_id = seeded["question_id"], seeded["template_id"]
+        template = {"key": "t0", "name": "T0", "template_text": "{{question}}"}
+
+        counts = {
+            "list_questions": _query_count(client.get("/questions/")),
+            "get_question": _query_count(client.get(f"/questions/{question_id}")),
+            "question_status": _query_count(client.get(f"/questions/{question_id}/status")),
+            "list_duels": _query_count(client.get(f"/questions/{question_id}/duels")),
+            "next_duel": _query_count(client.get(f"/questions/{question_id}/duels/next")),
+        }
+        *first_duels, last_duel = seeded["duels"]
+        for duel_id, winner_id in first_duels:
+            response = client.post(f"/questions/{question_id}/duels/{duel_id}/decide", json={"winner_id": winner_id})
+            counts["decide_duel"] = max(counts.get("decide_duel", 0), _query_count(response))
+        duel_id, winner_id = last_duel
+        counts["decide_last_duel"] = _query_count(
+            client.post(f"/questions/{question_id}/duels/{duel_id}/decide", json={"winner_id": winner_id})
+        )
+        counts.update({
+            "question_results": _query_count(
+                client.get(f"/questions/{question_id}/results?fields={','.join(GENERATION_PERFORMANCE_FIELDS)}")
+            ),
+            "question_results_summary": _query_count(client.get(f"/questions/{question_id}/results")),
+            "list_templates": _query_count(client.get("/templates/")),
+            "template_performance": _query_count(client.get("/templates/performance")),
+            "get_template": _query_count(client.get(f"/templates/{template_id}")),
+            "create_template": _query_count(client.post("/templates/", json={**template, "key": "new"})),
+            "update_template": _query_count(client.put(f"/templates/{template_id}", json=template)),
+            "update_question": _query_count(client.put(f"/questions/{question_id}", json={"text": "Changed?"})),
+            "delete_question": _query_count(client.delete(f"/questions/{question_id}")),
+        })
+
+        over_budget = {route: count for route, count in counts.items() if count > QUERY_BUDGETS[route]}
+        assert over_budget == {}
+
+    @pytest.mark.parametrize("path", [
+        "/questions/",
+        "/questions/{question_id}/duels/next",
+        "/questions/{question_id}/status",
+        "/templates/performance",
+    ])
+    def test_query_count_independent_of_data_size(self, client: TestClient, test_db, path):
+        """Test that the statement count does not grow with the rows returned (no N+1)"""
+        small = _seed(test_db, templates=2, questions=1)
+        small_count = _query_count(client.get(path.format(question_id=small["question_id"])))
+        response_cache.clear()
+        large = _seed(test_db, templates=5, questions=10)
+        large_count = _query_count(client.get(path.format(question_id=large["question_id"])))
+        assert large_count == small_count
+
+
+class TestQueryProfiler:
+    """Test the profile, the Server-Timing header and the logs"""
+
+    def test_server_timing_header(self, client: TestClient, test_db):
+        _seed(test_db, templates=2)
+        timing = client.get("/questions/").headers["server-timing"]
+        assert re.fullmatch(
+            r'db;desc="2 queries";dur=\d+\.\d{2}, db-slowest;desc="SELECT \w+";dur=\d+\.\d{2}', timing
+        )
+
+    def test_server_timing_without_queries(self, client: TestClient):
+        assert client.get("/").headers["server-timing"] == 'db;desc="0 queries";dur=0.00'
+
+    def test_background_task_not_counted(self, client: TestClient, test_db):
+        """Test that statements of a background task, run after the response, are not counted"""
+        _seed(test_db, templates=2, questions=0)
+
+        def fake_outputs(templates, question):
+            return [
+                Generation(template_id=template.id, question_id=question.id, output_text="Paris",
+                           llm_model="gpt-4o-mini", latency=0.1, output_tokens=1, input_tokens=1)
+                for template in templates
+            ]
+
+        with patch("services.question.engine", test_db), patch("services.llm.generate_outputs", fake_outputs):
+            response = client.post("/questions/", json={"text": "Capital of France?"})
+
+        assert _query_count(response) <= 2
+        with Session(test_db) as db:
+            assert len(db.exec(select(Duel)).all()) == 1
+
+    def test_repeated_statements(self, test_db):
+        _seed(test_db, templates=1)
+        with profile_queries("GET /test") as profile:
+            with Session(test_db) as db:
+                for template_id in range(4):
+                    db.get(Template, template_id + 100)
+        assert profile.count == 4
+        assert len(profile.repeated(3)) == 1
+        assert profile.repeated(3)[0][1] == 4
+
+    def test_repeated_statements_logged_by_middleware(self, client: TestClient, test_db, caplog, monkeypatch):
+        monkeypatch.setattr(profiling, "repeated_query_threshold", 1)
+        _seed(test_db, templates=1)
+        client.get("/templates/")
+        assert "Repeated query (1x) [GET /templates/], possible N+1: SELECT" in caplog.text
+
+    def test_slow_query_logged(self, test_db, caplog, monkeypatch):
+        monkeypatch.setattr(profiling, "slow_query_ms", 0)
+        with profile_queries("GET /slow"):
+            with Session(test_db) as db:
+                db.exec(select(Template)).all()
+        assert re.search(r"Slow query \(\d+\.\d ms\) \[GET /slow\]: SELECT template\.", caplog.text)
+
+    def test_statements_after_close_ignored(self):
+        profile = QueryProfile()
+        profile.record("SELECT 1", 0.002)
+        profile.closed = True
+        profile.record("SELECT 2", 0.001)
+        assert profile.count == 1
+        assert profile.slowest_statement == "SELECT 1"
@@ -0,0 +1,127 @@
+import base64
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+
+
+BASE_TIME = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def _watermark(response) -> tuple:
+    """(changed_at, id) position held by the opaque X-Sync-Watermark header"""
+    at, question_id = base64.urlsafe_b64decode(response.headers["X-Sync-Watermark"]).decode().split("|")
+    return datetime.fromisoformat(at), int(question_id)
+
+
+@pytest.fixture
+def questions(test_db):
+    """Seven questions, two of which share a created_at timestamp"""
+    offsets = [0, 1, 2, 2, 3, 4, 5]
+    with Session(test_db) as db:
+        created = [
+            Question(text=f"Question {i}", created_at=BASE_TIME + timedelta(minutes=offset))
+            for i, offset in enumerate(offsets)
+        ]
+        for question in created:
+            db.add(question)
+        db.commit()
+        return [question.id for question in created]
+
+
+class TestQuestionPagination:
+    """Test keyset pagination and delta sync on GET /questions"""
+
+    def test_cursor_pages_cover_all_questions(self, client: TestClient, questions):
+        """Test that following X-Next-Cursor visits every question once, newest first"""
+        seen = []
+        url = "/questions/?limit=3"
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            seen += [q["id"] for q in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            url = f"/questions/?limit=3&cursor={cursor}" if cursor else None
+
+        assert sorted(seen) == sorted(questions)
+        assert len(seen) == len(set(seen))
+        # Newest first, ties broken by id descending
+        assert seen == [questions[i] for i in (6, 5, 4, 3, 2, 1, 0)]
+
+    def test_invalid_cursor(self, client: TestClient):
+        """Test that a malformed cursor is rejected"""
+        response = client.get("/questions/?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+    def test_cursor_and_updated_since_are_exclusive(self, client: TestClient):
+        """Test that cursor and updated_since cannot be combined"""
+        response = client.get("/questions/?cursor=abc&updated_since=2025-01-01T00:00:00")
+        assert response.status_code == 400
+
+    def test_first_page_reports_watermark(self, client: TestClient, questions):
+        """Test that the first page carries a watermark for later delta sync"""
+        response = client.get("/questions/?limit=2")
+        assert _watermark(response) == (BASE_TIME + timedelta(minutes=5), questions[6])
+
+    def test_delta_sync_returns_created_and_decided_questions(self, client: TestClient, test_db, questions):
+        """Test that updated_since returns only questions created or decided after the watermark"""
+        watermark = (BASE_TIME + timedelta(minutes=3)).isoformat()
+
+        with Session(test_db) as db:
+            template = Template(key="t", name="T", template_text="{{question}}")
+            db.add(template)
+            db.commit()
+            old_question = db.get(Question, questions[0])
+            generation = Generation(
+                template_id=template.id, question_id=old_question.id, output_text="Answer",
+                llm_model="gpt-4o-mini", latency=0.5, output_tokens=10, input_tokens=20
+            )
+            db.add(generation)
+            db.commit()
+            old_question.selected_generation_id = generation.id
+            old_question.decided_at = BASE_TIME + timedelta(minutes=10)
+            db.commit()
+
+        response = client.get(f"/questions/?updated_since={watermark}&details=true")
+        assert response.status_code == 200
+        data = response.json()
+
+        # Oldest change first: two newer questions, then the one decided last
+        assert [q["id"] for q in data] == [questions[5], questions[6], questions[0]]
+        assert data[-1]["selected_generation_id"] == data[-1]["selected_generation"]["id"]
+        assert _watermark(response) == (BASE_TIME + timedelta(minutes=10), questions[0])
+
+        # Syncing again from the new watermark returns nothing new
+        watermark = response.headers["X-Sync-Watermark"]
+        response = client.get(f"/questions/?updated_since={watermark}")
+        assert response.json() == []
+        assert response.headers["X-Sync-Watermark"] == watermark
+
+    def test_delta_sync_pages_through_shared_timestamps(self, client: TestClient, test_db, questions):
+        """Test that a page ending among questions changed at the same moment loses none of them"""
+        uploaded_at = BASE_TIME + timedelta(minutes=30)
+        with Session(test_db) as db:
+            uploaded = [Question(text=f"Uploaded {i}", created_at=uploaded_at) for i in range(7)]
+            db.add_all(uploaded)
+            db.commit()
+            uploaded_ids = [question.id for question in uploaded]
+
+        seen = []
+        watermark = (BASE_TIME + timedelta(minutes=5)).isoformat()
+        while True:
+            response = client.get(f"/questions/?limit=3&updated_since={watermark}")
+            page = [q["id"] for q in response.json()]
+            seen += page
+            watermark = response.headers["X-Sync-Watermark"]
+            if len(page) < 3:
+                break
+
+        assert seen == uploaded_ids
+
+    def test_invalid_watermark(self, client: TestClient):
+        """Test that a malformed watermark is rejected"""
+        response = client.get("/questions/?updated_since=not-a-watermark")
+        assert response.status_code == 400
@@ -20,6 +20,7 @@ class TestQuestionService:
         assert result is None
         db_session.refresh(sample_question)
         assert sample_question.selected_generation_id is None
+        assert sample_question.decided_at is None
     
     def test_set_question_winner_undecided_duels(self, db_session, sample_template, sample_question):
         """Test set_question_winner when duels exist but are not all decided"""
@@ -142,6 +143,7 @@ class TestQuestionService:
         db_session.refresh(sample_question)
         assert sample_question.selected_generation_id is not None
         assert sample_question.selected_generation_id == gen1.id
+        assert sample_question.decided_at is not None
     
     def test_set_question_winner_tie_breaker(self, db_session, sample_template, sample_question):
         """Test set_question_winner with a tie - should use lowest ID"""
@@ -0,0 +1,223 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+from db import get_db
+from main import app
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from services.cache import ChangeCounters, bump_question, change_counters, question_key, response_cache
+from services.question import record_generation_failure
+
+
+@pytest.fixture
+def processing_question(test_db):
+    """A question with two templates and no generations yet"""
+    with Session(test_db) as db:
+        db.add(Template(key="a", name="A", template_text="{{question}}"))
+        db.add(Template(key="b", name="B", template_text="{{question}}"))
+        question = Question(text="Capital of France?")
+        db.add(question)
+        db.commit()
+        return question.id
+
+
+def _add_generations_and_duel(test_db, question_id: int):
+    with Session(test_db) as db:
+        generations = [
+            Generation(template_id=template_id, question_id=question_id, output_text=f"Answer {template_id}",
+                       llm_model="gpt-4o-mini", latency=0.5, output_tokens=2, input_tokens=5)
+            for template_id in (1, 2)
+        ]
+        for generation in generations:
+            db.add(generation)
+        db.commit()
+        duel = Duel(question_id=question_id)
+        db.add(duel)
+        db.flush()
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=generations[0].id, role="generation_a"))
+        db.add(DuelGeneration(duel_id=duel.id, generation_id=generations[1].id, role="generation_b"))
+        db.commit()
+        return duel.id, generations[0].id
+
+
+class TestQuestionStatus:
+    """Test the processing status endpoint"""
+
+    def test_not_found(self, client: TestClient):
+        assert client.get("/questions/999/status").status_code == 404
+
+    def test_lifecycle(self, client: TestClient, test_db, processing_question):
+        """Test counts and state from creation to decision"""
+        status = client.get(f"/questions/{processing_question}/status").json()
+        generating_version = status.pop("version")
+        assert status == {
+            "question_id": processing_question, "state": "generating", "generations_done": 0,
+            "generations_expected": 2, "duels_total": 0, "duels_decided": 0, "error": None,
+        }
+
+        duel_id, winner_id = _add_generations_and_duel(test_db, processing_question)
+        status = client.get(f"/questions/{processing_question}/status").json()
+        assert (status["state"], status["generations_done"], status["duels_total"]) == ("ready", 2, 1)
+        ready_version = status["version"]
+
+        client.post(f"/questions/{processing_question}/duels/{duel_id}/decide", json={"winner_id": winner_id})
+        status = client.get(f"/questions/{processing_question}/status").json()
+        assert (status["state"], status["duels_decided"]) == ("decided", 1)
+        assert len({generating_version, ready_version, status["version"]}) == 3
+
+    def test_version_survives_restart(self, client: TestClient, processing_question):
+        """Test that the version comes from stored state, not this process's change counters"""
+        version = client.get(f"/questions/{processing_question}/status").json()["version"]
+        bump_question(processing_question)
+        change_counters.clear()
+        assert client.get(f"/questions/{processing_question}/status").json()["version"] == version
+
+    def test_single_query(self, client: TestClient, test_db, processing_question):
+        """Test that the status is computed in one statement"""
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(test_db, "before_cursor_execute", listener)
+        client.get(f"/questions/{processing_question}/status")
+        event.remove(test_db, "before_cursor_execute", listener)
+        assert len(statements) == 1
+
+    def test_long_poll_times_out(self, client: TestClient, processing_question):
+        """Test that an unchanged question holds the request for `wait` seconds"""
+        version = client.get(f"/questions/{processing_question}/status").json()["version"]
+        started = time.monotonic()
+        status = client.get(f"/questions/{processing_question}/status?wait=0.2&version={version}").json()
+        assert time.monotonic() - started >= 0.2
+        assert status["version"] == version
+
+    def test_long_poll_ignores_writes_that_change_nothing(self, client: TestClient, processing_question):
+        """Test that a wake-up without a status change keeps holding the request"""
+        version = client.get(f"/questions/{processing_question}/status").json()["version"]
+        threading.Timer(0.05, bump_question, (processing_question,)).start()
+        started = time.monotonic()
+        status = client.get(f"/questions/{processing_question}/status?wait=0.3&version={version}").json()
+        assert time.monotonic() - started >= 0.3
+        assert status["version"] == version
+
+    def test_long_poll_woken_by_write(self, client: TestClient, test_db, processing_question):
+        """Test that a write to the question releases a waiting long poll"""
+        version = client.get(f"/questions/{processing_question}/status").json()["version"]
+
+        def write():
+            _add_generations_and_duel(test_db, processing_question)
+            bump_question(processing_question)
+
+        timer = threading.Timer(0.1, write)
+        timer.start()
+        started = time.monotonic()
+        status = client.get(f"/questions/{processing_question}/status?wait=10&version={version}").json()
+        timer.join()
+
+        assert time.monotonic() - started < 5
+        assert status["state"] == "ready"
+        assert status["version"] != version
+
+    def test_failed_generation(self, client: TestClient, test_db, processing_question):
+        """Test that a failed generation ends a waiting long poll with the failed state"""
+        version = client.get(f"/questions/{processing_question}/status").json()["version"]
+
+        with patch("services.question.engine", test_db):
+            timer = threading.Timer(0.1, record_generation_failure, [processing_question, "Generation cancelled: deadline"])
+            timer.start()
+            status = client.get(f"/questions/{processing_question}/status?wait=10&version={version}").json()
+            timer.join()
+
+        assert (status["state"], status["error"]) == ("failed", "Generation cancelled: deadline")
+        assert status["version"] != version
+
+    def test_stale_version_returns_immediately(self, client: TestClient, processing_question):
+        version = client.get(f"/questions/{processing_question}/status").json()["version"]
+        started = time.monotonic()
+        status = client.get(f"/questions/{processing_question}/status?wait=10&version={version + 1}").json()
+        assert time.monotonic() - started < 5
+        assert status["version"] == version
+
+
+class TestLongPollConnections:
+    """Test that waiting long polls leave the connection pool to other requests"""
+
+    POOL_SIZE = 3
+
+    @pytest.fixture
+    def pooled_client(self, tmp_path):
+        # A file engine with a QueuePool, like db.engine, but small and quick to time out
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'pooled.db'}", pool_size=self.POOL_SIZE, max_overflow=0, pool_timeout=1
+        )
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            db.add(Template(key="a", name="A", template_text="{{question}}"))
+            question = Question(text="Capital of France?")
+            db.add(question)
+            db.commit()
+            question_id = question.id
+
+        def override_get_db():
+            with Session(engine) as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        response_cache.clear()
+        change_counters.clear()
+        with TestClient(app) as client:
+            yield client, engine, question_id
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+    def test_waiting_polls_hold_no_connection(self, pooled_client):
+        """Test that as many waiting polls as pooled connections leave other routes working"""
+        client, engine, question_id = pooled_client
+        version = client.get(f"/questions/{question_id}/status").json()["version"]
+
+        polls = []
+        threads = [
+            threading.Thread(
+                target=lambda: polls.append(client.get(f"/questions/{question_id}/status?wait=3&version={version}"))
+            )
+            for _ in range(self.POOL_SIZE)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while len(change_counters._waiters.get(question_key(question_id), ())) < self.POOL_SIZE:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        assert engine.pool.checkedout() == 0
+        started = time.monotonic()
+        assert client.get("/templates/").status_code == 200
+        assert time.monotonic() - started < 1
+
+        for thread in threads:
+            thread.join()
+        assert [poll.status_code for poll in polls] == [200] * self.POOL_SIZE
+
+
+class TestWaitForChange:
+    """Test waiting on change counters"""
+
+    def test_wakes_on_bump_from_another_thread(self):
+        counters = ChangeCounters()
+
+        async def wait():
+            threading.Timer(0.05, counters.bump, ("key",)).start()
+            return await counters.wait_for_change("key", 0, timeout=5)
+
+        assert asyncio.run(wait()) == 1
+        assert counters._waiters == {}
+
+    def test_timeout_cleans_up(self):
+        counters = ChangeCounters()
+        assert asyncio.run(counters.wait_for_change("key", 0, timeout=0.01)) == 0
+        assert counters._waiters == {}
@@ -0,0 +1,154 @@
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from services.cache import ChangeCounters, ResponseCache
+
+
+def _request(path: str, if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({
+        "type": "http", "method": "GET", "scheme": "http", "server": ("test", 80),
+        "path": path, "query_string": b"", "headers": headers,
+    })
+
+
+@pytest.fixture
+def query_count(test_db):
+    """Count SQL statements executed against the test database"""
+    counter = {"count": 0}
+
+    def count(*args):
+        counter["count"] += 1
+
+    event.listen(test_db, "before_cursor_execute", count)
+    yield counter
+    event.remove(test_db, "before_cursor_execute", count)
+
+
+class TestResponseCache:
+    """Test the in-process response cache"""
+
+    def test_version_changes_etag(self):
+        """Test that bumping a dependency changes the ETag and recomputes"""
+        counters = ChangeCounters()
+        cache = ResponseCache(counters, ttl_seconds=60)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"value": len(calls)}
+
+        first = cache.respond(_request("/a"), ["templates"], compute)
+        second = cache.respond(_request("/a"), ["templates"], compute)
+        assert first.body == second.body == b'{"value":1}'
+        assert first.headers["ETag"] == second.headers["ETag"]
+
+        counters.bump("questions")
+        assert cache.respond(_request("/a"), ["templates"], compute).body == b'{"value":1}'
+
+        counters.bump("templates")
+        third = cache.respond(_request("/a"), ["templates"], compute)
+        assert third.body == b'{"value":2}'
+        assert third.headers["ETag"] != first.headers["ETag"]
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_if_none_match_returns_304(self):
+        """Test conditional requests"""
+        cache = ResponseCache(ChangeCounters(), ttl_seconds=60)
+        etag = cache.respond(_request("/a"), [], lambda: []).headers["ETag"]
+
+        response = cache.respond(_request("/a", if_none_match=f'"other", {etag}'), [], lambda: [])
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = ResponseCache(ChangeCounters(), ttl_seconds=60, max_entries=2)
+        cache.respond(_request("/a"), [], lambda: "a")
+        cache.respond(_request("/b"), [], lambda: "b")
+        cache.respond(_request("/a"), [], lambda: "a")
+        cache.respond(_request("/c"), [], lambda: "c")
+
+        assert cache.respond(_request("/a"), [], lambda: "recomputed").body == b'"a"'
+        assert cache.respond(_request("/b"), [], lambda: "recomputed").body == b'"recomputed"'
+
+
+class TestCachedEndpoints:
+    """Test ETags and write-driven invalidation on read endpoints"""
+
+    def test_templates_revalidation(self, client: TestClient, query_count):
+        """Test 304s for /templates/ until a template is written"""
+        response = client.get("/templates/")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        queries = query_count["count"]
+        response = client.get("/templates/", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        response = client.get("/templates/")
+        assert response.json() == []
+        assert query_count["count"] == queries
+
+        client.post("/templates/", json={"key": "t", "name": "T", "template_text": "{{question}}"})
+        response = client.get("/templates/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert [t["key"] for t in response.json()] == ["t"]
+
+    def test_decide_invalidates_results_and_performance(self, client: TestClient, test_db):
+        """Test that deciding a duel refreshes question results and template performance"""
+        with Session(test_db) as db:
+            template_a = Template(key="a", name="A", template_text="{{question}}")
+            template_b = Template(key="b", name="B", template_text="{{question}}")
+            question = Question(text="Capital of France?")
+            db.add(template_a)
+            db.add(template_b)
+            db.add(question)
+            db.commit()
+            gen_a = Generation(template_id=template_a.id, question_id=question.id, output_text="Paris",
+                               llm_model="gpt-4o-mini", latency=0.5, output_tokens=1, input_tokens=5)
+            gen_b = Generation(template_id=template_b.id, question_id=question.id, output_text="Lyon",
+                               llm_model="gpt-4o-mini", latency=0.5, output_tokens=1, input_tokens=5)
+            db.add(gen_a)
+            db.add(gen_b)
+            db.commit()
+            duel = Duel(question_id=question.id)
+            db.add(duel)
+            db.flush()
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
+            db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
+            db.commit()
+            question_id, duel_id, winner_id = question.id, duel.id, gen_a.id
+
+        results = client.get(f"/questions/{question_id}/results")
+        performance = client.get("/templates/performance")
+        question = client.get(f"/questions/{question_id}")
+        assert results.json()["selected_generation"] is None
+        assert performance.json()["overall"] == []
+
+        client.post(f"/questions/{question_id}/duels/{duel_id}/decide", json={"winner_id": winner_id})
+
+        response = client.get(f"/questions/{question_id}/results", headers={"If-None-Match": results.headers["ETag"]})
+        assert response.status_code == 200
+        assert response.json()["selected_generation"]["id"] == winner_id
+
+        response = client.get("/templates/performance", headers={"If-None-Match": performance.headers["ETag"]})
+        assert response.status_code == 200
+        assert response.json()["overall"][0]["template_key"] == "a"
+
+        response = client.get(f"/questions/{question_id}", headers={"If-None-Match": question.headers["ETag"]})
+        assert response.status_code == 200
+        assert response.json()["selected_generation_id"] == winner_id
+
+    def test_question_delete_invalidates(self, client: TestClient):
+        """Test that a deleted question is no longer served from the cache"""
+        question_id = client.post("/questions/", json={"text": "Question"}).json()["id"]
+        assert client.get(f"/questions/{question_id}").status_code == 200
+
+        client.delete(f"/questions/{question_id}")
+        assert client.get(f"/questions/{question_id}").status_code == 404
@@ -0,0 +1,174 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from models.snapshot import QuestionResultSnapshot
+from services.performance import GENERATION_PERFORMANCE_FIELDS, GENERATION_PERFORMANCE_SUMMARY_FIELDS
+
+# Snapshots hold the full representation, output text included
+FULL = "?fields=" + ",".join(GENERATION_PERFORMANCE_FIELDS)
+
+
+@pytest.fixture
+def undecided_question(test_db):
+    """A question with three generations and all pairwise duels undecided"""
+    with Session(test_db) as db:
+        templates = [Template(key=f"t{i}", name=f"T{i}", template_text="{{question}}") for i in range(3)]
+        question = Question(text="Capital of France?")
+        for template in templates:
+            db.add(template)
+        db.add(question)
+        db.commit()
+        generations = [
+            Generation(template_id=template.id, question_id=question.id, output_text=f"Answer {template.key}",
+                       llm_model="gpt-4o-mini", latency=0.5, output_tokens=3, input_tokens=5)
+            for template in templates
+        ]
+        for generation in generations:
+            db.add(generation)
+        db.commit()
+        duels = []
+        for i, gen_a in enumerate(generations):
+            for gen_b in generations[i+1:]:
+                duel = Duel(question_id=question.id)
+                db.add(duel)
+                db.flush()
+                db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
+                db.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
+                duels.append((duel.id, gen_a.id))
+        db.commit()
+        return {
+            "question_id": question.id,
+            "template_ids": [t.id for t in templates],
+            "generation_ids": [g.id for g in generations],
+            "duels": duels,
+        }
+
+
+def _decide_all(client, data):
+    for duel_id, winner_id in data["duels"]:
+        response = client.post(f"/questions/{data['question_id']}/duels/{duel_id}/decide", json={"winner_id": winner_id})
+        assert response.status_code == 200
+
+
+class TestResultsSnapshot:
+    """Test frozen results of decided questions"""
+
+    def test_snapshot_created_when_decided(self, client: TestClient, test_db, undecided_question):
+        """Test that deciding the last duel freezes the results"""
+        question_id = undecided_question["question_id"]
+        response = client.get(f"/questions/{question_id}/results")
+        assert "max-age" not in response.headers["Cache-Control"]
+
+        _decide_all(client, undecided_question)
+
+        with Session(test_db) as db:
+            snapshot = db.get(QuestionResultSnapshot, question_id)
+            assert snapshot is not None
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(test_db, "before_cursor_execute", listener)
+        response = client.get(f"/questions/{question_id}/results{FULL}", headers={"Accept-Encoding": "identity"})
+        event.remove(test_db, "before_cursor_execute", listener)
+
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "public, max-age=86400"
+        assert response.headers["ETag"] == snapshot.etag
+        data = response.json()
+        assert data["selected_generation"]["id"] == undecided_question["generation_ids"][0]
+        assert data["generation_performance"][0]["win_rate"] == 100.0
+        assert data["generation_performance"][0]["output_text"] == "Answer t0"
+        assert len(statements) == 1
+
+        response = client.get(f"/questions/{question_id}/results{FULL}", headers={"If-None-Match": snapshot.etag})
+        assert response.status_code == 304
+
+    def test_snapshot_projected_to_requested_fields(self, client: TestClient, test_db, undecided_question):
+        """Test that the default and other field selections are served from the snapshot"""
+        question_id = undecided_question["question_id"]
+        winner_id = undecided_question["generation_ids"][0]
+        _decide_all(client, undecided_question)
+        identity = {"Accept-Encoding": "identity"}
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(test_db, "before_cursor_execute", listener)
+        summary = client.get(f"/questions/{question_id}/results", headers=identity)
+        picked = client.get(f"/questions/{question_id}/results?fields=generation_id,output_text", headers=identity)
+        event.remove(test_db, "before_cursor_execute", listener)
+
+        assert len(statements) == 2
+        assert summary.headers["Cache-Control"] == picked.headers["Cache-Control"] == "public, max-age=86400"
+        performance = summary.json()["generation_performance"]
+        assert [set(entry) for entry in performance] == [set(GENERATION_PERFORMANCE_SUMMARY_FIELDS)] * 3
+        assert summary.json()["selected_generation"]["output_text"] == "Answer t0"
+        assert picked.json()["generation_performance"][0] == {"generation_id": winner_id, "output_text": "Answer t0"}
+
+        full = client.get(f"/questions/{question_id}/results{FULL}", headers=identity)
+        assert len({summary.headers["ETag"], picked.headers["ETag"], full.headers["ETag"]}) == 3
+        response = client.get(f"/questions/{question_id}/results", headers={"If-None-Match": summary.headers["ETag"]})
+        assert response.status_code == 304
+
+    def test_summary_request_rebuilds_snapshot(self, client: TestClient, test_db, undecided_question):
+        """Test that a default request after a template delete stores a snapshot with every key"""
+        question_id = undecided_question["question_id"]
+        _decide_all(client, undecided_question)
+        client.delete(f"/templates/{undecided_question['template_ids'][2]}")
+
+        response = client.get(f"/questions/{question_id}/results")
+        assert all("output_text" not in entry for entry in response.json()["generation_performance"])
+
+        with Session(test_db) as db:
+            snapshot = db.get(QuestionResultSnapshot, question_id)
+            assert snapshot is not None
+            assert all("output_text" in entry for entry in json.loads(snapshot.payload)["generation_performance"])
+
+    def test_snapshot_regenerated_after_template_delete(self, client: TestClient, test_db, undecided_question):
+        """Test that deleting a losing template drops the snapshot and the next read rebuilds it"""
+        question_id = undecided_question["question_id"]
+        _decide_all(client, undecided_question)
+        before = client.get(f"/questions/{question_id}/results{FULL}", headers={"Accept-Encoding": "identity"})
+
+        client.delete(f"/templates/{undecided_question['template_ids'][2]}")
+        with Session(test_db) as db:
+            assert db.get(QuestionResultSnapshot, question_id) is None
+
+        response = client.get(f"/questions/{question_id}/results{FULL}")
+        assert response.status_code == 200
+        assert len(response.json()["generation_performance"]) == 2
+        assert response.json()["selected_generation"]["output_text"] == "Answer t0"
+
+        with Session(test_db) as db:
+            snapshot = db.get(QuestionResultSnapshot, question_id)
+            assert snapshot is not None
+            assert snapshot.etag != before.headers["ETag"]
+
+    def test_no_snapshot_after_winner_template_delete(self, client: TestClient, test_db, undecided_question):
+        """Test that a question whose winner was deleted is no longer frozen"""
+        question_id = undecided_question["question_id"]
+        _decide_all(client, undecided_question)
+
+        client.delete(f"/templates/{undecided_question['template_ids'][0]}")
+        response = client.get(f"/questions/{question_id}/results")
+        assert response.json()["selected_generation"] is None
+
+        with Session(test_db) as db:
+            assert db.exec(select(QuestionResultSnapshot)).all() == []
+
+    def test_update_question_drops_snapshot(self, client: TestClient, test_db, undecided_question):
+        """Test that editing a decided question invalidates its snapshot"""
+        question_id = undecided_question["question_id"]
+        _decide_all(client, undecided_question)
+
+        client.put(f"/questions/{question_id}", json={"text": "Capital of Spain?"})
+        with Session(test_db) as db:
+            assert db.get(QuestionResultSnapshot, question_id) is None
+
+        response = client.get(f"/questions/{question_id}/results")
+        assert response.json()["question"]["text"] == "Capital of Spain?"
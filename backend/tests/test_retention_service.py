@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlmodel import create_engine, select
+from db import create_tables
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from models.archive import ArchivedQuestion, ArchivedTemplateStats
+from services.performance import get_template_performance_stats
+from services.retention import (
+    archive_decided_questions,
+    compact_database,
+    enable_incremental_vacuum,
+    load_archived_question,
+    scheduler_from_env,
+)
+
+
+def _create_decided_question(db_session, templates, created_at, decided=True):
+    """Create a question with one duel between two generations, won by the first"""
+    question = Question(text="What is the capital of France?", created_at=created_at)
+    db_session.add(question)
+    db_session.commit()
+    db_session.refresh(question)
+
+    gen_a = Generation(
+        template_id=templates[0].id, question_id=question.id, output_text="Paris",
+        llm_model="gpt-4o-mini", latency=0.5, output_tokens=10, input_tokens=20
+    )
+    gen_b = Generation(
+        template_id=templates[1].id, question_id=question.id, output_text="Paris, France",
+        llm_model="gpt-4o-mini", latency=0.6, output_tokens=12, input_tokens=22
+    )
+    db_session.add(gen_a)
+    db_session.add(gen_b)
+    db_session.commit()
+
+    duel = Duel(question_id=question.id, winner_id=gen_a.id if decided else None)
+    db_session.add(duel)
+    db_session.flush()
+    db_session.add(DuelGeneration(duel_id=duel.id, generation_id=gen_a.id, role="generation_a"))
+    db_session.add(DuelGeneration(duel_id=duel.id, generation_id=gen_b.id, role="generation_b"))
+    if decided:
+        question.selected_generation_id = gen_a.id
+    db_session.commit()
+    return question
+
+
+class TestRetentionService:
+    """Test archival of decided questions and database compaction"""
+
+    def test_archive_only_old_decided_questions(self, db_session, templates):
+        """Test that only decided questions older than the cutoff are archived"""
+        old = datetime.now() - timedelta(days=120)
+        old_decided = _create_decided_question(db_session, templates, old)
+        old_undecided = _create_decided_question(db_session, templates, old, decided=False)
+        recent_decided = _create_decided_question(db_session, templates, datetime.now())
+        old_decided_id = old_decided.id
+
+        archived = archive_decided_questions(db_session, datetime.now() - timedelta(days=90))
+
+        assert archived == 1
+        remaining = {q.id for q in db_session.exec(select(Question)).all()}
+        assert remaining == {old_undecided.id, recent_decided.id}
+        assert db_session.exec(select(Generation).where(Generation.question_id == old_decided_id)).all() == []
+        assert db_session.exec(select(Duel).where(Duel.question_id == old_decided_id)).all() == []
+        assert len(db_session.exec(select(DuelGeneration)).all()) == 4
+
+        archive = db_session.exec(select(ArchivedQuestion)).one()
+        assert archive.question_id == old_decided_id
+        assert archive.selected_template_id == templates[0].id
+
+    def test_archived_payload_round_trip(self, db_session, templates):
+        """Test that the compressed payload keeps the question, generations and duels"""
+        question = _create_decided_question(db_session, templates, datetime.now() - timedelta(days=10))
+        question_id = question.id
+
+        archive_decided_questions(db_session, datetime.now(), batch_size=1)
+
+        payload = load_archived_question(question_id, db_session)
+        assert payload["question"]["text"] == "What is the capital of France?"
+        assert sorted(g["output_text"] for g in payload["generations"]) == ["Paris", "Paris, France"]
+        assert len(payload["duels"]) == 1
+        duel = payload["duels"][0]
+        assert duel["winner_id"] == duel["generation_a"]
+        assert load_archived_question(999, db_session) is None
+
+    def test_archived_questions_keep_template_stats(self, db_session, templates):
+        """Test that overall template stats are unchanged by archiving"""
+        for days in (30, 20, 10):
+            _create_decided_question(db_session, templates, datetime.now() - timedelta(days=days))
+        before = get_template_performance_stats(db_session)["overall"]
+
+        assert archive_decided_questions(db_session, datetime.now() - timedelta(days=15), batch_size=1) == 2
+
+        stats = {s.template_id: s for s in db_session.exec(select(ArchivedTemplateStats)).all()}
+        assert stats[templates[0].id].wins == 2
+        assert stats[templates[0].id].total_duels == 2
+        assert stats[templates[1].id].wins == 0
+        assert get_template_performance_stats(db_session)["overall"] == before
+
+    def test_compact_database(self, test_db):
+        """Test that compaction leaves the auto-vacuum mode alone until the one-time switch runs"""
+        compact_database(test_db)
+        with test_db.connect() as connection:
+            assert connection.execute(text("PRAGMA auto_vacuum")).scalar() == 0
+
+        assert enable_incremental_vacuum(test_db)
+        assert not enable_incremental_vacuum(test_db)
+        compact_database(test_db)
+        with test_db.connect() as connection:
+            assert connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+
+    def test_new_database_starts_with_incremental_vacuum(self, tmp_path):
+        """Test that create_tables enables incremental auto-vacuum on a new database"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+        create_tables(engine)
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+        engine.dispose()
+
+    def test_scheduler_disabled_without_retention_days(self, test_db, monkeypatch):
+        """Test that no scheduler is created unless RETENTION_DAYS is set"""
+        monkeypatch.delenv("RETENTION_DAYS", raising=False)
+        assert scheduler_from_env(test_db) is None
+
+        monkeypatch.setenv("RETENTION_DAYS", "90")
+        monkeypatch.setenv("RETENTION_INTERVAL_HOURS", "6")
+        scheduler = scheduler_from_env(test_db)
+        assert scheduler.retention_days == 90
+        assert scheduler.interval_seconds == 6 * 3600
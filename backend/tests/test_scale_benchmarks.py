@@ -0,0 +1,66 @@
+import json
+import pytest
+from sqlalchemy import create_engine, text
+from benchmarks.datasets import DatasetSpec, build, cached
+from benchmarks.scale import compare, run, save_baseline
+
+
+@pytest.fixture
+def spec():
+    return DatasetSpec(questions=40, templates=3, pool_size=5)
+
+
+class TestDatasets:
+    """Test the synthetic dataset builder"""
+
+    def test_build(self, tmp_path, spec):
+        path = str(tmp_path / "data.db")
+        states = build(path, spec)
+
+        assert len(states["pending_winner"]) == len(states["without_duels"]) == 5
+        assert sum(len(ids) for ids in states.values()) == 40
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            count = lambda sql: connection.execute(text(sql)).scalar()
+            assert count("SELECT count(*) FROM generation") == 40 * 3
+            assert count("SELECT count(*) FROM duel") == 35 * 3
+            assert count("SELECT count(*) FROM duelgeneration") == 35 * 3 * 2
+            assert count("SELECT count(*) FROM question WHERE selected_generation_id IS NOT NULL") == \
+                len(states["decided"])
+            pending = ",".join(map(str, states["pending_winner"]))
+            assert count(f"SELECT count(*) FROM duel WHERE winner_id IS NULL AND question_id IN ({pending})") == 0
+        engine.dispose()
+
+    def test_cached_once(self, tmp_path, spec, capsys):
+        first = cached(spec, str(tmp_path))
+        second = cached(spec, str(tmp_path))
+        assert first == second
+        assert capsys.readouterr().out.count("Building dataset") == 1
+
+
+class TestScaleBenchmarks:
+    """Test the benchmark run and the baseline comparison"""
+
+    def test_run_and_compare(self, tmp_path, spec):
+        results = run(spec, repeat=2, data_dir=str(tmp_path))
+        assert set(results["benchmarks"]) == {
+            "generation_performance_stats", "template_performance_stats", "templates_performance_by_question",
+            "next_duel", "set_question_winner", "create_duels",
+        }
+        assert all(result["median_ms"] > 0 and result["runs"] == 2 for result in results["benchmarks"].values())
+
+        baseline_path = str(tmp_path / "baseline.json")
+        save_baseline(results, baseline_path)
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        assert {row["status"] for row in compare(results, baseline)} == {"ok"}
+
+        slower = {"dataset": results["dataset"], "benchmarks": {
+            "next_duel": {**results["benchmarks"]["next_duel"],
+                          "median_ms": results["benchmarks"]["next_duel"]["median_ms"] * 2},
+            "unknown": {"median_ms": 1.0, "peak_kib": 1.0},
+        }}
+        rows = {row["benchmark"]: row for row in compare(slower, baseline, time_threshold=0.5)}
+        assert rows["next_duel"]["status"] == "regression"
+        assert rows["next_duel"]["time_ratio"] == 2.0
+        assert rows["unknown"]["status"] == "new"
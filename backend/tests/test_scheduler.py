@@ -0,0 +1,159 @@
+import threading
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from models.template import Template
+from models.questions import Question
+from services import metrics, scheduler
+from services.llm import StubProvider, generate_outputs
+from services.scheduler import BACKFILL, BULK, INTERACTIVE, DEFAULT_WEIGHTS, GenerationPipeline, parse_weights
+
+
+class Gate:
+    """A pipeline call that holds its worker until released, so later calls queue up"""
+
+    def __init__(self, pipeline: GenerationPipeline, priority: str = INTERACTIVE):
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.future = pipeline.submit(self._hold, priority=priority)
+        assert self.started.wait(5)
+
+    def _hold(self):
+        self.started.set()
+        self.released.wait(5)
+
+    def release(self):
+        self.released.set()
+        self.future.result(5)
+
+
+def _run_queued(pipeline: GenerationPipeline, calls):
+    """Queue (priority, label) calls behind a held worker and return the labels in the order they ran"""
+    order = []
+    gate = Gate(pipeline)
+    futures = [pipeline.submit(order.append, label, priority=priority) for priority, label in calls]
+    gate.release()
+    for future in futures:
+        future.result(5)
+    return order
+
+
+class TestParseWeights:
+    def test_defaults(self):
+        assert parse_weights(None) == DEFAULT_WEIGHTS
+        assert parse_weights("") == DEFAULT_WEIGHTS
+
+    def test_overrides(self):
+        assert parse_weights("bulk=4, backfill=0.5") == {INTERACTIVE: 8.0, BULK: 4.0, BACKFILL: 0.5}
+
+    @pytest.mark.parametrize("spec", ["urgent=3", "bulk=0", "bulk", "bulk=-1"])
+    def test_invalid(self, spec):
+        with pytest.raises(ValueError):
+            parse_weights(spec)
+
+
+class TestGenerationPipeline:
+    def test_interactive_goes_first(self):
+        pipeline = GenerationPipeline(1)
+        calls = [(BULK, f"b{i}") for i in range(5)] + [(INTERACTIVE, "i0"), (INTERACTIVE, "i1")]
+        assert _run_queued(pipeline, calls) == ["i0", "i1", "b0", "b1", "b2", "b3", "b4"]
+
+    def test_weighted_share(self):
+        pipeline = GenerationPipeline(1, {INTERACTIVE: 8, BULK: 2, BACKFILL: 1})
+        calls = [(BACKFILL, "f")] * 30 + [(BULK, "b")] * 30
+        order = _run_queued(pipeline, calls)
+        # Both classes backlogged: bulk starts two calls for every backfill call, and backfill never starves
+        assert order[:9].count("b") == 6
+        assert order[:9].count("f") == 3
+
+    def test_idle_class_does_not_bank_credit(self):
+        pipeline = GenerationPipeline(1, {INTERACTIVE: 8, BULK: 1, BACKFILL: 1})
+        _run_queued(pipeline, [(BULK, "b")] * 10)
+        # Backfill was idle while bulk ran ten calls; it rejoins at bulk's pass instead of running ten in a row
+        order = _run_queued(pipeline, [(BACKFILL, "f")] * 4 + [(BULK, "b")] * 4)
+        assert order[:4].count("f") <= 2
+
+    def test_unknown_priority(self):
+        with pytest.raises(ValueError, match="Unknown priority"):
+            GenerationPipeline(1).submit(print, priority="urgent")
+
+    def test_exceptions_reach_the_caller(self):
+        future = GenerationPipeline(1).submit(int, "not a number")
+        with pytest.raises(ValueError):
+            future.result(5)
+
+    def test_concurrency_limit(self):
+        pipeline = GenerationPipeline(2)
+        gates = [Gate(pipeline), Gate(pipeline)]
+        queued = pipeline.submit(lambda: "done", priority=BULK)
+        assert not queued.done()
+        assert pipeline.queue_depths()[BULK] == 1
+        for gate in gates:
+            gate.release()
+        assert queued.result(5) == "done"
+
+    def test_burst_grows_the_pool(self):
+        """Test that a burst of calls runs concurrently when a worker is already idle"""
+        pipeline = GenerationPipeline(4)
+        pipeline.submit(str, "warm up").result(5)
+        running, peak, lock = [0], [0], threading.Lock()
+        all_started = threading.Barrier(4, timeout=1)
+
+        def call():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                all_started.wait()
+            except threading.BrokenBarrierError:
+                pass
+            with lock:
+                running[0] -= 1
+
+        futures = [pipeline.submit(call) for _ in range(4)]
+        for future in futures:
+            future.result(5)
+        assert peak[0] == 4
+
+    def test_metrics(self):
+        metrics.reset()
+        pipeline = GenerationPipeline(1)
+        gate = Gate(pipeline)
+        futures = [pipeline.submit(str, i, priority=BACKFILL) for i in range(3)]
+        assert metrics.PIPELINE_QUEUE_DEPTH.value(priority=BACKFILL) == 3
+        assert metrics.PIPELINE_CALLS_IN_FLIGHT.value(priority=INTERACTIVE) == 1
+        gate.release()
+        for future in futures:
+            future.result(5)
+
+        assert metrics.PIPELINE_QUEUE_DEPTH.value(priority=BACKFILL) == 0
+        assert metrics.PIPELINE_QUEUE_WAIT.count(priority=BACKFILL) == 3
+        assert metrics.PIPELINE_QUEUE_WAIT.count(priority=INTERACTIVE) == 1
+
+
+class TestPriorities:
+    def test_generate_outputs_is_interactive(self):
+        pipeline = GenerationPipeline(1)
+        templates = [Template(id=i, key=f"t{i}", name=f"T{i}", template_text="{{question}}") for i in (1, 2)]
+        with patch("services.scheduler.pipeline", pipeline), \
+                patch.object(pipeline, "submit", wraps=pipeline.submit) as submit:
+            outputs = generate_outputs(templates, Question(id=1, text="Why?"), provider=StubProvider())
+
+        assert [output.template_id for output in outputs] == [1, 2]
+        assert {call.kwargs["priority"] for call in submit.call_args_list} == {INTERACTIVE}
+
+    def test_bulk_priority(self, client: TestClient, test_db, db_session: Session):
+        db_session.add(Template(key="a", name="A", template_text="{{question}}"))
+        db_session.commit()
+        with patch("services.batches.engine", test_db), patch("services.question.engine", test_db), \
+                patch.dict("os.environ", {"LLM_PROVIDER": "stub"}), \
+                patch.object(scheduler.pipeline, "submit", wraps=scheduler.pipeline.submit) as submit:
+            response = client.post("/questions/bulk?priority=backfill", json=["Why?", "How?"])
+
+        assert response.json()["priority"] == "backfill"
+        assert client.get(f"/questions/batches/{response.json()['id']}").json()["generated"] == 2
+        assert {call.kwargs["priority"] for call in submit.call_args_list} == {BACKFILL}
+
+    def test_invalid_bulk_priority(self, client: TestClient):
+        assert client.post("/questions/bulk?priority=interactive", json=["Why?"]).status_code == 422
@@ -0,0 +1,86 @@
+from collections import Counter
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from models.duel import Duel, DuelGeneration
+from sqlalchemy import inspect
+from seed import TEMPLATES, BulkSeedSpec, _engine_for, bulk_seed
+
+
+class TestBulkSeed:
+    """Test the synthetic dataset generator"""
+
+    def test_counts_and_states(self, test_db, db_session: Session):
+        spec = BulkSeedSpec(questions=60, templates=5, pending_winner=4, without_duels=3, distinct_outputs=20)
+        states = bulk_seed(test_db, spec, batch_questions=25)
+
+        assert len(states["pending_winner"]) == 4
+        assert len(states["without_duels"]) == 3
+        assert sorted(sum(states.values(), [])) == list(range(1, 61))
+        count = lambda model: db_session.exec(select(func.count()).select_from(model)).one()
+        assert count(Template) == 5
+        assert count(Generation) == 60 * 5
+        assert count(Duel) == 57 * 10
+        assert count(DuelGeneration) == 57 * 10 * 2
+
+        keys = db_session.exec(select(Template.key).order_by(Template.id)).all()
+        assert keys == [t["key"] for t in TEMPLATES] + ["synthetic_4"]
+        decided = db_session.exec(select(Question).where(Question.selected_generation_id.isnot(None))).all()
+        assert sorted(q.id for q in decided) == states["decided"]
+        for question_id in states["pending_winner"]:
+            assert db_session.exec(
+                select(Duel).where(Duel.question_id == question_id, Duel.winner_id.is_(None))
+            ).first() is None
+
+        with test_db.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA foreign_key_check").all() == []
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+
+    def test_appends(self, test_db, db_session: Session):
+        first = bulk_seed(test_db, BulkSeedSpec(questions=10, templates=3, distinct_outputs=5))
+        second = bulk_seed(test_db, BulkSeedSpec(questions=10, templates=3, distinct_outputs=5))
+
+        assert max(sum(first.values(), [])) < min(sum(second.values(), []))
+        assert db_session.exec(select(func.count()).select_from(Template)).one() == 3
+        assert db_session.exec(select(func.count()).select_from(Generation)).one() == 60
+
+    def test_win_skew(self, test_db, db_session: Session):
+        bulk_seed(test_db, BulkSeedSpec(questions=300, templates=3, win_skew=2.0, distinct_outputs=10))
+        wins = Counter(db_session.exec(
+            select(Generation.template_id).join(Duel, Duel.winner_id == Generation.id)
+        ).all())
+        assert wins[1] > wins[2] > wins[3]
+
+    def test_output_sizes_vary(self, test_db, db_session: Session):
+        bulk_seed(test_db, BulkSeedSpec(questions=50, templates=2, output_chars_mean=300, distinct_outputs=50))
+        lengths = db_session.exec(select(Generation.output_length)).all()
+        assert min(lengths) < 200 < 400 < max(lengths)
+        assert all(generation.output_text == "" and generation.output_hash
+                   for generation in db_session.exec(select(Generation)).all())
+
+    def test_invalid_spec(self):
+        with pytest.raises(ValueError):
+            BulkSeedSpec(templates=1)
+        with pytest.raises(ValueError):
+            BulkSeedSpec(questions=5, pending_winner=3, without_duels=3)
+
+    def test_database_file_gets_schema(self, tmp_path):
+        target = _engine_for(str(tmp_path / "seed.db"))
+        bulk_seed(target, BulkSeedSpec(questions=5, templates=2, distinct_outputs=5))
+        assert {"question", "generation", "duel"} <= set(inspect(target).get_table_names())
+        with target.connect() as connection:
+            # Incremental auto-vacuum is set when the tables are created
+            assert connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+
+    def test_served_by_api(self, client: TestClient, test_db):
+        states = bulk_seed(test_db, BulkSeedSpec(questions=20, templates=3, distinct_outputs=5))
+        question_id = states["decided"][0]
+
+        response = client.get(f"/questions/{question_id}/results")
+        assert response.status_code == 200
+        results = response.json()
+        assert results["selected_generation"]["output_text"]
+        assert len(results["generation_performance"]) == 3
@@ -0,0 +1,82 @@
+import json
+from datetime import datetime
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from models.template import Template
+from models.questions import Question
+from models.generation import Generation
+from services import serialization
+from services.serialization import FastJSONResponse, dumps
+
+
+@pytest.fixture(params=["orjson", "fallback"])
+def json_backend(request, monkeypatch):
+    """Run a test with orjson, when installed, and with the pydantic-core fallback"""
+    if request.param == "orjson":
+        if serialization.orjson is None:
+            pytest.skip("orjson is not installed")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    return request.param
+
+
+class TestSerialization:
+    """Test the fast JSON serialization helpers"""
+
+    def test_dumps_matches_jsonable_encoder(self, json_backend):
+        """Test that dumps produces the same JSON as FastAPI's default encoding"""
+        content = {
+            "question": Question(id=1, text="Capital of France?", created_at=datetime(2025, 1, 1, 12, 30)),
+            "rows": [{"win_rate": 66.67, "created_at": datetime(2025, 1, 2), "output_text": "Paris é"}],
+            "empty": None,
+        }
+        assert json.loads(dumps(content)) == json.loads(json.dumps(jsonable_encoder(content)))
+
+    def test_response_class_renders_compact_json(self, json_backend):
+        """Test FastJSONResponse rendering"""
+        response = FastJSONResponse({"value": 1, "items": [1, 2]})
+        assert response.body == b'{"value":1,"items":[1,2]}'
+        assert response.headers["content-type"] == "application/json"
+
+    def test_orjson_renders_when_installed(self, mocker):
+        """Test that the orjson fast path is taken whenever orjson can be imported"""
+        orjson = pytest.importorskip("orjson")
+        assert serialization.orjson is orjson
+        spy = mocker.spy(orjson, "dumps")
+        assert FastJSONResponse({"value": 1}).body == b'{"value":1}'
+        spy.assert_called_once()
+
+    def test_unserializable_value_raises(self, json_backend):
+        """Test that unknown types are rejected rather than silently stringified"""
+        with pytest.raises((TypeError, ValueError)):
+            dumps({"value": object()})
+
+
+class TestSerializedEndpoints:
+    """Test responses served through the precompiled adapters"""
+
+    def test_question_list_skips_unset_fields(self, client: TestClient, test_db):
+        """Test that the adapter-serialized list keeps the response_model shape"""
+        with Session(test_db) as db:
+            template = Template(key="t", name="T", template_text="{{question}}")
+            question = Question(text="Capital of France?")
+            db.add(template)
+            db.add(question)
+            db.commit()
+            generation = Generation(template_id=template.id, question_id=question.id, output_text="Paris",
+                                    llm_model="gpt-4o-mini", latency=0.5, output_tokens=1, input_tokens=5)
+            db.add(generation)
+            db.commit()
+            question.selected_generation_id = generation.id
+            db.commit()
+            generation_id = generation.id
+
+        response = client.get("/questions/?details=true&fields=id,latency")
+        assert response.status_code == 200
+        assert response.json()[0]["selected_generation"] == {"id": generation_id, "latency": 0.5}
+        assert response.headers["X-Sync-Watermark"]
+
+        response = client.get("/questions/")
+        assert set(response.json()[0]) == {"id", "text", "created_at", "selected_generation_id", "selected_generation"}
@@ -0,0 +1,185 @@
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+import services.performance as performance
+from services.cache import TEMPLATES, bump
+from services.singleflight import SingleFlight
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _run_concurrently(flight: SingleFlight, key, fn, callers: int):
+    """Call flight.do from `callers` threads while the first computation is held open"""
+    release = threading.Event()
+    results, errors = [], []
+
+    def held():
+        release.wait(5)
+        return fn()
+
+    def call():
+        try:
+            results.append(flight.do(key, held))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: flight.stats().get(key[0], {}).get("calls") == callers)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+class TestSingleFlight:
+    """Test coalescing of concurrent identical calls"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that callers waiting on an in-flight key get its result"""
+        flight = SingleFlight()
+        executions = []
+
+        def compute():
+            executions.append(1)
+            return {"rows": [1, 2, 3]}
+
+        results, errors = _run_concurrently(flight, ("stats", 1), compute, callers=5)
+
+        assert errors == []
+        assert len(executions) == 1
+        assert results == [{"rows": [1, 2, 3]}] * 5
+        assert flight.stats() == {"stats": {"calls": 5, "executions": 1, "coalesced": 4}}
+
+    def test_followers_get_independent_copies(self):
+        """Test that a caller mutating its result does not affect the others"""
+        flight = SingleFlight()
+        results, _ = _run_concurrently(flight, ("stats",), lambda: {"rows": []}, callers=3)
+
+        results[0]["rows"].append("mutated")
+        assert sum(1 for result in results if result["rows"] == []) == 2
+
+    def test_error_is_shared(self):
+        """Test that a failed computation is raised to every waiting caller"""
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        results, errors = _run_concurrently(flight, ("stats",), fail, callers=3)
+        assert results == []
+        assert [str(error) for error in errors] == ["boom"] * 3
+
+    def test_sequential_calls_are_not_coalesced(self):
+        """Test that completed computations are not reused"""
+        flight = SingleFlight()
+        assert flight.do(("stats", 1), lambda: 1) == 1
+        assert flight.do(("stats", 1), lambda: 2) == 2
+        assert flight.do(("stats", 2), lambda: 3) == 3
+        assert flight.stats()["stats"] == {"calls": 3, "executions": 3, "coalesced": 0}
+
+
+class TestPerformanceCoalescing:
+    """Test single-flight on the performance services"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_flight(self, monkeypatch):
+        flight = SingleFlight()
+        monkeypatch.setattr(performance, "performance_flight", flight)
+        return flight
+
+    def test_template_performance_coalesced(self, test_db, fresh_flight, monkeypatch):
+        """Test that concurrent overall stats requests run the aggregate once"""
+        executions = []
+        release = threading.Event()
+        compute = performance._template_performance_stats
+
+        def held(db, question_id):
+            release.wait(5)
+            executions.append(question_id)
+            return compute(db, question_id)
+
+        monkeypatch.setattr(performance, "_template_performance_stats", held)
+        results = []
+
+        def call():
+            with Session(test_db) as db:
+                results.append(performance.get_template_performance_stats(db))
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        _wait_for(lambda: fresh_flight.stats().get("template_performance", {}).get("calls") == 4)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert executions == [None]
+        assert len(results) == 4
+        assert all(result == results[0] for result in results)
+        assert fresh_flight.stats()["template_performance"]["coalesced"] == 3
+
+    def test_call_after_write_does_not_join_earlier_computation(self, test_db, fresh_flight, monkeypatch):
+        """Test that a call made after a write computes again instead of sharing a pre-write read"""
+        compute = performance._template_performance_stats
+        started, release = threading.Event(), threading.Event()
+
+        def held_once(db, question_id):
+            if not started.is_set():
+                result = compute(db, question_id)
+                started.set()
+                release.wait(5)
+                return result
+            return compute(db, question_id)
+
+        monkeypatch.setattr(performance, "_template_performance_stats", held_once)
+        results = {}
+
+        def call(name):
+            with Session(test_db) as db:
+                results[name] = performance.get_template_performance_stats(db)
+
+        leader = threading.Thread(target=call, args=("leader",))
+        leader.start()
+        assert started.wait(5)
+
+        bump(TEMPLATES)
+        follower = threading.Thread(target=call, args=("follower",))
+        follower.start()
+        follower.join(5)
+        # The follower ran its own computation instead of waiting for the held one
+        assert not follower.is_alive()
+        release.set()
+        leader.join(5)
+
+        assert set(results) == {"leader", "follower"}
+        assert fresh_flight.stats()["template_performance"] == {"calls": 2, "executions": 2, "coalesced": 0}
+
+    def test_distinct_arguments_not_coalesced(self, test_db, fresh_flight):
+        """Test that different questions and field sets use different keys"""
+        with Session(test_db) as db:
+            performance.get_generation_performance_stats(1, db)
+            performance.get_generation_performance_stats(1, db, fields=["generation_id"])
+            performance.get_template_performance_stats(db, question_id=1)
+
+        stats = fresh_flight.stats()
+        assert stats["generation_performance"] == {"calls": 2, "executions": 2, "coalesced": 0}
+        assert stats["template_performance"]["executions"] == 1
+
+    def test_coalescing_endpoint(self, client: TestClient, fresh_flight):
+        """Test that the counters are exposed over HTTP"""
+        client.get("/templates/performance")
+        response = client.get("/templates/performance/coalescing")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["template_performance"] == {"calls": 1, "executions": 1, "coalesced": 0}
+        assert data["question_template_performance"]["calls"] == 1
@@ -0,0 +1,164 @@
+import socket
+import threading
+from unittest.mock import MagicMock, patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from models.template import Template
+from services import tracing
+from services.tracing import JsonlExporter, OtlpExporter, fold_stacks, load_spans, run_collector
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def named(self, name):
+        return [span for span in self.spans if span["name"] == name]
+
+
+@pytest.fixture
+def exported():
+    exporter = ListExporter()
+    tracing.configure_exporter(exporter)
+    yield exporter
+    tracing.configure_exporter(None)
+
+
+class TestTracing:
+    """Test span propagation from the request through background work"""
+
+    def test_question_trace(self, client: TestClient, test_db, exported, mock_openai_response):
+        """Test that one trace covers the request, the queued task, LLM calls, duel creation and SQL"""
+        with Session(test_db) as db:
+            for key in ("a", "b"):
+                db.add(Template(key=key, name=key, template_text="{{question}}"))
+            db.commit()
+        openai_client = MagicMock()
+        openai_client.chat.completions.create.return_value = mock_openai_response
+
+        with patch("services.question.engine", test_db), \
+                patch("services.llm.OpenAI", return_value=openai_client), \
+                patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"}):
+            response = client.post("/questions/", json={"text": "Capital of France?"})
+
+        (request,) = exported.named("POST /questions/")
+        (create,) = exported.named("create_question")
+        (queued,) = exported.named("generation_queued")
+        (task,) = exported.named("generation_and_duels_background_task")
+        outputs = exported.named("generate_output")
+        (duels,) = exported.named("create_duels")
+
+        assert {span["trace_id"] for span in exported.spans} == {request["trace_id"]}
+        assert request["parent_id"] is None
+        assert response.headers["traceparent"] == f"00-{request['trace_id']}-{request['span_id']}-01"
+        assert create["parent_id"] == request["span_id"]
+        assert create["attributes"]["question_id"] == response.json()["id"]
+        assert queued["parent_id"] == task["parent_id"] == create["span_id"]
+        assert queued["end_ns"] <= task["start_ns"]
+        assert [span["parent_id"] for span in outputs] == [task["span_id"]] * 2
+        assert {span["attributes"]["template"] for span in outputs} == {"a", "b"}
+        assert outputs[0]["attributes"]["output_tokens"] == 10
+        assert duels["parent_id"] == task["span_id"]
+        assert duels["attributes"]["duels"] == 1
+        # SQL statements are children of the span that ran them
+        assert any(span["name"] == "INSERT question" and span["parent_id"] == create["span_id"]
+                   for span in exported.spans)
+        assert any(span["name"] == "INSERT duel" and span["parent_id"] == duels["span_id"]
+                   for span in exported.spans)
+
+    def test_continues_caller_trace(self, client: TestClient, exported):
+        trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+        client.get("/templates/", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+        (request,) = exported.named("GET /templates/")
+        assert request["trace_id"] == trace_id
+        assert request["parent_id"] == parent_id
+
+    def test_error_recorded(self, exported):
+        with pytest.raises(RuntimeError):
+            with tracing.span("failing"):
+                raise RuntimeError("rate limited")
+        (span,) = exported.spans
+        assert span["status"] == "error"
+        assert span["error"] == "RuntimeError: rate limited"
+
+    def test_disabled(self, client: TestClient):
+        assert tracing.span("anything") is tracing._NOOP_SPAN
+        assert "traceparent" not in client.get("/").headers
+
+
+class TestExport:
+    """Test the JSONL exporter, the OTLP exporter with the collector stand-in, and folding"""
+
+    def _trace(self):
+        with tracing.span("request"):
+            with tracing.span("llm", template="a"):
+                pass
+            with tracing.span("db"):
+                pass
+
+    def test_jsonl_exporter(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        exporter = JsonlExporter(str(path))
+        tracing.configure_exporter(exporter)
+        try:
+            self._trace()
+        finally:
+            tracing.configure_exporter(None)
+            exporter.stop()
+
+        spans = load_spans(str(path))
+        assert [span["name"] for span in spans] == ["llm", "db", "request"]
+        assert spans[0]["attributes"] == {"template": "a"}
+
+    def test_otlp_exporter_to_collector(self, tmp_path):
+        path = tmp_path / "collected.jsonl"
+        server = run_collector("127.0.0.1", 0, str(path))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        exporter = OtlpExporter(f"http://127.0.0.1:{server.server_address[1]}")
+        tracing.configure_exporter(exporter)
+        try:
+            self._trace()
+            exporter.flush()
+        finally:
+            tracing.configure_exporter(None)
+            server.shutdown()
+            server.server_close()
+
+        spans = load_spans(str(path))
+        assert sorted(span["name"] for span in spans) == ["db", "llm", "request"]
+        assert next(span for span in spans if span["name"] == "llm")["attributes"] == {"template": "a"}
+        assert exporter.dropped == 0
+
+    def test_otlp_exporter_unreachable(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        exporter = OtlpExporter(f"http://127.0.0.1:{port}")
+        exporter.export({"trace_id": "1" * 32, "span_id": "1" * 16, "parent_id": None, "name": "x",
+                         "start_ns": 0, "end_ns": 1, "attributes": {}, "error": None})
+        exporter.flush()
+        assert exporter.dropped == 1
+
+    def test_fold_stacks(self):
+        def span(span_id, parent_id, name, start_us, end_us):
+            return {"span_id": span_id, "parent_id": parent_id, "name": name,
+                    "start_ns": start_us * 1000, "end_ns": end_us * 1000}
+
+        folded = fold_stacks([
+            span("r", None, "POST /questions/", 0, 100),
+            span("c", "r", "create_question", 10, 40),
+            span("q", "c", "INSERT question", 20, 30),
+            span("t", "c", "generation_and_duels_background_task", 100, 1100),
+            span("g", "t", "generate_output", 100, 1000),
+        ])
+        assert folded == {
+            "POST /questions/": 70,
+            "POST /questions/;create_question": 0,
+            "POST /questions/;create_question;INSERT question": 10,
+            "POST /questions/;create_question;generation_and_duels_background_task": 100,
+            "POST /questions/;create_question;generation_and_duels_background_task;generate_output": 900,
+        }
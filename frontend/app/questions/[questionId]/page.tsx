@@ -10,7 +10,9 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL;
  * cache: 'no-store' ensures fresh data after router.refresh()
  */
 async function fetchQuestionResults(questionId: string): Promise<QuestionResultsType> {
-  const response = await fetch(`${API_URL}/questions/${questionId}/results`, {
+  // The other answers' text is shown too, and output_text is not returned by default
+  const fields = "generation_id,template_name,llm_model,latency,output_tokens,win_rate,output_text";
+  const response = await fetch(`${API_URL}/questions/${questionId}/results?fields=${fields}`, {
     cache: 'no-store'
   });
 
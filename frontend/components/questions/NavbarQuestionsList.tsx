@@ -2,39 +2,33 @@
 
 import type { QuestionType } from "@/types/question";
 import Link from "next/link";
-import { useEffect, useEffectEvent, useState } from "react";
+import { useEffect, useEffectEvent, useRef, useState } from "react";
 import { useQuestionRefresh } from "@/contexts/QuestionRefreshContext";
 
 export default function NavbarQuestionsList({ limit = 10, className }: { limit?: number, className?: string }) {
     const [questions, setQuestions] = useState<QuestionType[]>([]);
-    const [statuses, setStatuses] = useState<Record<number, 'completed' | 'pending'>>({});
+    const watermarkRef = useRef<string | null>(null);
     const { refreshTrigger } = useQuestionRefresh();
     
     const fetchQuestions = useEffectEvent(async () => {
-        const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/questions/?limit=${limit}`);
-        const data = await response.json();
-        setQuestions(data);
+        // After the first load, only fetch questions created or decided since the last sync
+        const watermark = watermarkRef.current;
+        const url = watermark
+            ? `${process.env.NEXT_PUBLIC_API_URL}/questions/?limit=${limit}&updated_since=${encodeURIComponent(watermark)}`
+            : `${process.env.NEXT_PUBLIC_API_URL}/questions/?limit=${limit}`;
+        const response = await fetch(url);
+        if (!response.ok) return;
+        const data: QuestionType[] = await response.json();
+        watermarkRef.current = response.headers.get("X-Sync-Watermark") ?? watermark;
         
-        // Fetch status for each question
-        const statusPromises = data.map(async (q: QuestionType) => {
-            try {
-                const statusResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/questions/${q.id}`);
-                if (statusResponse.ok) {
-                    const questionData = await statusResponse.json();
-                    return { id: q.id, status: questionData.selected_generation_id ? 'completed' : 'pending' };
-                }
-            } catch (error) {
-                console.error(`Error fetching status for question ${q.id}:`, error);
-            }
-            return { id: q.id, status: 'pending' };
+        setQuestions((previous) => {
+            if (!watermark) return data;
+            const byId = new Map(previous.map((q) => [q.id, q]));
+            data.forEach((q) => byId.set(q.id, q));
+            return [...byId.values()]
+                .sort((a, b) => b.created_at.localeCompare(a.created_at) || b.id - a.id)
+                .slice(0, limit);
         });
-        
-        const results = await Promise.all(statusPromises);
-        const statusMap: Record<number, 'completed' | 'pending'> = {};
-        results.forEach(({ id, status }) => {
-            statusMap[id] = status;
-        });
-        setStatuses(statusMap);
     });
     
     useEffect(() => {
@@ -58,7 +52,7 @@ export default function NavbarQuestionsList({ limit = 10, className }: { limit?:
                     <div className="flex items-start gap-3 flex-1 min-w-0">
                         {/* Status Dot */}
                         <div className="mt-1.5 shrink-0">
-                            {statuses[question.id] === 'completed' ? (
+                            {question.selected_generation_id ? (
                                 <div className="w-2 h-2 bg-green-500 rounded-full"></div>
                             ) : (
                                 <div className="w-2 h-2 bg-gray-300 rounded-full"></div>
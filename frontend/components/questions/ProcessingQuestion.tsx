@@ -9,6 +9,7 @@ interface ProcessingQuestionProps {
 
 export default function ProcessingQuestion({ questionId }: ProcessingQuestionProps) {
   const [dots, setDots] = useState("");
+  const [error, setError] = useState<string | null>(null);
 
   // Animate dots
   useEffect(() => {
@@ -18,8 +19,17 @@ export default function ProcessingQuestion({ questionId }: ProcessingQuestionPro
     return () => clearInterval(interval);
   }, []);
 
-  // Poll for duels to become available with exponential backoff
-  usePollDuels({ questionId });
+  // Long poll the question status until duels are available
+  usePollDuels({ questionId, onError: (err) => setError(err.message) });
+
+  if (error) {
+    return (
+      <div className="p-8 h-full flex flex-col justify-center items-center gap-2 text-center">
+        <h2 className="text-2xl font-bold text-gray-800">Generation Failed</h2>
+        <p className="text-gray-600 max-w-md">{error}</p>
+      </div>
+    );
+  }
 
   return (
     <div className="p-8 h-full flex flex-col justify-center items-center gap-6">
@@ -7,12 +7,22 @@ interface UsePollDuelsOptions {
   initialInterval?: number;
   maxInterval?: number;
   maxPollingTime?: number;
+  waitSeconds?: number;
+  minInterval?: number;
   onSuccess?: () => void;
   onError?: (error: Error) => void;
 }
 
+interface QuestionStatus {
+  state: "generating" | "ready" | "decided" | "failed";
+  error?: string | null;
+  version: number;
+}
+
 /**
- * Polls the duels endpoint with exponential backoff until duels are ready.
+ * Long polls the question status endpoint until duels are ready.
+ * Each request is held by the server until the question changes or
+ * `waitSeconds` pass, so one request replaces many short polls.
  * Used in ProcessingQuestion component to detect when generation completes.
  */
 export function usePollDuels({
@@ -21,6 +31,8 @@ export function usePollDuels({
   initialInterval = 2000,
   maxInterval = 32000,
   maxPollingTime = 60000,
+  waitSeconds = 25,
+  minInterval = 1000,
   onSuccess,
   onError,
 }: UsePollDuelsOptions) {
@@ -34,28 +46,51 @@ export function usePollDuels({
   useEffect(() => {
     let timeoutId: NodeJS.Timeout;
     let interval = initialInterval;
+    let version: number | null = null;
     const startTime = Date.now();
+    const controller = new AbortController();
     let cancelled = false;
 
     const poll = async () => {
-      if (cancelled || Date.now() - startTime > maxPollingTime) return;
+      const remaining = maxPollingTime - (Date.now() - startTime);
+      if (cancelled || remaining <= 0) return;
 
+      const requestStart = Date.now();
       try {
+        const params = new URLSearchParams();
+        if (version !== null) {
+          params.set("version", String(version));
+          params.set("wait", String(Math.min(waitSeconds, Math.ceil(remaining / 1000))));
+        }
         const response = await fetch(
-          `${process.env.NEXT_PUBLIC_API_URL}/questions/${questionId}/duels/next`
+          `${process.env.NEXT_PUBLIC_API_URL}/questions/${questionId}/status?${params}`,
+          { signal: controller.signal }
         );
 
         if (cancelled) return;
 
-        // Still processing (202) - continue polling with backoff
-        if (response.status === 202) {
-          interval = Math.min(interval * 1.2, maxInterval);
-          timeoutId = setTimeout(poll, interval);
-        } 
-        // Duels ready (200) or all completed (204) - refresh page
-        else if (response.ok || response.status === 204) {
-          callbacksRef.current.onSuccess?.();
-          router.refresh();
+        if (response.ok) {
+          const status: QuestionStatus = await response.json();
+          if (cancelled) return;
+
+          // Generation failed or passed its deadline - stop polling
+          if (status.state === "failed") {
+            callbacksRef.current.onError?.(new Error(status.error ?? "Generation failed"));
+            return;
+          }
+
+          // Duels ready or all decided - refresh page
+          if (status.state !== "generating") {
+            callbacksRef.current.onSuccess?.();
+            router.refresh();
+            return;
+          }
+
+          // Still processing - wait for the next change, but never send requests
+          // faster than minInterval if the server answers without holding the request
+          version = status.version;
+          interval = initialInterval;
+          timeoutId = setTimeout(poll, Math.max(0, minInterval - (Date.now() - requestStart)));
         } 
         // Error states
         else if (response.status === 404) {
@@ -65,7 +100,7 @@ export function usePollDuels({
           callbacksRef.current.onError?.(new Error(`Unexpected status: ${response.status}`));
         }
       } catch {
-        // Network error - continue polling with increased backoff
+        // Network error - retry with increased backoff
         if (!cancelled) {
           interval = Math.min(interval * 2, maxInterval);
           timeoutId = setTimeout(poll, interval);
@@ -77,7 +112,8 @@ export function usePollDuels({
 
     return () => {
       cancelled = true;
+      controller.abort();
       clearTimeout(timeoutId);
     };
-  }, [questionId, router, initialDelay, initialInterval, maxInterval, maxPollingTime]);
+  }, [questionId, router, initialDelay, initialInterval, maxInterval, maxPollingTime, waitSeconds, minInterval]);
 }